@@ -0,0 +1,104 @@
+# Filter-set result cache for the analytics layer.
+#
+# The same few filter combinations (all brands, one segment, the usual
+# competitor sets) are requested all day, and each one recomputes the
+# summary, sheets and models from scratch. ResultCache keeps finished
+# results keyed by (kind, canonical filter set, extra arguments) and tagged
+# with the data-load version (PriceStore.version):
+#
+#     cache.get_or_compute('models', filters, store.version,
+#                          lambda: compute(filters), status, as_of)
+#
+# - Filters are canonicalised: empty filters dropped, keys and values sorted,
+#   a scalar equals a one-item list, so {'brand': ['Kia', 'Toyota']} and
+#   {'brand': ['Toyota', 'Kia'], 'model': []} share an entry.
+# - Results are stored pickled: sizes are exact for the byte budget, and
+#   every hit returns a fresh copy that callers may mutate (the generators
+#   fill and resample payloads in place).
+# - Eviction is LRU, by entry count and by total bytes; a version change
+#   (a new scraping batch loaded) drops every entry.
+
+import pickle
+import threading
+from collections import OrderedDict
+
+try:
+    from api.report_metrics import CACHE_EVICTIONS, CACHE_LOOKUPS
+except ImportError:
+    from report_metrics import CACHE_EVICTIONS, CACHE_LOOKUPS
+
+MAX_ENTRIES = 256
+MAX_BYTES = 64 << 20
+
+
+def canonical_filters(filters):
+    """Hashable, order-insensitive form of frontend filters."""
+    canonical = []
+    for key in sorted(filters or {}):
+        values = filters[key]
+        if values is None or values == [] or values == '':
+            continue
+        if isinstance(values, (list, tuple, set)):
+            values = tuple(sorted(set(values), key=str))
+        else:
+            values = (values,)
+        canonical.append((key, values))
+    return tuple(canonical)
+
+
+class ResultCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = None
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> pickled result
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop_all(self, reason):
+        if self._entries:
+            CACHE_EVICTIONS.inc(len(self._entries), reason=reason)
+        self._entries.clear()
+        self.bytes = 0
+
+    def invalidate(self, version=None):
+        """Drops every entry (called when a new batch is loaded)."""
+        with self._lock:
+            self._drop_all('stale')
+            self.version = version
+
+    def get_or_compute(self, kind, filters, version, compute, *args):
+        """Cached result of `compute()` for (kind, filters, *args) at `version`."""
+        key = (kind, canonical_filters(filters), args)
+        with self._lock:
+            if version != self.version:
+                self._drop_all('stale')
+                self.version = version
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+        if blob is not None:
+            CACHE_LOOKUPS.inc(kind=kind, result='hit')
+            return pickle.loads(blob)
+
+        CACHE_LOOKUPS.inc(kind=kind, result='miss')
+        value = compute()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            # Skip results computed against a version that is already gone
+            if version != self.version or len(blob) > self.max_bytes:
+                return value
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= len(previous)
+            self._entries[key] = blob
+            self.bytes += len(blob)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                reason = 'lru' if len(self._entries) > self.max_entries else 'size'
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                CACHE_EVICTIONS.inc(reason=reason)
+        return value
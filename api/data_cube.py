@@ -0,0 +1,271 @@
+# Precomputed aggregation cube over the price history.
+#
+# get-analytics builds every dashboard block (pricesByCategory,
+# pricesBySegmentBreakdown, modelsByPrincipal, monthly variation...) with its
+# own filter pass over all price rows. PriceCube aggregates the rows once per
+# data load into cells keyed by (tipo_vehiculo, brand, model, month), each
+# holding count, mean and M2 (sum of squared deviations, merged with Chan's
+# formula so variances stay exact at prices around 1e7), min, max, a KLL
+# quantile sketch and the distinct versions (products) seen in it. Every
+# sheet is then a rollup over the (few thousand) cells instead of the
+# (hundreds of thousands of) rows:
+#
+#     cube = PriceCube.build(PriceHistory.from_store(store))
+#     cube.rollup(('tipo_vehiculo',), {'brand': ['Toyota']}, quantiles=(0.5,))
+#     segment_sheet(cube, filters), brand_sheet(cube, filters), monthly_sheet(cube, filters)
+#
+# Only rows with price > 0 are counted. Price statistics are over scrape
+# observations; "Cantidad" / "Participación %" count versions, like
+# modelsByPrincipal, so a brand scraped more often does not weigh more.
+# Filters use the frontend keys of the cube dimensions (tipoVehiculo, brand,
+# model) plus a start / end date, which selects whole months.
+
+import numpy as np
+
+try:
+    from api.report_sketch import DEFAULT_K, KLLSketch
+    from api.data_snapshot import PriceHistory
+except ImportError:
+    from report_sketch import DEFAULT_K, KLLSketch
+    from data_snapshot import PriceHistory
+
+DIMENSIONS = ('tipo_vehiculo', 'brand', 'model', 'month')
+FILTER_DIMENSIONS = {'tipoVehiculo': 'tipo_vehiculo', 'brand': 'brand', 'model': 'model'}
+
+
+def _factorize(values):
+    """(labels, codes) for an object array, labels in first-seen order."""
+    index = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values.tolist()),
+                        dtype=np.int64, count=len(values))
+    return np.array(list(index), dtype=object), codes
+
+
+def _month(value):
+    return np.datetime64(str(value)[:7], 'M')
+
+
+def _filter_values(values):
+    if values is None or values == [] or values == '':
+        return None
+    return values if isinstance(values, (list, tuple, set)) else [values]
+
+
+class PriceCube:
+    """Per (tipo_vehiculo, brand, model, month) price aggregates."""
+
+    def __init__(self, labels, codes, count, mean, m2, low, high, sketches, pairs, version=None):
+        self.labels = labels        # dimension -> label array (month: datetime64[M])
+        self.codes = codes          # dimension -> int64 code per cell
+        self.count = count
+        self.mean = mean
+        self.m2 = m2                # sum of squared deviations from the cell mean
+        self.low = low
+        self.high = high
+        self.sketches = sketches    # one KLLSketch per cell
+        self.pairs = pairs          # (cell, product position) per distinct version in a cell
+        self.version = version
+        self._lookup = {d: {v: i for i, v in enumerate(labels[d].tolist())} for d in FILTER_DIMENSIONS.values()}
+
+    def __len__(self):
+        return len(self.count)
+
+    @classmethod
+    def build(cls, history, k=DEFAULT_K):
+        """Aggregates a data_snapshot.PriceHistory (every row, not just the latest)."""
+        valid = history.price > 0
+        product_id = history.product_id[valid]
+        position = np.searchsorted(history.product_ids, product_id)
+        known = position < len(history.product_ids)
+        known[known] = history.product_ids[position[known]] == product_id[known]
+        position = position[known]
+        prices = history.price[valid][known]
+        months = history.day[valid][known].astype('datetime64[M]')
+
+        # Attribute codes per product (catalogue-sized), then gathered per row
+        labels, row_codes = {}, {}
+        for dim in ('tipo_vehiculo', 'brand', 'model'):
+            labels[dim], product_codes = _factorize(history.product_attrs[dim])
+            row_codes[dim] = product_codes[position]
+        labels['month'], row_codes['month'] = np.unique(months, return_inverse=True)
+        row_codes['month'] = row_codes['month'].ravel()
+
+        key = np.zeros(len(prices), dtype=np.int64)
+        for dim in DIMENSIONS:
+            key = key * len(labels[dim]) + row_codes[dim]
+        cells, first, cell = np.unique(key, return_index=True, return_inverse=True)
+        order = np.argsort(cell.ravel(), kind='stable')
+        sorted_prices = prices[order]
+        bounds = np.r_[np.flatnonzero(np.r_[True, np.diff(cell.ravel()[order]) != 0]), len(order)] \
+            if len(order) else np.zeros(1, dtype=np.int64)
+        starts = bounds[:-1]
+
+        count = np.diff(bounds)
+        if len(starts):
+            # Two passes: the mean, then squared deviations from it
+            mean = np.add.reduceat(sorted_prices, starts) / count
+            deviation = sorted_prices - np.repeat(mean, count)
+            m2 = np.add.reduceat(deviation * deviation, starts)
+            low = np.minimum.reduceat(sorted_prices, starts)
+            high = np.maximum.reduceat(sorted_prices, starts)
+        else:
+            mean = m2 = low = high = np.zeros(0)
+        sketches = [KLLSketch(k).update(sorted_prices[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+        codes = {dim: row_codes[dim][first] for dim in DIMENSIONS}
+        # Distinct (cell, product) pairs, for version counts
+        n_products = max(len(history.product_ids), 1)
+        pair_keys = np.unique(cell.ravel() * n_products + position)
+        pairs = (pair_keys // n_products, pair_keys % n_products)
+        return cls(labels, codes, count, mean, m2, low, high, sketches, pairs, history.version)
+
+    @classmethod
+    def from_store(cls, store, filters=None, k=DEFAULT_K):
+        return cls.build(PriceHistory.from_store(store, filters), k)
+
+    @staticmethod
+    def supports(filters):
+        """True when every active filter is a cube dimension (or a date bound)."""
+        return all(_filter_values(v) is None or key in FILTER_DIMENSIONS
+                   for key, v in (filters or {}).items())
+
+    # --- Rollups -----------------------------------------------------------
+
+    def mask(self, filters=None, start=None, end=None):
+        """Cells matching frontend-style filters and the [start, end] months."""
+        keep = np.ones(len(self), dtype=bool)
+        for key, dim in FILTER_DIMENSIONS.items():
+            values = _filter_values((filters or {}).get(key))
+            if values is None:
+                continue
+            wanted = [self._lookup[dim][v] for v in values if v in self._lookup[dim]]
+            keep &= np.isin(self.codes[dim], wanted)
+        months = self.labels['month'][self.codes['month']] if len(self) else np.zeros(0, 'datetime64[M]')
+        if start:
+            keep &= months >= _month(start)
+        if end:
+            keep &= months <= _month(end)
+        return keep
+
+    def rollup(self, by=(), filters=None, start=None, end=None, quantiles=()):
+        """One dict per group of the `by` dimensions: labels plus count, sum,
+        mean, std (sample), min, max over price observations, the distinct
+        `versions` and the requested `quantiles` (merged cell sketches, so
+        approximate beyond k values per group)."""
+        cells = np.flatnonzero(self.mask(filters, start, end))
+        if not len(cells):
+            return []
+        key = np.zeros(len(cells), dtype=np.int64)
+        for dim in by:
+            key = key * len(self.labels[dim]) + self.codes[dim][cells]
+        groups, first, group = np.unique(key, return_index=True, return_inverse=True)
+        group = group.ravel()
+
+        # Chan et al.: M2 = sum of cell M2 + sum of n * (cell mean - group mean)^2
+        cell_count, cell_mean = self.count[cells], self.mean[cells]
+        count = np.bincount(group, weights=cell_count)
+        total = np.bincount(group, weights=cell_count * cell_mean)
+        mean = total / count
+        spread = cell_mean - mean[group]
+        m2 = np.bincount(group, weights=self.m2[cells] + cell_count * spread * spread)
+        low = np.full(len(groups), np.inf)
+        high = np.full(len(groups), -np.inf)
+        np.minimum.at(low, group, self.low[cells])
+        np.maximum.at(high, group, self.high[cells])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.where(count > 1, np.sqrt(m2 / (count - 1)), 0.0)
+
+        # A version seen in several months counts once per group
+        cell_group = np.full(len(self), -1, dtype=np.int64)
+        cell_group[cells] = group
+        pair_cell, pair_product = self.pairs
+        pair_group = cell_group[pair_cell]
+        in_scope = pair_group >= 0
+        n_products = int(pair_product.max()) + 1 if len(pair_product) else 1
+        distinct = np.unique(pair_group[in_scope] * n_products + pair_product[in_scope])
+        versions = np.bincount(distinct // n_products, minlength=len(groups))
+
+        merged = None
+        if quantiles:
+            members = [[] for _ in range(len(groups))]
+            for g, c in zip(group.tolist(), cells.tolist()):
+                members[g].append(self.sketches[c])
+            merged = [KLLSketch(self.sketches[0].k).merge_many(m) for m in members]
+
+        rows = []
+        for g in range(len(groups)):
+            cell = cells[first[g]]
+            row = {dim: self._label(dim, cell) for dim in by}
+            row.update(count=int(count[g]), sum=float(total[g]), mean=float(mean[g]), std=float(std[g]),
+                       min=float(low[g]), max=float(high[g]), versions=int(versions[g]))
+            if merged is not None:
+                row['quantiles'] = merged[g].quantiles(quantiles).tolist()
+            rows.append(row)
+        return rows
+
+    def _label(self, dim, cell):
+        value = self.labels[dim][self.codes[dim][cell]]
+        return str(value) if dim == 'month' else value
+
+
+# --- Dashboard sheets ----------------------------------------------------
+
+def segment_sheet(cube, filters=None, start=None, end=None):
+    """"Estructura de Precios por Segmento": min / median / avg / max per tipo_vehiculo."""
+    rows = cube.rollup(('tipo_vehiculo',), filters, start, end, quantiles=(0.5,))
+    return {
+        'name': 'Estructura de Precios por Segmento',
+        'chart_type': 'bar',
+        'chart_title': 'Estructura de Precios por Segmento',
+        'data': sorted(({
+            "Segmento": r['tipo_vehiculo'] or "Sin segmento",
+            "Mínimo": r['min'],
+            "Mediana": r['quantiles'][0],
+            "Promedio": r['mean'],
+            "Máximo": r['max'],
+            "Cantidad": r['versions'],
+        } for r in rows), key=lambda r: str(r["Segmento"])),
+    }
+
+
+def brand_sheet(cube, filters=None, start=None, end=None):
+    """"Composición por Marca": average price and share of versions per brand."""
+    rows = cube.rollup(('brand',), filters, start, end)
+    total = sum(r['versions'] for r in rows) or 1
+    return {
+        'name': 'Composición por Marca',
+        'chart_type': 'bar',
+        'chart_title': 'Participación por Marca',
+        'data': [{
+            "Marca": r['brand'],
+            "Precio Promedio": r['mean'],
+            "Cantidad": r['versions'],
+            "Participación %": r['versions'] / total,
+        } for r in sorted(rows, key=lambda r: -r['versions'])],
+    }
+
+
+def monthly_sheet(cube, filters=None, start=None, end=None):
+    """"Variación Mensual por Marca": average price in the first and last month
+    of each brand, the change between them and the mean month-on-month change
+    (fractions, like the frontend sends them)."""
+    rows = cube.rollup(('brand', 'month'), filters, start, end)
+    by_brand = {}
+    for r in rows:  # rollup groups are sorted by brand code, then month
+        by_brand.setdefault(r['brand'], []).append(r['mean'])
+    data = []
+    for brand, means in by_brand.items():
+        means = np.asarray(means)
+        steps = means[1:] / means[:-1] - 1
+        data.append({
+            "Marca": brand,
+            "Precio Mes Inicial": float(means[0]),
+            "Precio Mes Final": float(means[-1]),
+            "Variación %": float(means[-1] / means[0] - 1),
+            "Variación Mensual Prom. %": float(steps.mean()) if len(steps) else 0.0,
+        })
+    return {
+        'name': 'Variación Mensual por Marca',
+        'chart_type': 'bar',
+        'chart_title': 'Variación de Precios por Marca',
+        'data': sorted(data, key=lambda r: r["Variación %"]),
+    }
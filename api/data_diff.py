@@ -0,0 +1,163 @@
+# Diff of two as-of snapshots: added, removed and repriced versions.
+#
+# The compare page diffs two dates row by row in the browser and sends the
+# finished tables ("Resumen Comparación": Marca, Modelo, Versión, Precio
+# Actual, ...) to generate-ppt-compare. Here two data_snapshot.Snapshot
+# objects are joined on product id in one vector pass (both are sorted by
+# product, so the join is a searchsorted) and every delta is computed on
+# whole columns:
+#
+#     history = PriceHistory.from_store(store, filters)
+#     diff = diff_snapshots(history.snapshot('2024-01-31'), history.snapshot('2024-06-30'))
+#     diff.counts()           # {'added': ..., 'removed': ..., 'repriced': ..., 'unchanged': ...}
+#     diff_sheets(diff)       # generate-excel / generate-ppt sheets
+#     diff_slides(diff)       # generate-ppt-compare slides
+#
+# A version is repriced when its price (con bono) or its bono changed. As-of
+# snapshots carry a version's last price forward forever, so a version only
+# counts as removed when `max_age` is given and it was not seen in the
+# `max_age` days up to a snapshot's date.
+# Variations are fractions, as the frontend sends them.
+
+import numpy as np
+
+TOP_CHART = 20
+
+
+def _join(old_ids, new_ids):
+    """(old rows, new rows) of the ids present in both sorted id arrays."""
+    position = np.searchsorted(old_ids, new_ids)
+    found = position < len(old_ids)
+    found[found] = old_ids[position[found]] == new_ids[found]
+    return position[found], np.flatnonzero(found)
+
+
+def _live(snap, max_age):
+    """Rows of a snapshot seen in the last `max_age` days (all without it)."""
+    if max_age is None or snap.as_of is None:
+        return np.arange(len(snap))
+    return np.flatnonzero(snap.day > np.datetime64(snap.as_of, 'D') - int(max_age))
+
+
+class SnapshotDiff:
+    """Row positions and deltas between an `old` and a `new` Snapshot."""
+
+    def __init__(self, old, new, max_age=None):
+        self.old = old
+        self.new = new
+        old_live, new_live = _live(old, max_age), _live(new, max_age)
+        old_rows, new_rows = _join(old.product_id[old_live], new.product_id[new_live])
+        old_rows, new_rows = old_live[old_rows], new_live[new_rows]
+        self.added = np.setdiff1d(new_live, new_rows, assume_unique=True)
+        self.removed = np.setdiff1d(old_live, old_rows, assume_unique=True)
+
+        before, after = old.price[old_rows], new.price[new_rows]
+        bono_before, bono_after = np.nan_to_num(old.bono[old_rows]), np.nan_to_num(new.bono[new_rows])
+        delta = after - before
+        with np.errstate(invalid='ignore', divide='ignore'):
+            change = np.where(before > 0, delta / before, np.nan)
+        bono_delta = bono_after - bono_before
+        # NaN != NaN: a price that stays missing is not a change
+        moved = (np.nan_to_num(delta) != 0) | (np.isnan(before) != np.isnan(after)) | (bono_delta != 0)
+        # Repriced rows, biggest relative move first
+        order = np.argsort(-np.abs(np.nan_to_num(change[moved])), kind='stable')
+        self.old_rows = old_rows[moved][order]
+        self.new_rows = new_rows[moved][order]
+        self.delta = delta[moved][order]
+        self.change = change[moved][order]
+        self.bono_delta = bono_delta[moved][order]
+        self.unchanged = int(len(moved) - moved.sum())
+
+    def counts(self):
+        return {
+            'added': int(len(self.added)),
+            'removed': int(len(self.removed)),
+            'repriced': int(len(self.new_rows)),
+            'unchanged': self.unchanged,
+        }
+
+
+def diff_snapshots(old, new, max_age=None):
+    """SnapshotDiff of two data_snapshot.Snapshot objects."""
+    return SnapshotDiff(old, new, max_age)
+
+
+def _num(values):
+    return [None if v != v else v for v in np.asarray(values, dtype=np.float64).tolist()]
+
+
+def _versions(snap, rows):
+    """Marca / Modelo / Versión columns for `rows` of a snapshot."""
+    attrs = snap.attrs
+    submodel, name = attrs['submodel'][rows].tolist(), attrs['name'][rows].tolist()
+    return (attrs['brand'][rows].tolist(), attrs['model'][rows].tolist(),
+            [s or n or '' for s, n in zip(submodel, name)])
+
+
+def repriced_rows(diff):
+    """"Resumen Comparación" rows for the repriced versions."""
+    old, new = diff.old, diff.new
+    brand, model, version = _versions(new, diff.new_rows)
+    columns = zip(brand, model, version,
+                  _num(old.price[diff.old_rows]), _num(new.price[diff.new_rows]), _num(diff.delta),
+                  _num(diff.change), _num(np.nan_to_num(old.bono[diff.old_rows])),
+                  _num(np.nan_to_num(new.bono[diff.new_rows])), _num(diff.bono_delta))
+    return [{
+        "Marca": b, "Modelo": m, "Versión": v,
+        "Precio Anterior": p0, "Precio Actual": p1, "Δ Precio": dp, "Variación %": c,
+        "Bono Anterior": b0, "Bono Actual": b1, "Δ Bono": db,
+    } for b, m, v, p0, p1, dp, c, b0, b1, db in columns]
+
+
+def listed_rows(snap, rows, price_header):
+    """Marca / Modelo / Versión / price rows (added or removed versions)."""
+    brand, model, version = _versions(snap, rows)
+    columns = zip(brand, model, version, _num(snap.price[rows]), _num(np.nan_to_num(snap.bono[rows])))
+    return [{"Marca": b, "Modelo": m, "Versión": v, price_header: p, "Bono": bono}
+            for b, m, v, p, bono in columns]
+
+
+def change_rows(diff, top=TOP_CHART):
+    """Chart rows (Versión, Variación %) of the `top` biggest relative moves."""
+    rows = diff.new_rows[:top]
+    brand, _, version = _versions(diff.new, rows)
+    return [{"Versión": f"{b} {v}".strip(), "Variación %": c}
+            for b, v, c in zip(brand, version, _num(diff.change[:top]))]
+
+
+def diff_sheets(diff, top=TOP_CHART):
+    """Sheets for generate-ppt / generate-excel (chart + table each)."""
+    dates = f"{diff.old.as_of or 'inicio'} → {diff.new.as_of or 'hoy'}"
+    return [{
+        'name': 'Resumen Comparación',
+        'chart_type': 'bar',
+        'chart_title': f'Versiones con Cambio de Precio ({dates})',
+        'data': repriced_rows(diff),
+    }, {
+        'name': 'Variación de Precios',
+        'chart_type': 'bar',
+        'chart_title': f'Mayores Variaciones de Precio ({dates})',
+        'data': change_rows(diff, top),
+    }, {
+        'name': 'Versiones Nuevas',
+        'chart_type': 'bar',
+        'chart_title': f'Versiones Nuevas ({dates})',
+        'data': listed_rows(diff.new, diff.added, "Precio Actual"),
+    }, {
+        'name': 'Versiones Retiradas',
+        'chart_type': 'bar',
+        'chart_title': f'Versiones Retiradas ({dates})',
+        'data': listed_rows(diff.old, diff.removed, "Último Precio"),
+    }]
+
+
+def diff_slides(diff, top=TOP_CHART):
+    """generate-ppt-compare `slides`: the variation chart plus one table per
+    non-empty sheet."""
+    sheets = diff_sheets(diff, top)
+    chart = sheets[1]
+    slides = [{'type': 'chart', 'chart_type': chart['chart_type'], 'chart_title': chart['chart_title'],
+               'name': chart['name'], 'data': chart['data']}] if chart['data'] else []
+    slides += [{'type': 'table', 'title': s['name'], 'data': s['data']}
+               for s in sheets if s is not chart and s['data']]
+    return slides
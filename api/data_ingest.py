@@ -0,0 +1,281 @@
+# Streaming ingestion of scraping dumps (JSON arrays, NDJSON, CSV).
+#
+# Python port of the upload-json normalisation (supabase/functions/
+# upload-json): rows follow the JsonData schema (UID, ID_Base, Categoría,
+# Modelo Principal, Modelo, precio_num, precio_lista_num, bono_num, Fecha,
+# Estado, ...). Instead of loading the whole array, files are parsed one
+# record at a time and emitted as fixed-size batches, so a multi-hundred-MB
+# dump is processed in memory proportional to the batch size plus the
+# product map (one entry per ID_Base, i.e. the catalogue, not the rows).
+#
+#     for batch in ingest('dump.json', stats=stats):
+#         upsert(batch.products)     # new or changed products only
+#         insert(batch.prices)       # price rows, keyed by id_base
+#
+# Rules kept identical to upload-json: normalizeEstado, the deterministic
+# ID_Base slug, required fields, the products row (brand = category =
+# Categoría) and parseFinancialNumber.
+
+import re
+import os
+import csv
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+BATCH_SIZE = 1000  # upload-json CHUNK_SIZE
+READ_SIZE = 1 << 20
+MAX_SKIPPED_SAMPLES = 20
+
+_SLUG_DROP = re.compile(r'[^A-Z0-9]')
+_JSON_SEPARATORS = re.compile(r'[\s,\[\]]*')
+_CURRENCY_CHARS = re.compile(r'[$\sA-Za-z]')
+
+ESTADO_KEYS = ('estado',)
+TIPO_VEHICULO_KEYS = ('tipo_vehiculo', 'tipovehiculo', 'tipo vehiculo')
+
+
+def normalize_estado(value):
+    """'nuevo' | 'vigente' | 'inactivo' (upload-json normalizeEstado)."""
+    s = str(value if value is not None else '').strip().lower()
+    if s in ('nuevo', 'new'):
+        return 'nuevo'
+    if s in ('inactivo', 'inactive'):
+        return 'inactivo'
+    return 'vigente'
+
+
+def _clean(value):
+    return _SLUG_DROP.sub('', value.strip().upper()) if value else ''
+
+
+def id_base_slug(categoria, modelo, submodelo):
+    """Deterministic ID_Base for rows that arrive without one."""
+    return f"{_clean(categoria)}-{_clean(modelo)}-{_clean(submodelo)}"
+
+
+def parse_financial_number(value):
+    """upload-json parseFinancialNumber: "26.290.000" -> 26290000.0."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    clean = _CURRENCY_CHARS.sub('', str(value).strip())
+    if '.' in clean and ',' not in clean:
+        # Dots as thousands separators; a single dot only on long numbers
+        if clean.count('.') > 1 or len(clean) > 5:
+            clean = clean.replace('.', '')
+    clean = clean.replace(',', '.')
+    match = re.match(r'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?', clean)
+    return float(match.group(0)) if match else None
+
+
+def _field(item, names):
+    """First value whose key matches `names` case-insensitively (as upload-json)."""
+    for key, value in item.items():
+        if key and key.lower() in names:
+            return value
+    return None
+
+
+def _iso(value):
+    """JS `new Date(value).toISOString()` for ISO dates (date-only is UTC midnight)."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(str(value).strip())
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return _js_iso(parsed)
+
+
+def _js_iso(moment):
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def normalize_record(item, now=None):
+    """(product, price) rows for one JsonData record, or None when a required
+    field (Categoría, Modelo Principal, Modelo, ID_Base) is missing."""
+    categoria = item.get('Categoría')
+    modelo_principal = item.get('Modelo Principal')
+    modelo = item.get('Modelo')
+    submodelo = item.get('Submodelo') or modelo
+
+    id_base = item.get('ID_Base')
+    if not id_base and categoria and modelo:
+        id_base = id_base_slug(categoria, modelo, submodelo)
+    if not categoria or not modelo_principal or not modelo or not id_base:
+        return None
+
+    estado = normalize_estado(_field(item, ESTADO_KEYS))
+    product = {
+        'brand': categoria,
+        'category': categoria,
+        'model': modelo_principal,
+        'name': modelo,
+        'id_base': id_base,
+        'submodel': modelo,
+        'estado': estado,
+        'tipo_vehiculo': _field(item, TIPO_VEHICULO_KEYS) or None,
+    }
+
+    now = now or datetime.now(timezone.utc)
+    precio = parse_financial_number(item.get('precio_num'))
+    fecha = item.get('Fecha') or now.date().isoformat()
+    try:
+        date = _iso(fecha)
+        timestamp = _iso(item.get('Timestamp')) or _js_iso(now)
+    except ValueError:
+        return None
+    price = {
+        'id_base': id_base,
+        'uid': item.get('UID') or uuid.uuid4().hex[:12],
+        'store': f"{categoria or 'DDS'} Store",
+        'price': precio or 0,
+        'date': date,
+        'ctx_precio': item.get('ctx_precio') or None,
+        'precio_num': precio or 0,
+        'precio_lista_num': parse_financial_number(item.get('precio_lista_num')),
+        'bono_num': parse_financial_number(item.get('bono_num')),
+        'precio_texto': item.get('Precio_Texto') or item.get('precio_texto'),
+        'fuente_texto_raw': item.get('fuente_texto_raw') or None,
+        'modelo_url': item.get('Modelo_URL') or None,
+        'archivo_origen': item.get('Archivo_Origen') or None,
+        'timestamp_data': timestamp,
+        'status_normalized': estado,
+    }
+    return product, price
+
+
+# --- Readers -------------------------------------------------------------
+
+def iter_json(fh, read_size=READ_SIZE):
+    """Objects of a JSON array (or NDJSON) read `read_size` chars at a time."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+    while True:
+        pos = _JSON_SEPARATORS.match(buf, pos).end()
+        if pos < len(buf):
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+                yield obj
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            return
+        # Need more input: keep the unparsed tail, append the next chunk
+        chunk = fh.read(read_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+
+
+def iter_csv(fh):
+    """Rows of a CSV dump as dicts (quoted multi-line fields included)."""
+    yield from csv.DictReader(fh)
+
+
+def iter_records(path):
+    """Records of a .json / .ndjson / .csv dump, one at a time."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8-sig', newline='' if ext == '.csv' else None) as fh:
+        yield from (iter_csv(fh) if ext == '.csv' else iter_json(fh))
+
+
+# --- Pipeline ------------------------------------------------------------
+
+class IngestStats:
+    """Throughput and data-quality counters for one ingestion run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.bytes = 0
+        self.records = 0
+        self.skipped = 0
+        self.prices = 0
+        self.products = 0
+        self.product_updates = 0
+        self.batches = 0
+        self.skipped_samples = []
+
+    def skip(self, index, item):
+        self.skipped += 1
+        if len(self.skipped_samples) < MAX_SKIPPED_SAMPLES:
+            self.skipped_samples.append({'index': index, 'ID_Base': item.get('ID_Base'),
+                                         'Modelo': item.get('Modelo')})
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def as_dict(self):
+        elapsed = self.elapsed or (time.perf_counter() - self.started)
+        return {
+            'records': self.records, 'skipped': self.skipped, 'prices': self.prices,
+            'products': self.products, 'product_updates': self.product_updates,
+            'batches': self.batches, 'bytes': self.bytes, 'elapsed_s': round(elapsed, 3),
+            'records_per_s': round(self.records / elapsed) if elapsed else None,
+            'mb_per_s': round(self.bytes / elapsed / 1e6, 2) if elapsed else None,
+            'skipped_samples': self.skipped_samples,
+        }
+
+
+class Batch:
+    __slots__ = ('products', 'prices')
+
+    def __init__(self, products, prices):
+        self.products = products
+        self.prices = prices
+
+
+def ingest(source, batch_size=BATCH_SIZE, stats=None):
+    """Yields Batch objects of at most `batch_size` price rows.
+
+    `source` is a dump path or any iterable of JsonData dicts. Products are
+    deduped by ID_Base (last record wins, as in upload-json); each batch
+    carries only the products first seen, or changed, since the previous
+    batch, so they can be upserted before its prices are inserted.
+    """
+    stats = stats if stats is not None else IngestStats()
+    if isinstance(source, str):
+        stats.bytes = os.path.getsize(source)
+        records = iter_records(source)
+    else:
+        records = source
+
+    # id_base -> hash of the product row last sent downstream
+    seen = {}
+    pending_products, prices = {}, []
+    now = datetime.now(timezone.utc)
+
+    for index, item in enumerate(records):
+        stats.records += 1
+        rows = normalize_record(item, now) if isinstance(item, dict) else None
+        if rows is None:
+            stats.skip(index, item if isinstance(item, dict) else {})
+            continue
+        product, price = rows
+        key = product['id_base']
+        digest = hash(tuple(product.values()))
+        previous = seen.get(key)
+        if previous != digest:
+            if previous is None:
+                stats.products += 1
+            else:
+                stats.product_updates += 1
+            seen[key] = digest
+            pending_products[key] = product
+        prices.append(price)
+
+        if len(prices) >= batch_size:
+            stats.batches += 1
+            stats.prices += len(prices)
+            yield Batch(list(pending_products.values()), prices)
+            pending_products, prices = {}, []
+
+    if prices or pending_products:
+        stats.batches += 1
+        stats.prices += len(prices)
+        yield Batch(list(pending_products.values()), prices)
+    stats.stop()
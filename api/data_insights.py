@@ -0,0 +1,229 @@
+# Automatic price insights from robust z-scores.
+#
+# get-insights derives its cards from fixed rules (a brand moved more than
+# 5% in 30 days, the cheapest models, ...). Here every version is compared
+# with its segment peers (tipo_vehiculo) and flagged when it sits far from
+# them, using robust z-scores (median / MAD, so a few extreme values do not
+# hide each other) computed for all segments at once with grouped sorts:
+#
+#     insights = price_insights(history, index)     # ranked, priority 1 first
+#     insights_sheet(insights)                      # "Insights" sheet / slide
+#
+# Detectors (same insight shape as get-insights):
+# - price_anomaly: a price change between two consecutive observations, over
+#   the whole history (or the [start, end] window), unusual among the price
+#   changes of the segment; only the strongest move per version is kept.
+# - bono_spike: a bono / list price ratio well above the segment's (versions
+#   with a bono only; high side).
+# - list_price_outlier: a list price far from the segment's, on a log scale.
+# A value is flagged at |z| >= 3.5 (Iglesias & Hoaglin); segments with fewer
+# than MIN_PEERS values are skipped. Priority 1 is the strongest.
+
+import numpy as np
+
+try:
+    from api.data_movers import version_label
+    from api.data_timeseries import SeriesIndex, from_day, to_day
+except ImportError:
+    from data_movers import version_label
+    from data_timeseries import SeriesIndex, from_day, to_day
+
+THRESHOLD = 3.5
+MIN_PEERS = 5
+MAX_INSIGHTS = 20
+_MAD_SCALE = 0.6745       # MAD of a normal distribution / its std
+_MEAN_AD_SCALE = 1.253314  # std / mean absolute deviation of a normal distribution
+
+
+def _group_median(values, codes, counts):
+    """Median of `values` per dense group code."""
+    order = np.lexsort((values, codes))
+    ordered = values[order]
+    starts = np.cumsum(counts) - counts
+    return (ordered[starts + (counts - 1) // 2] + ordered[starts + counts // 2]) / 2
+
+
+def robust_z(values, groups, min_peers=MIN_PEERS):
+    """Robust z-score of each value within its group: 0.6745 * (x - median) / MAD.
+
+    When a group's MAD is 0 (more than half its values equal) the mean
+    absolute deviation is used instead; NaN values, and groups with fewer
+    than `min_peers` values, get NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    z = np.full(len(values), np.nan)
+    ok = np.flatnonzero(~np.isnan(values))
+    if not len(ok):
+        return z
+    v = values[ok]
+    _, codes = np.unique(np.asarray(groups)[ok], return_inverse=True)
+    codes = codes.ravel()
+    counts = np.bincount(codes)
+    median = _group_median(v, codes, counts)
+    deviation = v - median[codes]
+    mad = _group_median(np.abs(deviation), codes, counts)
+    mean_ad = np.bincount(codes, weights=np.abs(deviation)) / counts
+    scale = np.where(mad > 0, mad / _MAD_SCALE, mean_ad * _MEAN_AD_SCALE)[codes]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z[ok] = np.where(scale > 0, deviation / scale, 0.0)
+    z[ok[counts[codes] < min_peers]] = np.nan
+    return z
+
+
+def _priority(z, threshold):
+    z = abs(z)
+    return 1 if z >= 2 * threshold else 2 if z >= 1.5 * threshold else 3
+
+
+def _strongest(z, flagged, limit):
+    """Positions of the `limit` flagged values with the largest |z|."""
+    candidates = np.flatnonzero(flagged)
+    order = np.argsort(-np.abs(z[candidates]), kind='stable')
+    return candidates[order[:limit]]
+
+
+def _segment(value):
+    return value or 'Sin segmento'
+
+
+def price_moves(history, index, start=None, end=None, threshold=THRESHOLD, limit=MAX_INSIGHTS):
+    """price_anomaly insights: unusual consecutive price changes per segment."""
+    keys, offsets = np.asarray(index.keys), np.asarray(index.offsets)
+    days, prices = np.asarray(index.days), np.asarray(index.values['price'])
+    position = np.repeat(np.arange(len(keys)), np.diff(offsets))
+    current = np.arange(1, len(days))
+    previous = current - 1
+    # Attributes of the history's products only (the filter scope)
+    product = np.searchsorted(history.product_ids, keys)
+    in_scope = product < len(history.product_ids)
+    in_scope[in_scope] = history.product_ids[product[in_scope]] == keys[in_scope]
+    ok = (position[current] == position[previous]) & in_scope[position[current]]
+    ok &= (prices[previous] > 0) & (prices[current] > 0)
+    if start is not None:
+        ok &= days[current] >= to_day(start)
+    if end is not None:
+        ok &= days[current] <= to_day(end)
+    current, previous = current[ok], previous[ok]
+    change = prices[current] / prices[previous] - 1
+    moved = change != 0
+    current, previous, change = current[moved], previous[moved], change[moved]
+
+    product = product[position[current]]
+    segment = history.product_attrs['tipo_vehiculo'][product].astype(str)
+    z = robust_z(change, segment)
+    flagged = np.abs(np.nan_to_num(z)) >= threshold
+    # Strongest move per version
+    candidates = np.flatnonzero(flagged)
+    candidates = candidates[np.argsort(-np.abs(z[candidates]), kind='stable')]
+    _, first = np.unique(product[candidates], return_index=True)
+    candidates = candidates[np.sort(first)][:limit]
+
+    out = []
+    for i in candidates.tolist():
+        p = int(product[i])
+        attrs = {f: values[p] for f, values in history.product_attrs.items()}
+        label, seg = version_label(attrs), _segment(attrs['tipo_vehiculo'])
+        c, date = float(change[i]), from_day(days[current[i]])
+        out.append({
+            'insight_type': 'price_anomaly',
+            'title': f"{label}: Variación de Precio Atípica",
+            'description': f"El precio {'subió' if c > 0 else 'bajó'} {abs(c) * 100:.1f}% el {date}, "
+                           f"un cambio fuera de lo habitual en {seg} (z = {z[i]:.1f})",
+            'data': {
+                'product_id': int(history.product_ids[p]),
+                'brand': attrs['brand'],
+                'segment': seg,
+                'previous_price': float(prices[previous[i]]),
+                'current_price': float(prices[current[i]]),
+                'change_percent': round(c * 100, 2),
+                'date': date,
+                'z_score': float(z[i]),
+            },
+            'priority': _priority(z[i], threshold),
+        })
+    return out
+
+
+def bono_spikes(snap, threshold=THRESHOLD, limit=MAX_INSIGHTS):
+    """bono_spike insights: bono / list price ratios far above the segment's."""
+    lista, bono = np.nan_to_num(snap.lista), np.nan_to_num(snap.bono)
+    ok = (lista > 0) & (bono > 0)
+    ratio = np.where(ok, bono / np.where(ok, lista, 1), np.nan)
+    z = robust_z(ratio, snap.attrs['tipo_vehiculo'].astype(str))
+    out = []
+    for i in _strongest(z, np.nan_to_num(z) >= threshold, limit).tolist():
+        attrs = {f: values[i] for f, values in snap.attrs.items()}
+        label, seg = version_label(attrs), _segment(attrs['tipo_vehiculo'])
+        out.append({
+            'insight_type': 'bono_spike',
+            'title': f"{label}: Bono Atípico",
+            'description': f"El bono equivale al {ratio[i] * 100:.1f}% del precio de lista, "
+                           f"muy sobre lo habitual en {seg} (z = {z[i]:.1f})",
+            'data': {
+                'product_id': int(snap.product_id[i]),
+                'brand': attrs['brand'],
+                'segment': seg,
+                'bono': float(bono[i]),
+                'precio_lista': float(lista[i]),
+                'bono_percent': round(float(ratio[i]) * 100, 2),
+                'z_score': float(z[i]),
+            },
+            'priority': _priority(z[i], threshold),
+        })
+    return out
+
+
+def list_price_outliers(snap, threshold=THRESHOLD, limit=MAX_INSIGHTS):
+    """list_price_outlier insights: list prices far from the segment's (log scale)."""
+    lista = np.nan_to_num(snap.lista)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_price = np.where(lista > 0, np.log(np.where(lista > 0, lista, 1)), np.nan)
+    z = robust_z(log_price, snap.attrs['tipo_vehiculo'].astype(str))
+    out = []
+    for i in _strongest(z, np.abs(np.nan_to_num(z)) >= threshold, limit).tolist():
+        attrs = {f: values[i] for f, values in snap.attrs.items()}
+        label, seg = version_label(attrs), _segment(attrs['tipo_vehiculo'])
+        out.append({
+            'insight_type': 'list_price_outlier',
+            'title': f"{label}: Precio de Lista Atípico",
+            'description': f"Precio de lista muy {'sobre' if z[i] > 0 else 'bajo'} el de sus pares en {seg} "
+                           f"(z = {z[i]:.1f})",
+            'data': {
+                'product_id': int(snap.product_id[i]),
+                'brand': attrs['brand'],
+                'segment': seg,
+                'precio_lista': float(lista[i]),
+                'z_score': float(z[i]),
+            },
+            'priority': _priority(z[i], threshold),
+        })
+    return out
+
+
+def price_insights(history, index=None, start=None, end=None, threshold=THRESHOLD, limit=MAX_INSIGHTS):
+    """Every detector's insights for a data_snapshot.PriceHistory, ranked;
+    `index` (a SeriesIndex covering the history) is built if missing."""
+    if index is None:
+        index = SeriesIndex.from_history(history)
+    snap = history.snapshot(end)
+    found = (price_moves(history, index, start, end, threshold, limit),
+             bono_spikes(snap, threshold, limit),
+             list_price_outliers(snap, threshold, limit))
+    # By priority, then round-robin over detectors (z-scores of different
+    # measures are not comparable, and price jumps would crowd out the rest)
+    ranked = sorted((i['priority'], rank, kind, i)
+                    for kind, insights in enumerate(found) for rank, i in enumerate(insights))
+    return [i for *_, i in ranked[:limit]]
+
+
+def insights_sheet(insights):
+    """"Insights" sheet: one row per insight with its z-score."""
+    return {
+        'name': 'Insights',
+        'chart_type': 'bar',
+        'chart_title': 'Hallazgos Automáticos de Precios',
+        'data': [{
+            "Hallazgo": i['title'],
+            "Puntaje z": i['data']['z_score'],
+            "Detalle": i['description'],
+        } for i in insights],
+    }
@@ -0,0 +1,109 @@
+# Top-K price movers ("destacados") from the time-series index.
+#
+# get-destacados pulls the whole price history ordered by date, then maps,
+# filters and fully sorts it to find the biggest recent price changes. Here
+# the change per product comes from a data_timeseries.SeriesIndex in a few
+# vectorised lookups, and the K biggest drops and rises are picked with heap
+# selection (O(n log K)) instead of sorting every product:
+#
+#     drops, rises = top_movers(index, k=10)                    # latest vs previous scrape
+#     drops, rises = top_movers(index, start='2024-01-01', end='2024-06-30')
+#     movers_sheets(drops, rises, store.products())             # "Destacados" sheets
+#
+# Without `start` each product's latest price is compared with its previous
+# observation (as recentChanges upstream); with `start` / `end`, the prices
+# as of both dates are compared. Changes are fractions; moves smaller than
+# `min_change` (2%, as upstream) are not highlighted.
+
+import heapq
+
+import numpy as np
+
+try:
+    from api.data_timeseries import from_day, to_day
+except ImportError:
+    from data_timeseries import from_day, to_day
+
+TOP_K = 10
+MIN_CHANGE = 0.02
+
+
+def price_changes(index, start=None, end=None, since=None, product_ids=None):
+    """(product ids, previous rows, current rows, changes) for every product
+    with a valid price at both ends. `since` keeps products whose current
+    price was seen on or after that day; `product_ids` restricts the scope."""
+    keys = np.asarray(index.keys)
+    offsets = np.asarray(index.offsets)
+    if product_ids is not None:
+        scope = np.isin(keys, np.asarray(product_ids, dtype=np.int64))
+    else:
+        scope = np.ones(len(keys), dtype=bool)
+    if end is None:
+        current = offsets[1:] - 1
+        current = np.where(offsets[1:] > offsets[:-1], current, -1)
+    else:
+        current = index.as_of_rows(keys, end)
+    if start is None:
+        previous = np.where(current - 1 >= offsets[:-1], current - 1, -1)
+    else:
+        previous = index.as_of_rows(keys, start)
+        previous[previous == current] = -1
+    ok = scope & (current >= 0) & (previous >= 0)
+    if since is not None:
+        ok[ok] = np.asarray(index.days)[current[ok]] >= to_day(since)
+
+    prices = index.values['price']
+    keys, previous, current = keys[ok], previous[ok], current[ok]
+    before, after = np.asarray(prices[previous]), np.asarray(prices[current])
+    valid = (before > 0) & (after > 0)
+    keys, previous, current = keys[valid], previous[valid], current[valid]
+    return keys, previous, current, after[valid] / before[valid] - 1
+
+
+def top_movers(index, k=TOP_K, start=None, end=None, since=None, min_change=MIN_CHANGE, product_ids=None):
+    """(drops, rises): the `k` biggest price cuts and increases, biggest first."""
+    keys, previous, current, change = price_changes(index, start, end, since, product_ids)
+    values = change.tolist()
+    drops = heapq.nsmallest(k, (i for i, c in enumerate(values) if c <= -min_change), key=values.__getitem__)
+    rises = heapq.nlargest(k, (i for i, c in enumerate(values) if c >= min_change), key=values.__getitem__)
+    prices, days = index.values['price'], index.days
+
+    def mover(i):
+        return {
+            'product_id': int(keys[i]),
+            'previous_price': float(prices[previous[i]]),
+            'current_price': float(prices[current[i]]),
+            'previous_date': from_day(days[previous[i]]),
+            'date': from_day(days[current[i]]),
+            'change': values[i],
+        }
+    return [mover(i) for i in drops], [mover(i) for i in rises]
+
+
+def version_label(product):
+    """"Brand submodel" (or brand name) display label of a product's attributes."""
+    version = product.get('submodel') or product.get('name') or ''
+    return f"{product.get('brand') or ''} {version}".strip()
+
+
+def movers_sheets(drops, rises, products):
+    """"Destacados" sheets (table + variation chart) for top_movers output;
+    `products` maps product id -> {brand, submodel / name, ...}."""
+    def rows(movers):
+        return [{
+            "Versión": version_label(products.get(m['product_id'], {})),
+            "Precio Anterior": m['previous_price'],
+            "Precio Actual": m['current_price'],
+            "Variación %": m['change'],
+        } for m in movers]
+    return [{
+        'name': 'Destacados - Bajas de Precio',
+        'chart_type': 'bar',
+        'chart_title': 'Mayores Bajas de Precio',
+        'data': rows(drops),
+    }, {
+        'name': 'Destacados - Alzas de Precio',
+        'chart_type': 'bar',
+        'chart_title': 'Mayores Alzas de Precio',
+        'data': rows(rises),
+    }]
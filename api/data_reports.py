@@ -0,0 +1,202 @@
+# Cached analytics and dashboard payloads over a data_store.PriceStore.
+#
+# PriceStore only stores and queries price_data / products; everything
+# derived from it (cube, series index, trends, volatility, movers, insights,
+# snapshot diffs and the full generate-ppt / generate-excel payload) is
+# built here and cached per canonical filter set and data version
+# (data_cache):
+#
+#     reports = PriceReports(store)
+#     payload = reports.dashboard_payload({'brand': ['Toyota']})
+#     sheets = reports.compare_sheets('2024-01-31', '2024-06-30')
+#
+# The filtered PriceHistory behind those results is kept too, one per
+# (canonical filters, version), so its per-as_of snapshot cache serves every
+# method and date asked for the same filters. Snapshots filtered on indexed
+# fields only (data_bitmap.FILTER_FIELDS) skip the filtered load altogether:
+# they are rows of the whole-store snapshot, picked through its FilterIndex.
+# Loading a new batch bumps store.version, which drops every cached result,
+# history, cube and index.
+
+import threading
+from collections import OrderedDict
+
+try:
+    from api.data_snapshot import PriceHistory
+    from api.data_bitmap import FILTER_FIELDS, FilterIndex
+    from api.data_cube import PriceCube, brand_sheet, monthly_sheet, segment_sheet
+    from api.data_cache import ResultCache, canonical_filters
+    from api.data_trends import brand_trends, trend_sheet
+    from api.data_volatility import rolling_volatility, volatility_scope, volatility_sheet
+    from api.data_timeseries import SeriesIndex
+    from api.data_movers import movers_sheets, top_movers
+    from api.data_insights import insights_sheet, price_insights
+    from api.data_diff import diff_sheets, diff_snapshots
+except ImportError:
+    from data_snapshot import PriceHistory
+    from data_bitmap import FILTER_FIELDS, FilterIndex
+    from data_cube import PriceCube, brand_sheet, monthly_sheet, segment_sheet
+    from data_cache import ResultCache, canonical_filters
+    from data_trends import brand_trends, trend_sheet
+    from data_volatility import rolling_volatility, volatility_scope, volatility_sheet
+    from data_timeseries import SeriesIndex
+    from data_movers import movers_sheets, top_movers
+    from data_insights import insights_sheet, price_insights
+    from data_diff import diff_sheets, diff_snapshots
+
+HISTORY_CACHE_SIZE = 8
+FILTER_INDEX_CACHE_SIZE = 4
+
+
+class PriceReports:
+    """Analytics over one PriceStore, cached per filter set and data version."""
+
+    def __init__(self, store, results=None):
+        self.store = store
+        self.results = results if results is not None else ResultCache()
+        self._lock = threading.RLock()
+        self._histories = OrderedDict()
+        self._filter_indexes = OrderedDict()
+        self._cube = None
+        self._index = None
+
+    def _cached(self, cache, key, build, size):
+        """LRU lookup in a per-version cache (entries of older versions are dropped)."""
+        with self._lock:
+            version = self.store.version
+            key = (key, version)
+            value = cache.get(key)
+            if value is None:
+                if any(k[1] != version for k in cache):
+                    cache.clear()
+                value = cache[key] = build()
+                if len(cache) > size:
+                    cache.popitem(last=False)
+            else:
+                cache.move_to_end(key)
+            return value
+
+    def history(self, filters=None):
+        """The filtered data_snapshot.PriceHistory, shared until the next load."""
+        return self._cached(self._histories, canonical_filters(filters),
+                            lambda: PriceHistory.from_store(self.store, filters), HISTORY_CACHE_SIZE)
+
+    def snapshot(self, filters=None, as_of=None):
+        """The filtered snapshot as of `as_of`; taken from the whole-store
+        snapshot through a FilterIndex when FilterIndex.supports(filters)."""
+        if not FilterIndex.supports(filters):
+            return self.history(filters).snapshot(as_of)
+        snap = self.history().snapshot(as_of)
+        index = self._cached(self._filter_indexes, None if as_of is None else str(as_of)[:10],
+                             lambda: FilterIndex.from_snapshot(snap), FILTER_INDEX_CACHE_SIZE)
+        return snap.take(index.rows(filters)) if filters else snap
+
+    def series_index(self):
+        """The data_timeseries.SeriesIndex of the whole store, rebuilt once per load."""
+        with self._lock:
+            version = self.store.version
+            if self._index is None or self._index[0] != version:
+                self._index = (version, SeriesIndex.from_history(self.history()))
+            return self._index[1]
+
+    def cube(self):
+        """The data_cube.PriceCube of the whole store, rebuilt once per load."""
+        with self._lock:
+            version = self.store.version
+            if self._cube is None or self._cube.version != version:
+                self._cube = PriceCube.build(self.history())
+            return self._cube
+
+    def _dashboard_payload(self, filters=None, title='Reporte Dashboard', as_of=None):
+        store = self.store
+        history = self.history(filters)
+        snap = self.snapshot(filters, as_of)
+        # Filters outside the cube dimensions get a cube of the filtered rows
+        cube = self.cube() if PriceCube.supports(filters) else PriceCube.build(history)
+        summary = snap.summary()
+        # From the canonical filters (the cache key), so every filter shape
+        # sharing this entry ({'brand': 'Kia'}, {'brand': ['Kia']}) reads the same
+        summary['filters'] = {k: list(v) for k, v in canonical_filters(filters) if k in FILTER_FIELDS}
+        sheets = [{
+            'name': 'Precios por Segmento',
+            'chart_type': 'bar',
+            'chart_title': 'Precios por Segmento (Min/Prom/Max)',
+            'data': snap.segments(),
+        }, {
+            'name': 'Evolución de Precios por Marca',
+            'chart_type': 'line',
+            'chart_title': 'Evolución de Precios por Marca',
+            'data': store.brand_evolution(filters, end=as_of),
+            'gaps': True,
+        }]
+        sheets += [sheet(cube, filters, end=as_of) for sheet in (segment_sheet, brand_sheet, monthly_sheet)]
+        sheets.append(trend_sheet(brand_trends(history, end=as_of)))
+        sheets.append(volatility_sheet(rolling_volatility(history, volatility_scope(filters), end=as_of)))
+        drops, rises = top_movers(self.series_index(), end=as_of, product_ids=history.product_ids)
+        sheets += movers_sheets(drops, rises, store.products(filters))
+        sheets.append(insights_sheet(price_insights(history, self.series_index(), end=as_of)))
+        return {
+            'title': title,
+            'currencySymbol': '$',
+            'summary': summary,
+            'models': snap.models(),
+            'sheets': sheets,
+        }
+
+    def models(self, filters=None, status='all', as_of=None):
+        """PriceStore.models (the dashboard `models` list), cached."""
+        return self.results.get_or_compute(
+            'models', filters, self.store.version, lambda: self.store.models(filters, status, as_of),
+            status, as_of)
+
+    def summary(self, filters=None, as_of=None):
+        """The summary block of the filtered snapshot."""
+        return self.results.get_or_compute(
+            'summary', filters, self.store.version,
+            lambda: self.snapshot(filters, as_of).summary(), as_of)
+
+    def brand_trends(self, filters=None, start=None, end=None):
+        """data_trends.brand_trends for the filtered history (one scan for all brands)."""
+        return self.results.get_or_compute(
+            'trends', filters, self.store.version,
+            lambda: brand_trends(self.history(filters), start, end), start, end)
+
+    def volatility_sheet(self, filters=None, granularity='month', window=3, metric='std'):
+        """"Volatilidad Temporal" sheet (data_volatility) for the filtered history."""
+        return self.results.get_or_compute(
+            'volatility', filters, self.store.version,
+            lambda: volatility_sheet(rolling_volatility(
+                self.history(filters), volatility_scope(filters), granularity, window,
+                start=(filters or {}).get('volatilityStartDate'), end=(filters or {}).get('volatilityEndDate')),
+                metric),
+            granularity, window, metric)
+
+    def destacados(self, filters=None, k=10, start=None, end=None):
+        """"Destacados" sheets: the `k` biggest price drops and rises (data_movers)."""
+        def compute():
+            products = self.store.products(filters)
+            drops, rises = top_movers(self.series_index(), k, start, end, product_ids=list(products))
+            return movers_sheets(drops, rises, products)
+        return self.results.get_or_compute('destacados', filters, self.store.version, compute, k, start, end)
+
+    def insights(self, filters=None, start=None, end=None, limit=20):
+        """Ranked price insights (data_insights) for the filtered history."""
+        return self.results.get_or_compute(
+            'insights', filters, self.store.version,
+            lambda: price_insights(self.history(filters), self.series_index(), start, end,
+                                   limit=limit),
+            start, end, limit)
+
+    def compare_sheets(self, start, end=None, filters=None, max_age=None):
+        """data_diff sheets (added / removed / repriced versions) between the
+        snapshots as of `start` and `end`."""
+        def compute():
+            history = self.history(filters)
+            return diff_sheets(diff_snapshots(history.snapshot(start), history.snapshot(end), max_age))
+        return self.results.get_or_compute('compare', filters, self.store.version, compute, start, end, max_age)
+
+    def dashboard_payload(self, filters=None, title='Reporte Dashboard', as_of=None):
+        """A generate-ppt / generate-excel payload built from the store."""
+        return self.results.get_or_compute(
+            'dashboard', filters, self.store.version, lambda: self._dashboard_payload(filters, title, as_of),
+            title, as_of)
@@ -0,0 +1,222 @@
+# Vectorised "current market" snapshots from columnar price history.
+#
+# get-analytics walks every price_data row into a latestPrices map. Here the
+# history is held as numpy columns (product, day, price, list price, bono),
+# sorted once by (product, day, row); a snapshot as of any day is then a
+# mask plus a "last row of each product run" pick, with no Python loop over
+# rows. Snapshots are cached per as-of day and feed the summary, segment and
+# models tables:
+#
+#     history = PriceHistory.from_store(store, {'tipoVehiculo': ['SUV']})
+#     snap = history.snapshot('2024-06-30')
+#     snap.summary(), snap.segments(), snap.models()
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from api.report_stats import array_stats, price_arrays
+except ImportError:
+    from report_stats import array_stats, price_arrays
+
+SNAPSHOT_CACHE_SIZE = 16
+PRODUCT_FIELDS = ('brand', 'model', 'submodel', 'name', 'estado', 'tipo_vehiculo')
+
+
+def _day(value):
+    return np.datetime64(str(value)[:10], 'D')
+
+
+def latest_rows(product, day, as_of=None, order=None):
+    """Index of the latest row per product (on or before `as_of`).
+
+    `order` is a precomputed (product, day, row) sort; ties on the same day
+    keep the later row, like a DESC date sort with later inserts winning.
+    """
+    if order is None:
+        rows = np.arange(len(product))
+        order = np.lexsort((rows, day, product))
+    if as_of is not None:
+        order = order[day[order] <= _day(as_of)]
+    runs = product[order]
+    last = np.r_[runs[1:] != runs[:-1], True] if len(runs) else np.zeros(0, dtype=bool)
+    return order[last]
+
+
+def _group_codes(*columns):
+    """(code per row, first row per code) for a tuple of object columns; codes
+    in first-seen order, None and '' in the same group (report_stats keys
+    versions on `submodel or ''`)."""
+    index, first = {}, []
+    codes = np.empty(len(columns[0]), dtype=np.int64)
+    for row, key in enumerate(zip(*(['' if v is None else v for v in c.tolist()] for c in columns))):
+        code = index.setdefault(key, len(index))
+        if code == len(first):
+            first.append(row)
+        codes[row] = code
+    return codes, np.array(first, dtype=np.int64)
+
+
+class Snapshot:
+    """Latest row per product as of a day, with its product attributes."""
+
+    def __init__(self, as_of, product_id, day, price, lista, bono, attrs):
+        self.as_of = as_of
+        self.product_id = product_id
+        self.day = day
+        self.price = price
+        self.lista = lista
+        self.bono = bono
+        self.attrs = attrs  # field -> object array aligned with the rows
+
+    def __len__(self):
+        return len(self.product_id)
+
+    def take(self, rows):
+        """Snapshot of the given row positions or mask (e.g. FilterIndex.rows)."""
+        return Snapshot(
+            self.as_of, self.product_id[rows], self.day[rows], self.price[rows], self.lista[rows],
+            self.bono[rows], {f: values[rows] for f, values in self.attrs.items()},
+        )
+
+    def _mask(self, status):
+        if status == 'all':
+            return np.ones(len(self), dtype=bool)
+        inactive = np.array([(e or 'vigente').lower() == 'inactivo' for e in self.attrs['estado'].tolist()], dtype=bool)
+        return ~inactive if status == 'active' else inactive
+
+    def rows(self):
+        """One dict per product (price_data + products columns)."""
+        fields = list(self.attrs)
+        out = []
+        for i in range(len(self)):
+            row = {f: self.attrs[f][i] for f in fields}
+            row.update(product_id=int(self.product_id[i]), date=str(self.day[i]),
+                       price=_num(self.price[i]), precio_lista_num=_num(self.lista[i]),
+                       bono_num=_num(self.bono[i]))
+            out.append(row)
+        return out
+
+    def summary(self):
+        """The summary block (report_stats definitions) for this snapshot."""
+        prices, discounts = price_arrays(self.price, np.nan_to_num(self.lista), np.nan_to_num(self.bono))
+        versions, _ = _group_codes(self.attrs['brand'], self.attrs['model'], self.attrs['submodel'])
+        brands = {b for b in self.attrs['brand'].tolist() if b}
+        return array_stats(prices, discounts, int(versions.max()) + 1 if len(versions) else 0, len(brands))
+
+    def segments(self):
+        """"Precios por Segmento" rows: min / avg / max price and versions per tipo_vehiculo."""
+        valid = self.price > 0
+        segment = self.attrs['tipo_vehiculo'][valid]
+        prices = self.price[valid]
+        if not len(prices):
+            return []
+        codes, first = _group_codes(segment)
+        count = np.bincount(codes)
+        total = np.bincount(codes, weights=prices)
+        low = np.full(len(count), np.inf)
+        high = np.full(len(count), -np.inf)
+        np.minimum.at(low, codes, prices)
+        np.maximum.at(high, codes, prices)
+        rows = [{
+            "Segmento": segment[first[g]] or "Sin segmento",
+            "Mínimo": float(low[g]),
+            "Promedio": float(total[g] / count[g]),
+            "Máximo": float(high[g]),
+            "Cant. Versiones": int(count[g]),
+        } for g in range(len(count))]
+        return sorted(rows, key=lambda r: str(r["Segmento"]))
+
+    def models(self, status='all'):
+        """The `models` list (fetchModelsData shape): per brand / model / submodel
+        averages of the latest prices, priciest first."""
+        mask = self._mask(status)
+        attrs = {f: a[mask] for f, a in self.attrs.items()}
+        if not mask.any():
+            return []
+        submodel = np.array([s if s else 'sin-submodelo' for s in attrs['submodel'].tolist()], dtype=object)
+        codes, first = _group_codes(attrs['brand'], attrs['model'], submodel)
+        count = np.bincount(codes)
+        averages = {
+            field: np.bincount(codes, weights=np.nan_to_num(values[mask])) / count
+            for field, values in (('precio_con_bono', self.price), ('precio_lista', self.lista), ('bono', self.bono))
+        }
+        order = np.argsort(-averages['precio_con_bono'], kind='stable')
+        return [{
+            'brand': attrs['brand'][first[g]], 'model': attrs['model'][first[g]],
+            'submodel': attrs['submodel'][first[g]], 'name': attrs['name'][first[g]],
+            'estado': attrs['estado'][first[g]], 'tipo_vehiculo': attrs['tipo_vehiculo'][first[g]],
+            'count': int(count[g]),
+            'precio_con_bono': float(averages['precio_con_bono'][g]),
+            'precio_lista': float(averages['precio_lista'][g]),
+            'bono': float(averages['bono'][g]),
+        } for g in order.tolist()]
+
+
+def _num(value):
+    return None if np.isnan(value) else float(value)
+
+
+class PriceHistory:
+    """Columnar price history with cached as-of snapshots."""
+
+    def __init__(self, product_id, day, price, lista, bono, products=None, version=None):
+        self.product_id = np.asarray(product_id, dtype=np.int64)
+        self.day = np.asarray(day, dtype='datetime64[D]')
+        self.price = np.asarray(price, dtype=np.float64)
+        self.lista = np.asarray(lista, dtype=np.float64)
+        self.bono = np.asarray(bono, dtype=np.float64)
+        self.version = version
+        # Product attributes: sorted ids plus one object array per field
+        products = products or {}
+        self.product_ids = np.array(sorted(products), dtype=np.int64)
+        self.product_attrs = {
+            f: np.array([products[p].get(f) for p in self.product_ids.tolist()], dtype=object)
+            for f in PRODUCT_FIELDS
+        }
+        rows = np.arange(len(self.product_id))
+        self._order = np.lexsort((rows, self.day, self.product_id))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, store, filters=None):
+        """Loads (filtered) price_data and products from a data_store.PriceStore."""
+        rows = store.price_columns(filters)
+        n = len(rows)
+        columns = list(zip(*rows)) if n else [()] * 5
+        as_float = lambda col: np.array([np.nan if v is None else v for v in col], dtype=np.float64)
+        return cls(
+            np.fromiter(columns[0], dtype=np.int64, count=n),
+            np.array(columns[1], dtype='datetime64[D]'),
+            as_float(columns[2]), as_float(columns[3]), as_float(columns[4]),
+            store.products(filters, PRODUCT_FIELDS), store.version,
+        )
+
+    def snapshot(self, as_of=None):
+        """Latest row per product on or before `as_of` (None: whole history)."""
+        key = None if as_of is None else str(_day(as_of))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        rows = latest_rows(self.product_id, self.day, key, self._order)
+        product_id = self.product_id[rows]
+        position = np.searchsorted(self.product_ids, product_id)
+        known = (position < len(self.product_ids)) & \
+            (self.product_ids[np.minimum(position, len(self.product_ids) - 1)] == product_id) \
+            if len(self.product_ids) else np.zeros(len(rows), dtype=bool)
+        rows, position = rows[known], position[known]
+        snap = Snapshot(
+            key, self.product_id[rows], self.day[rows], self.price[rows], self.lista[rows], self.bono[rows],
+            {f: values[position] for f, values in self.product_attrs.items()},
+        )
+        with self._lock:
+            self._cache[key] = snap
+            if len(self._cache) > SNAPSHOT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return snap
@@ -0,0 +1,303 @@
+# Local SQLite mirror of the Supabase `products` / `price_data` tables.
+#
+# Lets reports be built and benchmarked offline: load a scraping dump with
+# the streaming pipeline (data_ingest), then query the same shapes the edge
+# functions return. Columns and indexes follow supabase/migrations
+# (idx_price_data_product_id, idx_price_data_date DESC, idx_products_brand,
+# idx_products_category, ...); id_base is unique here so loads upsert
+# products the way upload-json does (onConflict: 'id_base').
+#
+#     store = PriceStore('prices.db')
+#     store.load('dump.json')
+#     models = store.models({'brand': ['Toyota']})      # fetchModelsData shape
+#     latest = store.latest_prices(as_of='2024-06-30')
+#
+# Analytics built on top of the store (cube, trends, sheets, cached
+# dashboard payloads) live in data_reports.
+#
+# Filters use the frontend keys: brand, model, submodel, tipoVehiculo
+# (plus estado / category); each takes a value or a list.
+
+import sqlite3
+import threading
+
+try:
+    from api.data_ingest import BATCH_SIZE, IngestStats, ingest
+    from api.report_pivot import pivot_long
+except ImportError:
+    from data_ingest import BATCH_SIZE, IngestStats, ingest
+    from report_pivot import pivot_long
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    id_base TEXT NOT NULL,
+    brand TEXT NOT NULL,
+    category TEXT NOT NULL,
+    model TEXT NOT NULL,
+    name TEXT NOT NULL,
+    submodel TEXT,
+    estado TEXT DEFAULT 'activo',
+    tipo_vehiculo TEXT
+);
+CREATE TABLE IF NOT EXISTS price_data (
+    id INTEGER PRIMARY KEY,
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    store TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    uid TEXT,
+    ctx_precio TEXT,
+    precio_num INTEGER,
+    precio_lista_num INTEGER,
+    bono_num INTEGER,
+    precio_texto TEXT,
+    fuente_texto_raw TEXT,
+    modelo_url TEXT,
+    archivo_origen TEXT,
+    timestamp_data TEXT
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_products_id_base ON products(id_base);
+CREATE INDEX IF NOT EXISTS idx_products_brand ON products(brand);
+CREATE INDEX IF NOT EXISTS idx_products_category ON products(category);
+CREATE INDEX IF NOT EXISTS idx_products_tipo_vehiculo ON products(tipo_vehiculo);
+CREATE INDEX IF NOT EXISTS idx_price_data_product_id ON price_data(product_id);
+CREATE INDEX IF NOT EXISTS idx_price_data_date ON price_data(date DESC);
+CREATE INDEX IF NOT EXISTS idx_price_data_uid ON price_data(uid);
+-- Not in the migrations: serves latest-per-product and per-product histories
+CREATE INDEX IF NOT EXISTS idx_price_data_product_date ON price_data(product_id, date DESC);
+CREATE INDEX IF NOT EXISTS idx_price_data_ctx_precio ON price_data(ctx_precio);
+"""
+
+PRODUCT_COLUMNS = ('id_base', 'brand', 'category', 'model', 'name', 'submodel', 'estado', 'tipo_vehiculo')
+PRICE_COLUMNS = ('product_id', 'store', 'price', 'date', 'uid', 'ctx_precio', 'precio_num',
+                 'precio_lista_num', 'bono_num', 'precio_texto', 'fuente_texto_raw',
+                 'modelo_url', 'archivo_origen', 'timestamp_data')
+INTEGER_COLUMNS = ('price', 'precio_num', 'precio_lista_num', 'bono_num')
+
+# Frontend filter key -> products column
+FILTER_COLUMNS = {
+    'brand': 'brand',
+    'model': 'model',
+    'submodel': 'submodel',
+    'tipoVehiculo': 'tipo_vehiculo',
+    'estado': 'estado',
+    'category': 'category',
+}
+
+_UPSERT_PRODUCT = (
+    f"INSERT INTO products ({', '.join(PRODUCT_COLUMNS)}) VALUES ({', '.join('?' * len(PRODUCT_COLUMNS))}) "
+    f"ON CONFLICT(id_base) DO UPDATE SET "
+    + ', '.join(f"{c} = excluded.{c}" for c in PRODUCT_COLUMNS if c != 'id_base')
+)
+_INSERT_PRICE = f"INSERT INTO price_data ({', '.join(PRICE_COLUMNS)}) VALUES ({', '.join('?' * len(PRICE_COLUMNS))})"
+_BUMP_VERSION = ("INSERT INTO store_meta (key, value) VALUES ('version', '1') "
+                 "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+
+def _int(value):
+    return None if value is None else int(round(value))
+
+
+def where_clause(filters, alias='p'):
+    """(' AND ...' SQL, params) for frontend-style filters."""
+    sql, params = [], []
+    for key, column in FILTER_COLUMNS.items():
+        values = (filters or {}).get(key)
+        if values is None or values == [] or values == '':
+            continue
+        values = values if isinstance(values, (list, tuple, set)) else [values]
+        sql.append(f"{alias}.{column} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    return ''.join(f" AND {s}" for s in sql), params
+
+
+def _day_end(as_of):
+    """Dates are stored as ISO timestamps; a bare day includes the whole day."""
+    return f"{as_of}T23:59:59.999Z" if as_of and len(as_of) == 10 else as_of
+
+
+class PriceStore:
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._product_ids = {}
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    # --- Loading -----------------------------------------------------------
+
+    @property
+    def version(self):
+        """Bumped by every loaded batch; caches keyed on store data use it."""
+        row = self._conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def load_batch(self, batch):
+        """Upserts a data_ingest.Batch (products first) in one transaction and
+        bumps the data version with it, so cached results never outlive it."""
+        with self._lock, self._conn:
+            if batch.products:
+                self._conn.executemany(_UPSERT_PRODUCT, ([p.get(c) for c in PRODUCT_COLUMNS] for p in batch.products))
+            missing = {p['id_base'] for p in batch.prices} - self._product_ids.keys()
+            if missing:
+                for chunk in _chunks(sorted(missing), 900):
+                    rows = self._conn.execute(
+                        f"SELECT id_base, id FROM products WHERE id_base IN ({', '.join('?' * len(chunk))})", chunk)
+                    self._product_ids.update(rows.fetchall())
+            rows = []
+            for price in batch.prices:
+                product_id = self._product_ids.get(price['id_base'])
+                if product_id is None:
+                    continue
+                row = dict(price, product_id=product_id)
+                for column in INTEGER_COLUMNS:
+                    row[column] = _int(row.get(column))
+                rows.append([row.get(c) for c in PRICE_COLUMNS])
+            self._conn.executemany(_INSERT_PRICE, rows)
+            self._conn.execute(_BUMP_VERSION)
+
+    def load(self, source, batch_size=BATCH_SIZE, stats=None):
+        """Bulk-loads a dump path (or records) through data_ingest; returns IngestStats."""
+        stats = stats if stats is not None else IngestStats()
+        with self._lock:
+            self._conn.execute("PRAGMA synchronous = OFF")
+            try:
+                for batch in ingest(source, batch_size, stats):
+                    self.load_batch(batch)
+            finally:
+                self._conn.execute("PRAGMA synchronous = FULL")
+            self.finish_load()
+        return stats
+
+    def finish_load(self):
+        """Refreshes planner stats after loading batches."""
+        with self._lock, self._conn:
+            self._conn.execute("ANALYZE")
+
+    # --- Queries -----------------------------------------------------------
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params)]
+
+    def distinct_dates(self):
+        """Scraping dates (YYYY-MM-DD), newest first."""
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT DISTINCT substr(date, 1, 10) AS day FROM price_data ORDER BY day DESC")]
+
+    def latest_prices(self, filters=None, as_of=None):
+        """Latest price_data row per product (on or before `as_of`), with its product."""
+        where, params = where_clause(filters)
+        date_sql = ''
+        if as_of:
+            date_sql = ' AND date <= ?'
+            params = [_day_end(as_of)] + params
+        # One index seek per product on (product_id, date DESC)
+        return self._query(f"""
+            SELECT p.id AS product_id, p.id_base, p.brand, p.category, p.model, p.name, p.submodel,
+                   p.estado, p.tipo_vehiculo, d.price, d.precio_lista_num, d.bono_num, d.date
+            FROM products p
+            JOIN price_data d ON d.id = (
+                SELECT id FROM price_data
+                WHERE product_id = p.id{date_sql}
+                ORDER BY date DESC, id DESC LIMIT 1
+            )
+            WHERE 1 = 1{where}
+        """, params)
+
+    def history(self, filters=None, start=None, end=None, columns=('price', 'precio_lista_num', 'bono_num')):
+        """price_data rows for the filtered products between two dates, by product then date."""
+        where, params = where_clause(filters)
+        date_sql = ''
+        if start:
+            date_sql += ' AND d.date >= ?'
+            params.append(start)
+        if end:
+            date_sql += ' AND d.date <= ?'
+            params.append(_day_end(end))
+        selected = ', '.join(f"d.{c}" for c in columns)
+        return self._query(f"""
+            SELECT d.product_id, p.brand, p.model, p.submodel, d.date, {selected}
+            FROM price_data d JOIN products p ON p.id = d.product_id
+            WHERE 1 = 1{where}{date_sql}
+            ORDER BY d.product_id, d.date
+        """, params)
+
+    def models(self, filters=None, status='all', as_of=None):
+        """The dashboard `models` list (src/lib/fetchModelsData.ts): latest price
+        per product, averaged per brand / model / submodel, priciest first."""
+        # latest_prices grouped per brand / model / submodel (running means)
+        groups = {}
+        for row in self.latest_prices(filters, as_of):
+            estado = (row['estado'] or 'vigente').lower()
+            if status == 'active' and estado == 'inactivo':
+                continue
+            if status == 'inactive' and estado != 'inactivo':
+                continue
+            key = (row['brand'], row['model'], row['submodel'] or 'sin-submodelo')
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    'brand': row['brand'], 'model': row['model'], 'submodel': row['submodel'],
+                    'name': row['name'], 'estado': row['estado'], 'tipo_vehiculo': row['tipo_vehiculo'],
+                    'count': 0, 'precio_con_bono': 0.0, 'precio_lista': 0.0, 'bono': 0.0,
+                }
+            n = group['count'] = group['count'] + 1
+            for field, value in (('precio_con_bono', row['price']), ('precio_lista', row['precio_lista_num']),
+                                 ('bono', row['bono_num'])):
+                group[field] += ((value or 0) - group[field]) / n
+        return sorted(groups.values(), key=lambda g: g['precio_con_bono'] or 0, reverse=True)
+
+    def price_columns(self, filters=None):
+        """(product_id, day, price, precio_lista_num, bono_num) tuples for the
+        filtered products, in storage order (input for data_snapshot)."""
+        where, params = where_clause(filters)
+        with self._lock:
+            return self._conn.execute(f"""
+                SELECT d.product_id, substr(d.date, 1, 10), d.price, d.precio_lista_num, d.bono_num
+                FROM price_data d JOIN products p ON p.id = d.product_id
+                WHERE 1 = 1{where}
+            """, params).fetchall()
+
+    def products(self, filters=None, fields=('brand', 'model', 'submodel', 'name', 'estado', 'tipo_vehiculo')):
+        """{product id: {field: value}} for the filtered products."""
+        where, params = where_clause(filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT p.id, {', '.join('p.' + f for f in fields)} FROM products p WHERE 1 = 1{where}", params)
+            return {r[0]: dict(zip(fields, r[1:])) for r in rows}
+
+    def brand_evolution(self, filters=None, start=None, end=None):
+        """Average price per brand and scraping day, as wide chart rows."""
+        where, params = where_clause(filters)
+        date_sql = ''
+        if start:
+            date_sql += ' AND d.date >= ?'
+            params.append(start)
+        if end:
+            date_sql += ' AND d.date <= ?'
+            params.append(_day_end(end))
+        with self._lock:
+            records = self._conn.execute(f"""
+                SELECT substr(d.date, 1, 10) AS day, p.brand, AVG(d.price)
+                FROM price_data d JOIN products p ON p.id = d.product_id
+                WHERE d.price > 0{where}{date_sql}
+                GROUP BY day, p.brand
+            """, params).fetchall()
+        return pivot_long([tuple(r) for r in records])
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -0,0 +1,171 @@
+# Per-product sorted time-series index for as-of price lookups.
+#
+# Compare and evolution reports keep asking "price of version X on day D"
+# and "price at the start vs the end of the period". SeriesIndex stores
+# every product's history as one contiguous, day-sorted slice of shared
+# arrays (CSR layout: `offsets[i]:offsets[i + 1]` is product `keys[i]`), so
+# each question is a binary search instead of a scan over raw rows. A
+# combined (product position, day) key answers many products at once with
+# a single searchsorted.
+#
+#     index = SeriesIndex.from_history(PriceHistory.from_store(store))
+#     index.as_of(product_id, '2024-06-30')
+#     index.first_last(product_id, '2024-01-01', '2024-06-30')
+#     index.save('prices.idx'); SeriesIndex.load('prices.idx')   # memory-mapped
+#
+# Days are int32 days since 1970-01-01. Several rows for the same product
+# and day collapse to the last one, as in the snapshot builder.
+
+import os
+import json
+
+import numpy as np
+
+FIELDS = ('price', 'lista', 'bono')
+_DAY_BITS = 32
+_DAY_OFFSET = 1 << 31  # keeps pre-1970 days non-negative inside the combined key
+
+
+def to_day(value):
+    """int days since the epoch for an ISO date / datetime64 / int."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(np.datetime64(str(value)[:10], 'D').astype(np.int64))
+
+
+def from_day(day):
+    return str(np.datetime64(int(day), 'D'))
+
+
+class SeriesIndex:
+    def __init__(self, keys, offsets, days, values):
+        self.keys = keys          # sorted product ids
+        self.offsets = offsets    # len(keys) + 1
+        self.days = days          # int32, sorted within each product
+        self.values = values      # field -> float64 aligned with days
+        self._combined = None     # built on the first as_of_rows (keeps load(mmap=True) lazy)
+
+    # --- Building ----------------------------------------------------------
+
+    @classmethod
+    def build(cls, product_id, day, **values):
+        """Bulk-loads columns (product_id, day, price=..., lista=..., bono=...)."""
+        product_id = np.asarray(product_id, dtype=np.int64)
+        day = np.asarray(day)
+        if day.dtype.kind in 'USO':
+            day = day.astype('datetime64[D]')
+        if np.issubdtype(day.dtype, np.datetime64):
+            day = day.astype('datetime64[D]').astype(np.int64)
+        day = day.astype(np.int32)
+        order = np.lexsort((np.arange(len(product_id)), day, product_id))
+        product_id, day = product_id[order], day[order]
+        # Last row wins for repeated (product, day)
+        last = np.r_[(product_id[1:] != product_id[:-1]) | (day[1:] != day[:-1]), True] \
+            if len(day) else np.zeros(0, dtype=bool)
+        product_id, day = product_id[last], day[last]
+        columns = {f: np.asarray(v, dtype=np.float64)[order][last] for f, v in values.items()}
+        keys, starts = np.unique(product_id, return_index=True)
+        offsets = np.r_[starts, len(product_id)].astype(np.int64)
+        return cls(keys, offsets, day, columns)
+
+    @classmethod
+    def from_history(cls, history):
+        """From a data_snapshot.PriceHistory."""
+        return cls.build(history.product_id, history.day,
+                         price=history.price, lista=history.lista, bono=history.bono)
+
+    def save(self, path):
+        """Writes one .npy per array plus meta.json into directory `path`."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'keys.npy'), self.keys)
+        np.save(os.path.join(path, 'offsets.npy'), self.offsets)
+        np.save(os.path.join(path, 'days.npy'), self.days)
+        for field, values in self.values.items():
+            np.save(os.path.join(path, f'{field}.npy'), values)
+        with open(os.path.join(path, 'meta.json'), 'w') as fh:
+            json.dump({'fields': list(self.values), 'rows': int(len(self.days))}, fh)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Opens a saved index; with `mmap` the arrays stay on disk and pages
+        are read on demand (shared between worker processes)."""
+        mode = 'r' if mmap else None
+        with open(os.path.join(path, 'meta.json')) as fh:
+            meta = json.load(fh)
+        arr = lambda name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode)
+        return cls(arr('keys'), arr('offsets'), arr('days'), {f: arr(f) for f in meta['fields']})
+
+    # --- Queries -----------------------------------------------------------
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _slice(self, product_id):
+        i = int(np.searchsorted(self.keys, product_id))
+        if i == len(self.keys) or self.keys[i] != product_id:
+            return 0, 0
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def series(self, product_id, field='price'):
+        """(days, values) views of a product's whole history."""
+        lo, hi = self._slice(product_id)
+        return self.days[lo:hi], self.values[field][lo:hi]
+
+    def as_of(self, product_id, day, field='price'):
+        """Value on the latest day <= `day`, or None."""
+        lo, hi = self._slice(product_id)
+        i = lo + int(np.searchsorted(self.days[lo:hi], to_day(day), side='right')) - 1
+        return float(self.values[field][i]) if i >= lo else None
+
+    def window(self, product_id, start=None, end=None, field='price'):
+        """(days, values) views for start <= day <= end."""
+        lo, hi = self._slice(product_id)
+        days = self.days[lo:hi]
+        a = lo + (int(np.searchsorted(days, to_day(start), side='left')) if start is not None else 0)
+        b = lo + (int(np.searchsorted(days, to_day(end), side='right')) if end is not None else hi - lo)
+        return self.days[a:b], self.values[field][a:b]
+
+    def first_last(self, product_id, start=None, end=None, field='price'):
+        """((first day, value), (last day, value)) inside the window, or None."""
+        days, values = self.window(product_id, start, end, field)
+        if not len(days):
+            return None
+        return (from_day(days[0]), float(values[0])), (from_day(days[-1]), float(values[-1]))
+
+    @property
+    def combined(self):
+        """(product position << 32) + day per row, sorted like the rows."""
+        if self._combined is None:
+            position = np.repeat(np.arange(len(self.keys), dtype=np.int64), np.diff(self.offsets))
+            self._combined = (position << _DAY_BITS) + (np.asarray(self.days, dtype=np.int64) + _DAY_OFFSET)
+        return self._combined
+
+    def as_of_rows(self, product_ids, day):
+        """Row position of each product's latest day <= `day` (-1: no data)."""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        position = np.searchsorted(self.keys, product_ids)
+        known = position < len(self.keys)
+        known[known] = self.keys[position[known]] == product_ids[known]
+        target = (position.astype(np.int64) << _DAY_BITS) + (to_day(day) + _DAY_OFFSET)
+        combined = self.combined
+        i = np.searchsorted(combined, target, side='right') - 1
+        # The hit must belong to the same product (not the previous one)
+        valid = known & (i >= 0)
+        valid[valid] = (combined[i[valid]] >> _DAY_BITS) == position[valid]
+        return np.where(valid, i, -1)
+
+    def as_of_many(self, product_ids, day, field='price'):
+        """Vectorised as_of for many products (NaN where there is no data)."""
+        rows = self.as_of_rows(product_ids, day)
+        out = np.full(len(rows), np.nan)
+        out[rows >= 0] = self.values[field][rows[rows >= 0]]
+        return out
+
+    def variation_many(self, product_ids, start, end, field='price'):
+        """(price at start, price at end, change as a fraction) per product,
+        each as-of its date; NaN where either side is missing."""
+        first = self.as_of_many(product_ids, start, field)
+        last = self.as_of_many(product_ids, end, field)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            change = np.where(first > 0, last / first - 1, np.nan)
+        return first, last, change
@@ -0,0 +1,148 @@
+# Single-pass brand trends over the columnar price history.
+#
+# get-analytics computes pricesByBrand[].price_trend and brandVariations
+# with Promise.all(brands.map(...)): one price_data history query per brand,
+# so the cost grows with the number of brands in scope. brand_trends() takes
+# one PriceHistory and derives every brand's figures with grouped vector
+# operations:
+#
+#     trends = brand_trends(PriceHistory.from_store(store, filters), start, end)
+#     trend_sheet(trends)     # "Tendencia Global"
+#
+# Per brand (same keys as the edge function, percentages x100 like it):
+# - avg / min / max price and row count in the [start, end] window;
+# - price_trend: newest vs oldest of the brand's `recent` latest rows
+#   (the edge function's limit(100), whole history);
+# - first_avg_price / last_avg_price / variation_percent between the first
+#   and last scraping day of the window (average per day; variations outside
+#   -99%..500% reported as 0, as upstream) plus scraping_sessions and dates;
+# - monthly: average per month and its change vs the previous month.
+# Rows with price <= 0 are ignored.
+
+import numpy as np
+
+RECENT_ROWS = 100
+VARIATION_RANGE = (-99, 500)
+
+
+def _runs(codes):
+    """(starts, ends) of runs of equal values in a sorted code array."""
+    if not len(codes):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    return starts, np.r_[starts[1:], len(codes)]
+
+
+def _group_means(group, sub, values):
+    """Mean of `values` per (group, sub) pair, sorted by group then sub."""
+    width = int(sub.max()) + 1 if len(sub) else 1
+    pairs, inverse = np.unique(group.astype(np.int64) * width + sub, return_inverse=True)
+    inverse = inverse.ravel()
+    means = np.bincount(inverse, weights=values) / np.bincount(inverse)
+    return pairs // width, pairs % width, means
+
+
+def brand_trends(history, start=None, end=None, recent=RECENT_ROWS, field='brand'):
+    """Trend dicts per `field` value (brand by default), ordered by label."""
+    position = np.searchsorted(history.product_ids, history.product_id)
+    known = position < len(history.product_ids)
+    known[known] = history.product_ids[position[known]] == history.product_id[known]
+    valid = known & (history.price > 0)
+    rows = np.flatnonzero(valid)
+    # Group codes per product (catalogue-sized), gathered per row
+    labels = history.product_attrs[field]
+    names, product_group = np.unique(labels.astype(str), return_inverse=True)
+    group = product_group.ravel()[position[rows]]
+    first_label = {}
+    for label in labels.tolist():
+        first_label.setdefault(str(label), label)
+    price = history.price[rows]
+    day = history.day[rows]
+
+    # Recent trend: newest row first per group (later rows win ties)
+    order = np.lexsort((-rows, -day.astype(np.int64), group))
+    starts, ends = _runs(group[order])
+    newest = price[order[starts]]
+    oldest = price[order[np.minimum(starts + recent, ends) - 1]]
+    present = np.zeros(len(names), dtype=bool)
+    present[group[order[starts]]] = True
+    trend = np.zeros(len(names))
+    trend[group[order[starts]]] = np.where(ends - starts > 1, (newest - oldest) / oldest * 100, 0.0)
+
+    # Window statistics
+    in_window = np.ones(len(rows), dtype=bool)
+    if start:
+        in_window &= day >= np.datetime64(str(start)[:10], 'D')
+    if end:
+        in_window &= day <= np.datetime64(str(end)[:10], 'D')
+    g, p, d = group[in_window], price[in_window], day[in_window]
+    n_groups = len(names)
+    count = np.bincount(g, minlength=n_groups)
+    total = np.bincount(g, weights=p, minlength=n_groups)
+    low = np.full(n_groups, np.inf)
+    high = np.full(n_groups, -np.inf)
+    np.minimum.at(low, g, p)
+    np.maximum.at(high, g, p)
+
+    # First vs last scraping day (daily averages)
+    days, day_code = np.unique(d, return_inverse=True)
+    day_group, day_index, day_avg = _group_means(g, day_code.ravel(), p)
+    d_starts, d_ends = _runs(day_group)
+    # Monthly averages and month-on-month change
+    months, month_code = np.unique(d.astype('datetime64[M]'), return_inverse=True)
+    month_group, month_index, month_avg = _group_means(g, month_code.ravel(), p)
+    m_starts, m_ends = _runs(month_group)
+
+    daily = {int(day_group[s]): (s, e) for s, e in zip(d_starts.tolist(), d_ends.tolist())}
+    monthly = {int(month_group[s]): (s, e) for s, e in zip(m_starts.tolist(), m_ends.tolist())}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        month_change = np.r_[np.nan, month_avg[1:] / month_avg[:-1] * 100 - 100] if len(month_avg) else month_avg
+
+    out = []
+    for i, name in enumerate(names.tolist()):
+        if not present[i]:
+            continue
+        trend_row = {
+            'brand': first_label[name],
+            'avg_price': float(total[i] / count[i]) if count[i] else 0.0,
+            'min_price': float(low[i]) if count[i] else 0.0,
+            'max_price': float(high[i]) if count[i] else 0.0,
+            'count': int(count[i]),
+            'price_trend': float(trend[i]),
+            'first_avg_price': 0.0, 'last_avg_price': 0.0,
+            'variation_percent': 0.0, 'scraping_sessions': 0,
+            'monthly': [],
+        }
+        if i in daily:
+            s, e = daily[i]
+            first, last = float(day_avg[s]), float(day_avg[e - 1])
+            variation = (last - first) / first * 100 if e - s > 1 and first > 0 else 0.0
+            if not VARIATION_RANGE[0] <= variation <= VARIATION_RANGE[1]:
+                variation = 0.0
+            trend_row.update(first_avg_price=first, last_avg_price=last, variation_percent=variation,
+                             scraping_sessions=int(e - s), startDate=str(days[day_index[s]]),
+                             endDate=str(days[day_index[e - 1]]))
+        if i in monthly:
+            s, e = monthly[i]
+            trend_row['monthly'] = [{
+                'month': str(months[month_index[j]]),
+                'avg_price': float(month_avg[j]),
+                'variation_percent': float(month_change[j]) if j > s else 0.0,
+            } for j in range(s, e)]
+        out.append(trend_row)
+    return out
+
+
+def trend_sheet(trends):
+    """"Tendencia Global" sheet (as src/lib/exportUtils.ts builds it)."""
+    return {
+        'name': 'Tendencia Global',
+        'chart_type': 'bar',
+        'chart_title': 'Tendencia de Precios Global (% Acumulado)',
+        'data': [{
+            "Marca": t['brand'],
+            "Variación %": t['variation_percent'] / 100,
+            "Inicio": t.get('startDate') or "-",
+            "Fin": t.get('endDate') or "-",
+        } for t in sorted(trends, key=lambda t: -t['variation_percent'])],
+    }
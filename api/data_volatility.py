@@ -0,0 +1,164 @@
+# Rolling volatility of price changes per brand or model.
+#
+# The "Volatilidad Temporal" sheet is built client-side from get-analytics'
+# volatility_timeseries: average price per (brand or model, month / week),
+# the % change vs the previous observed bucket, looped per model. Here every
+# series is laid out on one (bucket x series) grid and all of them are
+# processed together:
+#
+#     vol = rolling_volatility(history, by='model', granularity='month', window=3)
+#     volatility_sheet(vol, metric='std')
+#
+# - Buckets follow report_resample (ISO weeks, calendar months), so the
+#   grid is regular even though scrapes land on irregular dates; a series
+#   with no rows in a bucket has a gap (NaN), and its next change is taken
+#   against the last bucket it was observed in (as upstream).
+# - Changes outside -99%..500% are dropped as data errors (as upstream).
+# - Rolling statistics use cumulative sums over the grid: for each bucket,
+#   the sample std of the changes in the last `window` buckets and the
+#   coefficient of variation (std / mean) of the bucket prices, once at
+#   least `min_periods` values are present.
+# Values are fractions (0.05 = 5%), as the frontend sends them.
+
+import numpy as np
+
+try:
+    from api.report_resample import bucket_days, bucket_label
+except ImportError:
+    from report_resample import bucket_days, bucket_label
+
+METRICS = ('change', 'std', 'cv')
+DEFAULT_WINDOW = 3
+MIN_PERIODS = 2
+CHANGE_RANGE = (-0.99, 5.0)
+TOP_SERIES = 20
+
+
+def _entities(history, by):
+    """(labels, code per product) for brand or "brand - model" series."""
+    brand = history.product_attrs['brand']
+    if by == 'brand':
+        labels = brand.astype(str)
+    elif by == 'model':
+        labels = np.array([f"{b} - {m}" for b, m in zip(brand.tolist(), history.product_attrs['model'].tolist())])
+    else:
+        raise ValueError(f"Unknown volatility grouping: {by}")
+    names, codes = np.unique(labels, return_inverse=True)
+    return names, codes.ravel()
+
+
+def _rolling(values, window, min_periods):
+    """(sample std, mean) of the non-NaN values in the last `window` rows,
+    from cumulative counts, sums and sums of squares."""
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.0)
+    sums = []
+    for a in (valid.astype(np.float64), x, x * x):
+        c = np.cumsum(np.vstack([np.zeros((1, a.shape[1])), a]), axis=0)
+        sums.append(c[1:] - c[np.maximum(np.arange(1, len(a) + 1) - window, 0)])
+    n, s1, s2 = sums
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(np.maximum(s2 - s1 * s1 / n, 0) / (n - 1))
+        mean = s1 / n
+    std[n < max(min_periods, 2)] = np.nan
+    return std, mean
+
+
+class Volatility:
+    """Bucket x series grids of average price, change and rolling statistics."""
+
+    def __init__(self, buckets, entities, price, change, std, cv):
+        self.buckets = buckets      # bucket labels (YYYY-MM or YYYY-MM-DD)
+        self.entities = entities
+        self.price = price
+        self.change = change
+        self.std = std
+        self.cv = cv
+
+    @property
+    def score(self):
+        """Mean absolute change per series (the edge function's ranking score)."""
+        with np.errstate(invalid='ignore'):
+            return np.nan_to_num(np.nanmean(np.abs(self.change), axis=0)) if self.change.size \
+                else np.zeros(len(self.entities))
+
+    def top(self, k=TOP_SERIES):
+        """Series indexes with at least one change, most volatile first."""
+        observed = (~np.isnan(self.change)).any(axis=0)
+        order = np.argsort(-self.score, kind='stable')
+        return [int(i) for i in order if observed[i]][:k]
+
+
+def rolling_volatility(history, by='brand', granularity='month', window=DEFAULT_WINDOW,
+                       min_periods=MIN_PERIODS, start=None, end=None):
+    """Volatility grids for every brand (or brand - model) of a data_snapshot.PriceHistory."""
+    names, product_codes = _entities(history, by)
+    position = np.searchsorted(history.product_ids, history.product_id)
+    known = position < len(history.product_ids)
+    known[known] = history.product_ids[position[known]] == history.product_id[known]
+    rows = known & (history.price > 0)
+    if start:
+        rows &= history.day >= np.datetime64(str(start)[:10], 'D')
+    if end:
+        rows &= history.day <= np.datetime64(str(end)[:10], 'D')
+    rows = np.flatnonzero(rows)
+
+    series = product_codes[position[rows]]
+    buckets, bucket = np.unique(bucket_days(history.day[rows], granularity), return_inverse=True)
+    n_buckets, n_series = len(buckets), len(names)
+    flat = bucket.ravel() * n_series + series
+    counts = np.bincount(flat, minlength=n_buckets * n_series).reshape(n_buckets, n_series)
+    sums = np.bincount(flat, weights=history.price[rows], minlength=n_buckets * n_series)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        price = sums.reshape(n_buckets, n_series) / counts
+
+    # Change vs the last bucket each series was observed in
+    observed = counts > 0
+    seen = np.maximum.accumulate(np.where(observed, np.arange(n_buckets)[:, None], -1), axis=0)
+    previous = np.vstack([np.full((1, n_series), -1), seen[:-1]])
+    prior = price[np.maximum(previous, 0), np.arange(n_series)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = np.where(observed & (previous >= 0), price / prior - 1, np.nan)
+    change[(change < CHANGE_RANGE[0]) | (change > CHANGE_RANGE[1])] = np.nan
+
+    std, _ = _rolling(change, window, min_periods)
+    price_std, price_mean = _rolling(price, window, min_periods)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cv = price_std / price_mean
+    labels = [bucket_label(b, granularity) for b in buckets]
+    return Volatility(labels, names.tolist(), price, change, std, cv)
+
+
+def volatility_scope(filters):
+    """'model' when the filters narrow to one brand (volatilityBrand, else
+    brand), 'brand' otherwise, as get-analytics picks the series."""
+    for key in ('volatilityBrand', 'brand'):
+        brands = (filters or {}).get(key)
+        brands = brands if isinstance(brands, (list, tuple)) else ([brands] if brands else [])
+        if brands:
+            return 'model' if len(brands) == 1 else 'brand'
+    return 'brand'
+
+
+def volatility_sheet(vol, metric='std', top=TOP_SERIES):
+    """"Volatilidad Temporal" sheet: one row per bucket, one column per series
+    (the `top` most volatile), gaps as None."""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown volatility metric: {metric}")
+    grid = getattr(vol, metric)
+    columns = vol.top(top)
+    rows = []
+    for b, label in enumerate(vol.buckets):
+        values = grid[b, columns]
+        if np.isnan(values).all():
+            continue
+        row = {"Fecha": label}
+        row.update((vol.entities[c], None if np.isnan(v) else float(v)) for c, v in zip(columns, values.tolist()))
+        rows.append(row)
+    return {
+        'name': 'Volatilidad Temporal',
+        'chart_type': 'line',
+        'chart_title': 'Evolución de Volatilidad en el Tiempo',
+        'data': rows,
+        'gaps': True,
+    }
@@ -17,6 +17,32 @@ from openpyxl.drawing.text import Paragraph, ParagraphProperties, CharacterPrope
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 import base64
+import sys
+import os
+
+try:
+    from api.report_metrics import (
+        request_scope, stage, record_output, record_counts,
+        record_error_workbook, record_degraded, wants_metrics, send_metrics
+    )
+    from api.report_tracing import trace_request, log_warning
+    from api.report_budget import plan_budget, estimate_workbook, WORKBOOK_STEPS
+    from api.report_hierarchy import aggregate_models, requested_top_k, LEVEL_BRAND, LEVEL_SUBMODEL
+    from api.report_resample import resample_report
+    from api.report_stats import fill_summary
+    from api.report_plan import wants_plan, send_plan
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from report_metrics import (
+        request_scope, stage, record_output, record_counts,
+        record_error_workbook, record_degraded, wants_metrics, send_metrics
+    )
+    from report_tracing import trace_request, log_warning
+    from report_budget import plan_budget, estimate_workbook, WORKBOOK_STEPS
+    from report_hierarchy import aggregate_models, requested_top_k, LEVEL_BRAND, LEVEL_SUBMODEL
+    from report_resample import resample_report
+    from report_stats import fill_summary
+    from report_plan import wants_plan, send_plan
 
 
 # Styling constants
@@ -152,7 +178,7 @@ def apply_chart_styling(chart):
 
     except Exception as e:
         # Fail silently - do not crash generation just for font
-        print(f"Font styling warning: {str(e)}")
+        log_warning("Font styling warning", error=e)
 
 
 def create_bar_chart(ws, title, data_range, start_row, num_series):
@@ -271,6 +297,7 @@ def create_scatter_chart(ws, title, data_range, start_row, num_series):
 
 def generate_error_excel(error_message):
     """Creates a simple Excel file with the error message"""
+    record_error_workbook()
     wb = Workbook()
     ws = wb.active
     ws.title = "ERROR REPORT"
@@ -300,7 +327,42 @@ def set_global_styles(wb):
         # (OpenPyXL internal default)
         
     except Exception as e:
-        print(f"Global style warning: {e}")
+        log_warning("Global style warning", error=e)
+
+def write_models_hierarchy(ws, groups, currency_symbol):
+    """Modelos sheet as subtotal rows (brand, model) with submodel leaves,
+    grouped with Excel outline levels so each level can be collapsed."""
+    ws.sheet_view.showGridLines = False # White background
+    ws.sheet_properties.outlinePr.summaryBelow = False # Subtotal above its detail
+    headers = ["Marca", "Modelo", "Versión", "Versiones", "Precio Lista Prom.",
+               "Bono Prom.", "Precio c/Bono Prom.", "% Descuento Prom."]
+    for col, header in enumerate(headers, 1):
+        ws.cell(row=1, column=col, value=header)
+    style_header_row(ws, 1, len(headers))
+
+    money = f'"{currency_symbol}" #,##0'
+    for row_idx, g in enumerate(groups, 2):
+        values = [
+            g.brand,
+            g.model if g.level > LEVEL_BRAND else "Todos",
+            g.submodel if g.level == LEVEL_SUBMODEL else "Todas",
+            g.count, g.avg_list, g.avg_bono, g.avg_final, g.avg_discount
+        ]
+        font = Font(name="Avenir Medium", size=10, bold=g.level < LEVEL_SUBMODEL)
+        for col, value in enumerate(values, 1):
+            cell = ws.cell(row=row_idx, column=col, value=value)
+            cell.font = font
+        ws.cell(row=row_idx, column=4).number_format = '#,##0'
+        for col in (5, 6, 7):
+            ws.cell(row=row_idx, column=col).number_format = money
+        ws.cell(row=row_idx, column=8).number_format = '0.0%'
+        if g.level > LEVEL_BRAND:
+            ws.row_dimensions[row_idx].outline_level = g.level
+
+    widths = [15, 20, 25, 12, 20, 15, 20, 18]
+    for col, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
 
 def enforce_global_font(wb):
     """
@@ -327,7 +389,7 @@ def enforce_global_font(wb):
                      elif not cell.font:
                          cell.font = avenir
     except Exception as e:
-        print(f"Enforce font error: {e}")
+        log_warning("Enforce font error", error=e)
 
 def generate_excel(data):
     # Initialize Debug Log
@@ -347,6 +409,12 @@ def generate_excel(data):
         debug_ws = wb.create_sheet("DEBUG LOG")
         debug_ws.sheet_state = 'hidden'
         
+        # Date-axis charts bucketed to the report period, if requested
+        with stage('resample'):
+            data = resample_report(data)
+        with stage('summary_stats'):
+            data = fill_summary(data)
+        
         sheets = data.get('sheets', [])
         summary = data.get('summary', None)
         models = data.get('models', None)
@@ -357,142 +425,168 @@ def generate_excel(data):
         
         local_time = datetime.utcnow() + timedelta(hours=timezone_offset)
         
+        # Estimate the workbook; oversized payloads get a reduced plan
+        plan = plan_budget(estimate_workbook, data, WORKBOOK_STEPS)
+        if plan.degraded:
+            record_degraded()
+            log_warning("Report over budget, rendering reduced plan", **plan.as_dict())
+            if requested_top_k(data) is None:
+                models = plan.trim_table(models)
+        
         wb = Workbook()
         default_sheet = wb.active # Will be removed later
         
-        # Summary Sheet (Dashboard style)
-        if summary:
-            ws = wb.create_sheet("Resumen Ejecutivo", 0)
-            ws.sheet_view.showGridLines = False # White background
-            ws['A1'] = title
-            ws['A1'].font = Font(name="Avenir Black", bold=True, size=16)
-            ws['A2'] = f"Generado: {local_time.strftime('%d/%m/%Y %H:%M')}"
-            ws['A2'].font = Font(name="Avenir Medium", italic=True, color="666666")
+        with stage('summary'):
+            # Summary Sheet (Dashboard style)
+            if summary:
+                ws = wb.create_sheet("Resumen Ejecutivo", 0)
+                ws.sheet_view.showGridLines = False # White background
+                ws['A1'] = title
+                ws['A1'].font = Font(name="Avenir Black", bold=True, size=16)
+                ws['A2'] = f"Generado: {local_time.strftime('%d/%m/%Y %H:%M')}"
+                ws['A2'].font = Font(name="Avenir Medium", italic=True, color="666666")
             
-            ws['A4'] = "Métrica"
-            ws['B4'] = "Valor"
-            style_header_row(ws, 4, 2)
+                ws['A4'] = "Métrica"
+                ws['B4'] = "Valor"
+                style_header_row(ws, 4, 2)
             
-            metrics = [
-                ("Total Modelos", summary.get('total_models', 0)),
-                ("Total Marcas", summary.get('total_brands', 0)),
-                ("Precio Promedio", summary.get('avg_price', 0)),
-                ("Precio Mediano", summary.get('median_price', 0)),
-                ("Precio Mínimo", summary.get('min_price', 0)),
-                ("Precio Máximo", summary.get('max_price', 0)),
-                ("Desviación Estándar", summary.get('price_std_dev', 0)),
-                ("Coef. Variación", summary.get('variation_coefficient', 0)),
-                ("Descuento Promedio", summary.get('avg_discount_pct', 0)), 
-            ]
+                metrics = [
+                    ("Total Modelos", summary.get('total_models', 0)),
+                    ("Total Marcas", summary.get('total_brands', 0)),
+                    ("Precio Promedio", summary.get('avg_price', 0)),
+                    ("Precio Mediano", summary.get('median_price', 0)),
+                    ("Precio Mínimo", summary.get('min_price', 0)),
+                    ("Precio Máximo", summary.get('max_price', 0)),
+                    ("Desviación Estándar", summary.get('price_std_dev', 0)),
+                    ("Coef. Variación", summary.get('variation_coefficient', 0)),
+                    ("Descuento Promedio", summary.get('avg_discount_pct', 0)), 
+                ]
             
-            for i, (label, value) in enumerate(metrics):
-                row = 5 + i
-                # Apply Avenir Font
-                c1 = ws.cell(row=row, column=1, value=label)
-                c1.font = Font(name="Avenir Medium", size=10)
-                c2 = ws.cell(row=row, column=2, value=value)
-                c2.font = Font(name="Avenir Medium", size=10)
+                for i, (label, value) in enumerate(metrics):
+                    row = 5 + i
+                    # Apply Avenir Font
+                    c1 = ws.cell(row=row, column=1, value=label)
+                    c1.font = Font(name="Avenir Medium", size=10)
+                    c2 = ws.cell(row=row, column=2, value=value)
+                    c2.font = Font(name="Avenir Medium", size=10)
                 
-                if 2 <= i <= 6:
-                    c2.number_format = f'"{currency_symbol}" #,##0'
-                elif i >= 7: 
-                    c2.number_format = '0.00%'
+                    if 2 <= i <= 6:
+                        c2.number_format = f'"{currency_symbol}" #,##0'
+                    elif i >= 7: 
+                        c2.number_format = '0.00%'
             
-            style_data_rows(ws, 5, 13, 2)
+                style_data_rows(ws, 5, 13, 2)
             
-            ws['A14'] = "Filtros Aplicados"
-            ws['A14'].font = Font(name="Avenir Black", bold=True)
+                ws['A14'] = "Filtros Aplicados"
+                ws['A14'].font = Font(name="Avenir Black", bold=True)
             
-            filters = summary.get('filters', {})
-            ws['A15'] = "Segmento:"
-            ws['B15'] = ', '.join(filters.get('tipoVehiculo', [])) or "Todos"
-            ws['A16'] = "Marca:"
-            ws['B16'] = ', '.join(filters.get('brand', [])) or "Todas"
-            ws['A17'] = "Modelo:"
-            ws['B17'] = ', '.join(filters.get('model', [])) or "Todos"
+                filters = summary.get('filters', {})
+                ws['A15'] = "Segmento:"
+                ws['B15'] = ', '.join(filters.get('tipoVehiculo', [])) or "Todos"
+                ws['A16'] = "Marca:"
+                ws['B16'] = ', '.join(filters.get('brand', [])) or "Todas"
+                ws['A17'] = "Modelo:"
+                ws['B17'] = ', '.join(filters.get('model', [])) or "Todos"
             
-            # Apply font to filters
-            for r in range(15, 18):
-                ws[f'A{r}'].font = Font(name="Avenir Medium") # Plain text as requested
-                ws[f'B{r}'].font = Font(name="Avenir Medium")
+                # Apply font to filters
+                for r in range(15, 18):
+                    ws[f'A{r}'].font = Font(name="Avenir Medium") # Plain text as requested
+                    ws[f'B{r}'].font = Font(name="Avenir Medium")
 
-            ws.column_dimensions['A'].width = 25
-            ws.column_dimensions['B'].width = 30
+                ws.column_dimensions['A'].width = 25
+                ws.column_dimensions['B'].width = 30
         
-        # Info sheet for generic exports
-        elif title and not summary:
-            ws = wb.create_sheet("Información", 0)
-            ws.sheet_view.showGridLines = False # White background
-            ws['A1'] = title
-            ws['A1'].font = Font(name="Avenir Black", bold=True, size=16)
-            ws['A2'] = f"Generado: {local_time.strftime('%d/%m/%Y %H:%M')}"
-            ws['A2'].font = Font(name="Avenir Medium", italic=True, color="666666")
+            # Info sheet for generic exports
+            elif title and not summary:
+                ws = wb.create_sheet("Información", 0)
+                ws.sheet_view.showGridLines = False # White background
+                ws['A1'] = title
+                ws['A1'].font = Font(name="Avenir Black", bold=True, size=16)
+                ws['A2'] = f"Generado: {local_time.strftime('%d/%m/%Y %H:%M')}"
+                ws['A2'].font = Font(name="Avenir Medium", italic=True, color="666666")
             
-            if filters_data:
-                current_row = 4
-                ws.cell(row=current_row, column=1, value="Filtros Aplicados").font = Font(name="Avenir Black", bold=True)
-                current_row += 1
+                if filters_data:
+                    current_row = 4
+                    ws.cell(row=current_row, column=1, value="Filtros Aplicados").font = Font(name="Avenir Black", bold=True)
+                    current_row += 1
                 
-                for filter_name, filter_values in filters_data.items():
-                    if isinstance(filter_values, list) and len(filter_values) > 0:
-                        ws.cell(row=current_row, column=1, value=f"{filter_name}:").font = Font(name="Avenir Medium")
-                        ws.cell(row=current_row, column=2, value=', '.join(filter_values)).font = Font(name="Avenir Medium")
-                        current_row += 1
+                    for filter_name, filter_values in filters_data.items():
+                        if isinstance(filter_values, list) and len(filter_values) > 0:
+                            ws.cell(row=current_row, column=1, value=f"{filter_name}:").font = Font(name="Avenir Medium")
+                            ws.cell(row=current_row, column=2, value=', '.join(filter_values)).font = Font(name="Avenir Medium")
+                            current_row += 1
             
-            ws.column_dimensions['A'].width = 20
-            ws.column_dimensions['B'].width = 40
+                ws.column_dimensions['A'].width = 20
+                ws.column_dimensions['B'].width = 40
+        
+        # Note sheet explaining a reduced workbook
+        if plan.degraded:
+            ws = wb.create_sheet("Nota")
+            ws.sheet_view.showGridLines = False # White background
+            ws['A1'] = "Nota sobre este Reporte"
+            ws['A1'].font = Font(name="Avenir Black", bold=True, size=16)
+            for i, line in enumerate(plan.note_lines(workbook=True), 3):
+                ws.cell(row=i, column=1, value=line).font = Font(name="Avenir Medium")
+            ws.column_dimensions['A'].width = 100
         
         # Chart sheets created below...
 
-        # Models sheet
-        if models and len(models) > 0:
-            ws = wb.create_sheet("Modelos")
-            ws.sheet_view.showGridLines = False # White background
-            headers = ["Marca", "Modelo", "Versión", "Estado", "Tipo Vehículo", 
-                    "Precio c/Bono", "Precio Lista", "Bono", "% Descuento"]
+        with stage('models', rows=len(models or [])):
+            top_k = requested_top_k(data)
+            # Models sheet (aggregated brand -> model -> submodel when asked for)
+            if models and top_k is not None:
+                groups = aggregate_models(models, top_k)
+                if plan.row_limit is not None:
+                    groups = groups[:plan.row_limit]
+                write_models_hierarchy(wb.create_sheet("Modelos"), groups, currency_symbol)
+            elif models and len(models) > 0:
+                ws = wb.create_sheet("Modelos")
+                ws.sheet_view.showGridLines = False # White background
+                headers = ["Marca", "Modelo", "Versión", "Estado", "Tipo Vehículo", 
+                        "Precio c/Bono", "Precio Lista", "Bono", "% Descuento"]
             
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(name="Avenir Medium", bold=True, color="FFFFFF")
+                for col, header in enumerate(headers, 1):
+                    cell = ws.cell(row=1, column=col, value=header)
+                    cell.font = Font(name="Avenir Medium", bold=True, color="FFFFFF")
             
-            style_header_row(ws, 1, len(headers))
+                style_header_row(ws, 1, len(headers))
             
-            for row_idx, model in enumerate(models, 2):
-                ws.cell(row=row_idx, column=1, value=model.get('brand', ''))
-                ws.cell(row=row_idx, column=2, value=model.get('model', ''))
-                ws.cell(row=row_idx, column=3, value=model.get('submodel', '-'))
-                ws.cell(row=row_idx, column=4, value=model.get('estado', 'N/A'))
-                ws.cell(row=row_idx, column=5, value=model.get('tipo_vehiculo', 'N/A'))
+                for row_idx, model in enumerate(models, 2):
+                    ws.cell(row=row_idx, column=1, value=model.get('brand', ''))
+                    ws.cell(row=row_idx, column=2, value=model.get('model', ''))
+                    ws.cell(row=row_idx, column=3, value=model.get('submodel', '-'))
+                    ws.cell(row=row_idx, column=4, value=model.get('estado', 'N/A'))
+                    ws.cell(row=row_idx, column=5, value=model.get('tipo_vehiculo', 'N/A'))
                 
-                precio_bono = model.get('precio_con_bono', 0)
-                precio_lista = model.get('precio_lista', 0)
-                bono = model.get('bono', 0)
+                    precio_bono = model.get('precio_con_bono', 0)
+                    precio_lista = model.get('precio_lista', 0)
+                    bono = model.get('bono', 0)
                 
-                # Calculate Discount % (Bono / Lista)
-                if precio_lista and precio_lista > 0:
-                    diff = (bono / precio_lista)
-                else:
-                    diff = 0
+                    # Calculate Discount % (Bono / Lista)
+                    if precio_lista and precio_lista > 0:
+                        diff = (bono / precio_lista)
+                    else:
+                        diff = 0
                 
-                c6 = ws.cell(row=row_idx, column=6, value=precio_bono)
-                c6.number_format = f'"{currency_symbol}" #,##0'
-                c7 = ws.cell(row=row_idx, column=7, value=precio_lista)
-                c7.number_format = f'"{currency_symbol}" #,##0'
-                c8 = ws.cell(row=row_idx, column=8, value=bono)
-                c8.number_format = f'"{currency_symbol}" #,##0'
-                c9 = ws.cell(row=row_idx, column=9, value=diff)
-                c9.number_format = '0.0%'
+                    c6 = ws.cell(row=row_idx, column=6, value=precio_bono)
+                    c6.number_format = f'"{currency_symbol}" #,##0'
+                    c7 = ws.cell(row=row_idx, column=7, value=precio_lista)
+                    c7.number_format = f'"{currency_symbol}" #,##0'
+                    c8 = ws.cell(row=row_idx, column=8, value=bono)
+                    c8.number_format = f'"{currency_symbol}" #,##0'
+                    c9 = ws.cell(row=row_idx, column=9, value=diff)
+                    c9.number_format = '0.0%'
                 
-                # Apply data font
-                for c in [1,2,3,4,5,6,7,8,9]:
-                    ws.cell(row=row_idx, column=c).font = Font(name="Avenir Medium", size=10)
+                    # Apply data font
+                    for c in [1,2,3,4,5,6,7,8,9]:
+                        ws.cell(row=row_idx, column=c).font = Font(name="Avenir Medium", size=10)
             
-            end_row = len(models) + 1
-            style_data_rows(ws, 2, end_row, len(headers))
+                end_row = len(models) + 1
+                style_data_rows(ws, 2, end_row, len(headers))
             
-            widths = [15, 20, 25, 12, 15, 18, 18, 15, 15]
-            for col, width in enumerate(widths, 1):
-                ws.column_dimensions[get_column_letter(col)].width = width
+                widths = [15, 20, 25, 12, 15, 18, 18, 15, 15]
+                for col, width in enumerate(widths, 1):
+                    ws.column_dimensions[get_column_letter(col)].width = width
         
         # Chart sheets
         for sheet_data in sheets:
@@ -500,129 +594,131 @@ def generate_excel(data):
                 sheet_name = sheet_data.get('name', 'Sheet')[:31]
                 chart_type = sheet_data.get('chart_type', 'bar')
                 chart_title = sheet_data.get('chart_title', sheet_name)
-                rows = sheet_data.get('data', [])
+                rows = plan.trim_table(sheet_data.get('data', []))
                 
                 if not rows:
                     debug_log.append(f"Skipping {sheet_name}: No data rows")
                     continue
                 
-                # 1. Create Data Sheet
-                ws = wb.create_sheet(sheet_name)
-                ws.sheet_view.showGridLines = False # White background
+                with stage('tables', sheet=sheet_name, rows=len(rows), cols=len(rows[0])):
+                    # 1. Create Data Sheet
+                    ws = wb.create_sheet(sheet_name)
+                    ws.sheet_view.showGridLines = False # White background
                 
-                headers = list(rows[0].keys())
-                num_cols = len(headers)
+                    headers = list(rows[0].keys())
+                    num_cols = len(headers)
                 
-                for col, header in enumerate(headers, 1):
-                    cell = ws.cell(row=1, column=col, value=header)
-                    cell.font = Font(name="Avenir Medium", bold=True, color="FFFFFF") # Avenir Header
+                    for col, header in enumerate(headers, 1):
+                        cell = ws.cell(row=1, column=col, value=header)
+                        cell.font = Font(name="Avenir Medium", bold=True, color="FFFFFF") # Avenir Header
                 
-                style_header_row(ws, 1, num_cols)
+                    style_header_row(ws, 1, num_cols)
                 
-                for row_idx, row_data in enumerate(rows, 2):
-                    for col_idx, header in enumerate(headers, 1):
-                        value = row_data.get(header, '')
-                        cell = ws.cell(row=row_idx, column=col_idx, value=value)
+                    for row_idx, row_data in enumerate(rows, 2):
+                        for col_idx, header in enumerate(headers, 1):
+                            value = row_data.get(header, '')
+                            cell = ws.cell(row=row_idx, column=col_idx, value=value)
                         
-                        # Apply Avenir Font to Data
-                        cell.font = Font(name="Avenir Medium", size=10)
+                            # Apply Avenir Font to Data
+                            cell.font = Font(name="Avenir Medium", size=10)
                         
-                        if col_idx > 1 and isinstance(value, (int, float)):
-                            header_lower = header.lower()
-                            sheet_name_lower = sheet_name.lower()
+                            if col_idx > 1 and isinstance(value, (int, float)):
+                                header_lower = header.lower()
+                                sheet_name_lower = sheet_name.lower()
                             
-                            # 1. Percentage Rules
-                            if (
-                                'variacion' in header_lower or 
-                                '%' in header_lower or 
-                                'volatilidad' in sheet_name_lower or
-                                'tendencia' in sheet_name_lower
-                            ):
-                                cell.number_format = '0.00%'
+                                # 1. Percentage Rules
+                                if (
+                                    'variacion' in header_lower or 
+                                    '%' in header_lower or 
+                                    'volatilidad' in sheet_name_lower or
+                                    'tendencia' in sheet_name_lower
+                                ):
+                                    cell.number_format = '0.00%'
                             
-                            # 2. Integer/Count Rules
-                            elif (
-                                'cantidad' in header_lower or 
-                                'volumen' in header_lower or 
-                                'versiones' in header_lower or
-                                'count' in header_lower or
-                                'numero' in header_lower or
-                                'composición' in sheet_name_lower or
-                                'composicion' in sheet_name_lower
-                            ):
-                                cell.number_format = '#,##0'
+                                # 2. Integer/Count Rules
+                                elif (
+                                    'cantidad' in header_lower or 
+                                    'volumen' in header_lower or 
+                                    'versiones' in header_lower or
+                                    'count' in header_lower or
+                                    'numero' in header_lower or
+                                    'composición' in sheet_name_lower or
+                                    'composicion' in sheet_name_lower
+                                ):
+                                    cell.number_format = '#,##0'
                             
-                            # 3. Currency Rules
-                            else:
-                                cell.number_format = f'"{currency_symbol}" #,##0'
+                                # 3. Currency Rules
+                                else:
+                                    cell.number_format = f'"{currency_symbol}" #,##0'
                 
-                end_row = len(rows) + 1
-                style_data_rows(ws, 2, end_row, num_cols)
+                    end_row = len(rows) + 1
+                    style_data_rows(ws, 2, end_row, num_cols)
                 
-                for col in range(1, num_cols + 1):
-                    ws.column_dimensions[get_column_letter(col)].width = 18
+                    for col in range(1, num_cols + 1):
+                        ws.column_dimensions[get_column_letter(col)].width = 18
                 
-                # 2. Create Chart (on Separate Sheet)
-                # Name: "Gráfico {Name}" (Truncated to 31 chars)
-                chart_sheet_name = f"Gráfico {sheet_name}"[:31]
+                with stage('charts', sheet=sheet_name, chart_type=chart_type, rows=len(rows)):
+                    # 2. Create Chart (on Separate Sheet)
+                    # Name: "Gráfico {Name}" (Truncated to 31 chars)
+                    chart_sheet_name = f"Gráfico {sheet_name}"[:31]
                 
-                # Ensure unique name
-                counter = 1
-                while chart_sheet_name in wb.sheetnames:
-                    chart_sheet_name = f"Gráfico {sheet_name[:20]} {counter}"
-                    counter += 1
-
-                # Create dedicated Chart Sheet (No grid, auto-maximized)
-                ws_chart = wb.create_chartsheet(chart_sheet_name)
+                    # Ensure unique name
+                    counter = 1
+                    while chart_sheet_name in wb.sheetnames:
+                        chart_sheet_name = f"Gráfico {sheet_name[:20]} {counter}"
+                        counter += 1
+
+                    # Create dedicated Chart Sheet (No grid, auto-maximized)
+                    ws_chart = wb.create_chartsheet(chart_sheet_name)
                 
-                num_series = num_cols - 1
-                # Create chart referencing data on 'ws' (Data Sheet)
-                if chart_type == 'line':
-                    chart = create_line_chart(ws, chart_title, end_row, 1, num_series)
-                elif chart_type == 'stacked':
-                    chart = create_stacked_chart(ws, chart_title, end_row, 1, num_series)
-                elif chart_type == 'scatter':
-                    chart = create_scatter_chart(ws, chart_title, end_row, 1, num_series)
-                else:
-                    chart = create_bar_chart(ws, chart_title, end_row, 1, num_series)
+                    num_series = num_cols - 1
+                    # Create chart referencing data on 'ws' (Data Sheet)
+                    if chart_type == 'line':
+                        chart = create_line_chart(ws, chart_title, end_row, 1, num_series)
+                    elif chart_type == 'stacked':
+                        chart = create_stacked_chart(ws, chart_title, end_row, 1, num_series)
+                    elif chart_type == 'scatter':
+                        chart = create_scatter_chart(ws, chart_title, end_row, 1, num_series)
+                    else:
+                        chart = create_bar_chart(ws, chart_title, end_row, 1, num_series)
                 
-                # Manual Coloring for Negative Values (Red)
-                # "Tendencia" or "Variación" often have positive/negative mixed bars.
-                # Standard 'invertIfNegative' is hit-or-miss with themes. We force Red points.
-                if isinstance(chart_title, str): 
-                    t_low = chart_title.lower()
-                    if "tendencia" in t_low or "variación" in t_low or "variacion" in t_low:
-                         # FIX: Move X-Axis Labels to Bottom (Low)
-                         chart.x_axis.tickLblPos = "low"
+                    # Manual Coloring for Negative Values (Red)
+                    # "Tendencia" or "Variación" often have positive/negative mixed bars.
+                    # Standard 'invertIfNegative' is hit-or-miss with themes. We force Red points.
+                    if isinstance(chart_title, str): 
+                        t_low = chart_title.lower()
+                        if "tendencia" in t_low or "variación" in t_low or "variacion" in t_low:
+                             # FIX: Move X-Axis Labels to Bottom (Low)
+                             chart.x_axis.tickLblPos = "low"
                          
-                         # Identify negative indices
-                         neg_indices = []
-                         # Assuming Series 1 (Column 2) is the main data
-                         # rows contains data dicts. Header keys.
-                         # Need to know which key corresponds to value.
-                         # Headers[1] is usually the first data column.
-                         if len(headers) > 1:
-                             val_key = headers[1] 
-                             for i, row_data in enumerate(rows):
-                                 try:
-                                     val = row_data.get(val_key, 0)
-                                     if isinstance(val, (int, float)) and val < 0:
-                                         neg_indices.append(i)
-                                 except: pass
+                             # Identify negative indices
+                             neg_indices = []
+                             # Assuming Series 1 (Column 2) is the main data
+                             # rows contains data dicts. Header keys.
+                             # Need to know which key corresponds to value.
+                             # Headers[1] is usually the first data column.
+                             if len(headers) > 1:
+                                 val_key = headers[1] 
+                                 for i, row_data in enumerate(rows):
+                                     try:
+                                         val = row_data.get(val_key, 0)
+                                         if isinstance(val, (int, float)) and val < 0:
+                                             neg_indices.append(i)
+                                     except: pass
                         
-                         # Apply Red Points
-                         from openpyxl.chart.marker import DataPoint
-                         for s in chart.series:
-                             # Generally apply to all series or just first?
-                             # Tendencia usually has 1 series. Safe to apply to all if they share structure.
-                             for idx in neg_indices:
-                                 # Create DataPoint for this index
-                                 pt = DataPoint(idx=idx)
-                                 pt.graphicalProperties = GraphicalProperties(solidFill="FF0000") # Red
-                                 s.dPt.append(pt)
-
-                # Add chart to the Chart Sheet (Auto-fills the page)
-                ws_chart.add_chart(chart) 
+                             # Apply Red Points
+                             from openpyxl.chart.marker import DataPoint
+                             for s in chart.series:
+                                 # Generally apply to all series or just first?
+                                 # Tendencia usually has 1 series. Safe to apply to all if they share structure.
+                                 for idx in neg_indices:
+                                     # Create DataPoint for this index
+                                     pt = DataPoint(idx=idx)
+                                     pt.graphicalProperties = GraphicalProperties(solidFill="FF0000") # Red
+                                     s.dPt.append(pt)
+
+                    # Add chart to the Chart Sheet (Auto-fills the page)
+                    ws_chart.add_chart(chart) 
             except Exception as e:
                 import traceback
                 debug_log.append(f"Error processing sheet {sheet_data.get('name')}: {str(e)}")
@@ -639,10 +735,15 @@ def generate_excel(data):
                 ws_debug.cell(row=i+1, column=1, value=log)
                 
         # Save to BytesIO
-        enforce_global_font(wb)
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        with stage('save'):
+            enforce_global_font(wb)
+            output = io.BytesIO()
+            wb.save(output)
+            output.seek(0)
+        record_counts(
+            sheets=len(wb.sheetnames),
+            rows=sum(len(s.get('data') or []) for s in sheets) + len(models or [])
+        )
         return output.getvalue()
 
     except Exception as e:
@@ -655,35 +756,43 @@ class handler(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Report-Trace, X-Report-Profile, X-Report-Plan')
         self.end_headers()
     
     def do_POST(self):
         try:
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
+            if wants_plan(self.headers, self.path):
+                return send_plan(self, 'generate-excel', post_data)
             
-            # Use json.loads safely
-            try:
-                data = json.loads(post_data.decode('utf-8'))
-            except json.JSONDecodeError as e:
-                self.send_response(200) # Send 200 to bypass fallback
-                excel_bytes = generate_error_excel(f"JSON Decode Error: {str(e)}")
-                self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-                self.send_header('Content-Disposition', 'attachment; filename="Error_Report.xlsx"')
-                self.end_headers()
-                self.wfile.write(excel_bytes)
-                return
-
-            filename = data.get('filename', f'Report_{datetime.now().strftime("%Y-%m-%d")}.xlsx')
-            
-            # Generate Excel (will catch its own errors)
-            excel_bytes = generate_excel(data)
+            with trace_request('generate-excel', self.headers, self.path) as trace, \
+                 request_scope('generate-excel', payload_bytes=len(post_data)):
+                # Use json.loads safely
+                try:
+                    with stage('parse', payload_bytes=len(post_data)):
+                        data = json.loads(post_data.decode('utf-8'))
+                except json.JSONDecodeError as e:
+                    self.send_response(200) # Send 200 to bypass fallback
+                    excel_bytes = generate_error_excel(f"JSON Decode Error: {str(e)}")
+                    self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+                    self.send_header('Content-Disposition', 'attachment; filename="Error_Report.xlsx"')
+                    self.end_headers()
+                    self.wfile.write(excel_bytes)
+                    return
+
+                filename = data.get('filename', f'Report_{datetime.now().strftime("%Y-%m-%d")}.xlsx')
+                
+                # Generate Excel (will catch its own errors)
+                excel_bytes = generate_excel(data)
+                record_output(len(excel_bytes))
             
             self.send_response(200)
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
             self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+            for key, value in trace.response_headers().items():
+                self.send_header(key, value)
             self.send_header('Content-Length', len(excel_bytes))
             self.end_headers()
             self.wfile.write(excel_bytes)
@@ -709,6 +818,8 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(err_msg.encode())
     
     def do_GET(self):
+        if wants_metrics(self.path):
+            return send_metrics(self)
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Content-Type', 'application/json')
@@ -14,7 +14,7 @@ import os
 try:
     from api.ppt_shared import (
         DARK_BLUE, DEEP_NAVY, LIGHT_BLUE, WHITE,
-        format_value, set_font, create_logo_slide, create_intro_slide,
+        format_value, set_font, create_logo_slide, create_intro_slide, create_note_slide,
         add_chart_slide, add_table_slide
     )
 except ImportError:
@@ -22,52 +22,99 @@ except ImportError:
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
     from ppt_shared import (
         DARK_BLUE, DEEP_NAVY, LIGHT_BLUE, WHITE,
-        format_value, set_font, create_logo_slide, create_intro_slide,
+        format_value, set_font, create_logo_slide, create_intro_slide, create_note_slide,
         add_chart_slide, add_table_slide
     )
 
+try:
+    from api.report_metrics import (
+        request_scope, stage, record_output, record_counts, record_degraded, wants_metrics, send_metrics
+    )
+    from api.report_tracing import trace_request, log_warning
+    from api.report_budget import plan_budget, estimate_slides_deck
+    from api.report_plan import wants_plan, send_plan
+except ImportError:
+    from report_metrics import (
+        request_scope, stage, record_output, record_counts, record_degraded, wants_metrics, send_metrics
+    )
+    from report_tracing import trace_request, log_warning
+    from report_budget import plan_budget, estimate_slides_deck
+    from report_plan import wants_plan, send_plan
+
+def generate_ppt_compare(data):
+    prs = Presentation()
+    # Enforce 16:9 Aspect Ratio (Widescreen)
+    prs.slide_width = Inches(13.333)
+    prs.slide_height = Inches(7.5)
+    
+    # 1. Cover
+    create_logo_slide(prs)
+    
+    # 2. Intro
+    today = datetime.now().strftime("%d/%m/%Y")
+    title = data.get('reportTitle', 'Reporte Comparativo')
+    create_intro_slide(prs, title, today)
+    
+    # 3. Currency Context
+    currency_symbol = data.get('currency', '$')
+    
+    # Estimate the deck; oversized payloads get a reduced plan
+    plan = plan_budget(estimate_slides_deck, data)
+    if plan.degraded:
+        record_degraded()
+        log_warning("Report over budget, rendering reduced plan", **plan.as_dict())
+        create_note_slide(prs, "Nota sobre este Reporte", plan.note_lines())
+    
+    # 4. Content Slides (Charts & Tables)
+    # Note: Compare page sends 'charts' and 'tables'
+    slides_content = data.get('slides', [])
+    
+    # If slides are passed as a list
+    for slide_data in slides_content:
+        if slide_data.get('type') == 'chart':
+            with stage('charts', sheet=slide_data.get('chart_title')):
+                add_chart_slide(prs, slide_data, currency_symbol, plan)
+        elif slide_data.get('type') == 'table' and not plan.appendix:
+            with stage('tables', title=slide_data.get('chart_title') or slide_data.get('title')):
+                add_table_slide(prs, slide_data.get('title', 'Tabla'), plan.trim_table(slide_data.get('data', [])), currency_symbol)
+            
+    # 5. Closing Slide
+    create_logo_slide(prs)
+    
+    with stage('save'):
+        ppt_stream = io.BytesIO()
+        prs.save(ppt_stream)
+        ppt_stream.seek(0)
+    record_counts(slides=len(prs.slides), rows=sum(len(s.get('data') or []) for s in slides_content))
+    return ppt_stream.getvalue()
+
 class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if wants_metrics(self.path):
+            return send_metrics(self)
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({"status": "ok", "service": "ppt-compare-generator"}).encode())
+
     def do_POST(self):
         content_len = int(self.headers.get('Content-Length', 0))
         post_body = self.rfile.read(content_len)
-        data = json.loads(post_body)
-        
-        prs = Presentation()
-        # Enforce 16:9 Aspect Ratio (Widescreen)
-        prs.slide_width = Inches(13.333)
-        prs.slide_height = Inches(7.5)
-        
-        # 1. Cover
-        create_logo_slide(prs)
-        
-        # 2. Intro
-        today = datetime.now().strftime("%d/%m/%Y")
-        title = data.get('reportTitle', 'Reporte Comparativo')
-        create_intro_slide(prs, title, today)
-        
-        # 3. Currency Context
-        currency_symbol = data.get('currency', '$')
-        
-        # 4. Content Slides (Charts & Tables)
-        # Note: Compare page sends 'charts' and 'tables'
-        slides_content = data.get('slides', [])
-        
-        # If slides are passed as a list
-        for slide_data in slides_content:
-            if slide_data.get('type') == 'chart':
-                add_chart_slide(prs, slide_data, currency_symbol)
-            elif slide_data.get('type') == 'table':
-                add_table_slide(prs, slide_data.get('title', 'Tabla'), slide_data.get('data', []), currency_symbol)
-                
-        # 5. Closing Slide
-        create_logo_slide(prs)
-        
-        ppt_stream = io.BytesIO()
-        prs.save(ppt_stream)
-        ppt_stream.seek(0)
+        if wants_plan(self.headers, self.path):
+            return send_plan(self, 'generate-ppt-compare', post_body)
+        with trace_request('generate-ppt-compare', self.headers, self.path) as trace, \
+             request_scope('generate-ppt-compare', payload_bytes=len(post_body)):
+            with stage('parse', payload_bytes=len(post_body)):
+                data = json.loads(post_body)
+            ppt_bytes = generate_ppt_compare(data)
+            record_output(len(ppt_bytes))
         
         self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Content-type', 'application/vnd.openxmlformats-officedocument.presentationml.presentation')
+        for key, value in trace.response_headers().items():
+            self.send_header(key, value)
         self.send_header('Content-Disposition', 'attachment; filename="reporte_comparar.pptx"')
         self.end_headers()
-        self.wfile.write(ppt_stream.getvalue())
+        self.wfile.write(ppt_bytes)
@@ -10,6 +10,7 @@ from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN
 import os
 import base64
+import traceback
 import io
 import sys
 
@@ -25,8 +26,8 @@ if current_dir not in sys.path:
 try:
     from api.ppt_shared import (
         DARK_BLUE, DEEP_NAVY, LIGHT_BLUE, WHITE,
-        format_value, set_font, get_image_stream,
-        create_logo_slide, create_intro_slide,
+        formatter, set_font, get_image_stream,
+        create_logo_slide, create_intro_slide, create_note_slide,
         add_chart_slide, add_table_slide,
         LOGO_B64, BG_B64
     )
@@ -34,12 +35,40 @@ except ImportError:
     # Handle direct script execution where api package might not be resolved
     from ppt_shared import (
         DARK_BLUE, DEEP_NAVY, LIGHT_BLUE, WHITE,
-        format_value, set_font, get_image_stream,
-        create_logo_slide, create_intro_slide,
+        formatter, set_font, get_image_stream,
+        create_logo_slide, create_intro_slide, create_note_slide,
         add_chart_slide, add_table_slide,
         LOGO_B64, BG_B64
     )
 
+try:
+    from api.report_metrics import (
+        request_scope, stage, record_output, record_counts,
+        record_fallback_deck, record_degraded, wants_metrics, send_metrics
+    )
+    from api.report_tracing import trace_request, log_warning, current_span
+    from api.report_budget import plan_budget, estimate_dashboard_deck
+    from api.report_hierarchy import aggregate_models, hierarchy_rows, requested_top_k
+    from api.report_resample import resample_report
+    from api.report_stats import fill_summary
+    from api.report_plan import wants_plan, send_plan
+    from api.report_format import PERCENT_TITLES, column_format, format_column
+except ImportError:
+    from report_metrics import (
+        request_scope, stage, record_output, record_counts,
+        record_fallback_deck, record_degraded, wants_metrics, send_metrics
+    )
+    from report_tracing import trace_request, log_warning, current_span
+    from report_budget import plan_budget, estimate_dashboard_deck
+    from report_hierarchy import aggregate_models, hierarchy_rows, requested_top_k
+    from report_resample import resample_report
+    from report_stats import fill_summary
+    from report_plan import wants_plan, send_plan
+    from report_format import PERCENT_TITLES, column_format, format_column
+
+# The models table also reads trend titles as percentages
+TABLE_PERCENT_TITLES = PERCENT_TITLES + ('tendencia', 'trend')
+
 def create_title_slide(prs, title, date_str):
     """Fallback title slide if no images available"""
     slide = prs.slides.add_slide(prs.slide_layouts[0])
@@ -97,7 +126,7 @@ def create_summary_slide(prs, summary, currency_symbol):
         c1.text = label
         c1.text_frame.paragraphs[0].font.name = "Avenir Medium"
         c2 = table.cell(row, 1)
-        c2.text = format_value(val, fmt, currency_symbol)
+        c2.text = formatter(fmt, currency_symbol)(val)
         c2.text_frame.paragraphs[0].font.name = "Avenir Medium"
         c2.text_frame.paragraphs[0].alignment = PP_ALIGN.RIGHT
 
@@ -105,6 +134,11 @@ def add_table_slide(prs, title, rows, currency_symbol='$'):
     if not rows: return
     MAX_ROWS = 12
     chunks = [rows[i:i + MAX_ROWS] for i in range(0, len(rows), MAX_ROWS)]
+    headers = list(rows[0].keys())
+    # Whole columns formatted once (report_format)
+    formats = {h: column_format(h, title, TABLE_PERCENT_TITLES) for h in headers}
+    texts = {h: format_column([r.get(h) for r in rows], formats[h][0], currency_symbol, formats[h][1])
+             for h in headers}
     
     for i, chunk in enumerate(chunks):
         slide = prs.slides.add_slide(prs.slide_layouts[5])
@@ -119,7 +153,6 @@ def add_table_slide(prs, title, rows, currency_symbol='$'):
         set_font(slide.shapes.title, font_name="Avenir Black", font_size=Pt(28), bold=True, color=DARK_BLUE)
         slide.shapes.title.text_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
         
-        headers = list(rows[0].keys())
         # 16:9 Layout: Width 12", Margin 0.665"
         shape = slide.shapes.add_table(len(chunk)+1, len(headers), Inches(0.665), Inches(1.5), Inches(12), Inches(0.4*(len(chunk)+1)))
         table = shape.table
@@ -140,26 +173,11 @@ def add_table_slide(prs, title, rows, currency_symbol='$'):
             for c, header in enumerate(headers):
                 val = row_data.get(header)
                 cell = table.cell(r + 1, c)
-                
-                h_str = str(header).lower()
-                t_str = str(title).lower()
-                fmt = None
-                
-                if any(x in h_str for x in ['%', 'percent', 'variación', 'variation', 'coef', 'descuento', 'volatilidad']):
-                    fmt = 'percent'
-                elif any(x in h_str for x in ['cantidad', 'cant.', 'volumen', 'versiones', 'total', 'numero', 'count']):
-                    fmt = 'integer'
-                elif any(x in h_str for x in ['precio', 'price', 'monto', 'valor', 'bono', 'lista', 'costo', 'avg', 'min', 'max', 'promedio']):
-                    fmt = 'currency'
-                elif any(x in t_str for x in ['volatilidad', 'volatility', 'tendencia', 'trend', 'variación', 'variation', 'share', 'participación', 'discount', 'descuento']):
-                     if isinstance(val, (int, float)) and not any(x in h_str for x in ['fecha', 'date', 'year', 'año', 'mes']): 
-                        fmt = 'percent'
-                elif "precio" in t_str or "price" in t_str:
-                     if isinstance(val, (int, float)): fmt = 'currency'
-                
-                if 'año' in h_str or 'year' in h_str: fmt = None
+                fmt, numeric_only = formats[header]
+                if numeric_only and not isinstance(val, (int, float)):
+                    fmt = None
 
-                cell.text = format_value(val, fmt, currency_symbol)
+                cell.text = texts[header][i * MAX_ROWS + r]
                 tf = cell.text_frame.paragraphs[0]
                 tf.font.name = "Avenir Medium" # Template Body Font
                 tf.font.size = Pt(9)
@@ -169,8 +187,6 @@ def add_table_slide(prs, title, rows, currency_symbol='$'):
                 else:
                      tf.alignment = PP_ALIGN.LEFT
 
-
-
 def generate_ppt(data):
     try:
         prs = Presentation()
@@ -182,6 +198,20 @@ def generate_ppt(data):
         currency_symbol = data.get('currencySymbol', '$')
         date_str = datetime.now().strftime("%d/%m/%Y")
         
+        # Date-axis charts bucketed to the report period, if requested
+        with stage('resample'):
+            data = resample_report(data)
+        with stage('summary_stats'):
+            data = fill_summary(data)
+        
+        # 0. Estimate the deck; oversized payloads get a reduced plan
+        plan = plan_budget(estimate_dashboard_deck, data)
+        current_span().set(estimated_slides=plan.before.slides, estimated_cells=plan.before.cells,
+                           estimated_memory=plan.before.memory_bytes, degraded=plan.degraded)
+        if plan.degraded:
+            record_degraded()
+            log_warning("Report over budget, rendering reduced plan", **plan.as_dict())
+        
         # 1. Slide 1: Logo Cover
         create_logo_slide(prs)
     
@@ -191,56 +221,77 @@ def generate_ppt(data):
         # 3. Summary Slide (Same as Excel Summary Sheet)
         summary = data.get('summary')
         if summary:
-            try:
-                create_summary_slide(prs, summary, currency_symbol)
-            except Exception as e:
-                print(f"Summary slide error: {e}")
+            with stage('summary'):
+                try:
+                    create_summary_slide(prs, summary, currency_symbol)
+                except Exception as e:
+                    log_warning("Summary slide error", error=e)
+        
+        if plan.degraded:
+            create_note_slide(prs, "Nota sobre este Reporte", plan.note_lines())
             
         # 4. Sheets (Charts + Data Tables)
         sheets = data.get('sheets', [])
         for sheet in sheets:
-            try:
-                add_chart_slide(prs, sheet, currency_symbol)
-            except Exception as e:
-                print(f"Error creating chart/table slide {sheet.get('name')}: {e}")
+            with stage('charts', sheet=sheet.get('name')):
+                try:
+                    add_chart_slide(prs, sheet, currency_symbol, plan)
+                except Exception as e:
+                    log_warning("Error creating chart/table slide", error=e, sheet=sheet.get('name'))
                 
-        # 5. Models Data (Raw Table)
+        # 5. Models Data (Raw Table, or brand -> model -> submodel subtotals)
         models = data.get('models', [])
-        if models:
-            model_rows = []
-            for m in models:
-                 p_lista = float(m.get('precio_lista', 0) or 0)
-                 bono = float(m.get('bono', 0) or 0)
-                 dsc = (bono / p_lista) if p_lista > 0 else 0
-                 
-                 model_rows.append({
-                     "Marca": m.get('brand'),
-                     "Modelo": m.get('model'),
-                     "Versión": m.get('submodel', '-'),
-                     "Estado": m.get('estado', 'N/A'),
-                     "Precio Lista": m.get('precio_lista', 0),
-                     "Bono": m.get('bono', 0),
-                     "Precio Final": m.get('precio_con_bono', 0),
-                     "% Desc.": dsc
-                 })
-            
-            try:
-                add_table_slide(prs, "Detalle de Modelos", model_rows, currency_symbol)
-            except Exception as e:
-                print(f"Error adding models table: {e}")
+        if models and not plan.appendix:
+            with stage('models', rows=len(models)):
+                top_k = requested_top_k(data)
+                models_title = "Detalle de Modelos"
+                if plan.group_models:
+                    # Over budget: brand/model subtotals only, no drill-down
+                    model_rows = hierarchy_rows(aggregate_models(models, top_k=0))
+                    models_title = "Detalle de Modelos (por Modelo)"
+                elif top_k is not None:
+                    model_rows = hierarchy_rows(aggregate_models(models, top_k))
+                else:
+                    model_rows = []
+                    for m in models:
+                         p_lista = float(m.get('precio_lista', 0) or 0)
+                         bono = float(m.get('bono', 0) or 0)
+                         dsc = (bono / p_lista) if p_lista > 0 else 0
+                         
+                         model_rows.append({
+                             "Marca": m.get('brand'),
+                             "Modelo": m.get('model'),
+                             "Versión": m.get('submodel', '-'),
+                             "Estado": m.get('estado', 'N/A'),
+                             "Precio Lista": m.get('precio_lista', 0),
+                             "Bono": m.get('bono', 0),
+                             "Precio Final": m.get('precio_con_bono', 0),
+                             "% Desc.": dsc
+                         })
+                
+                model_rows = plan.trim_table(model_rows)
+                
+                try:
+                    add_table_slide(prs, models_title, model_rows, currency_symbol)
+                except Exception as e:
+                    log_warning("Error adding models table", error=e)
 
         # 6. Last Slide: Logo Cover
         create_logo_slide(prs)
             
-        output = io.BytesIO()
-        prs.save(output)
-        output.seek(0)
+        with stage('save'):
+            output = io.BytesIO()
+            prs.save(output)
+            output.seek(0)
+        record_counts(
+            slides=len(prs.slides),
+            rows=sum(len(s.get('data') or []) for s in sheets) + len(models or [])
+        )
         return output.getvalue()
     except Exception as global_e:
         # Fallback: Create a simple error presentation
-        print(f"CRITICAL ERROR GENERATING PPT: {global_e}")
-        import traceback
-        traceback.print_exc()
+        log_warning("CRITICAL ERROR GENERATING PPT", error=global_e, traceback=traceback.format_exc())
+        record_fallback_deck()
         
         err_prs = Presentation()
         slide = err_prs.slides.add_slide(err_prs.slide_layouts[0])
@@ -257,18 +308,35 @@ class handler(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Report-Trace, X-Report-Profile, X-Report-Plan')
         self.end_headers()
     
+    def do_GET(self):
+        if wants_metrics(self.path):
+            return send_metrics(self)
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({"status": "ok", "service": "ppt-generator"}).encode())
+
     def do_POST(self):
         try:
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            filename = data.get('filename', 'Presentation.pptx').replace('.xlsx', '.pptx')
-            ppt_bytes = generate_ppt(data)
+            if wants_plan(self.headers, self.path):
+                return send_plan(self, 'generate-ppt', post_data)
+            with trace_request('generate-ppt', self.headers, self.path) as trace, \
+                 request_scope('generate-ppt', payload_bytes=len(post_data)):
+                with stage('parse', payload_bytes=len(post_data)):
+                    data = json.loads(post_data.decode('utf-8'))
+                filename = data.get('filename', 'Presentation.pptx').replace('.xlsx', '.pptx')
+                ppt_bytes = generate_ppt(data)
+                record_output(len(ppt_bytes))
             self.send_response(200)
             self.send_header('Access-Control-Allow-Origin', '*')
+            for key, value in trace.response_headers().items():
+                self.send_header(key, value)
             self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.presentationml.presentation')
             self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
             self.send_header('Content-Length', len(ppt_bytes))
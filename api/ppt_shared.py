@@ -13,11 +13,25 @@ from pptx.enum.chart import (
 )
 from pptx.oxml.ns import qn
 
+try:
+    from api.report_metrics import stage
+    from api.report_tracing import current_span, log_warning
+    from api.report_budget import MAX_ROWS, MAX_DATA_COLS
+    from api.report_series import chart_rows, is_envelope_series
+    from api.report_format import column_format, format_column, formatter
+except ImportError:
+    from report_metrics import stage
+    from report_tracing import current_span, log_warning
+    from report_budget import MAX_ROWS, MAX_DATA_COLS
+    from report_series import chart_rows, is_envelope_series
+    from report_format import column_format, format_column, formatter
+
 # --- BRAND COLORS (Institutional) ---
 DARK_BLUE = RGBColor(30, 41, 59)  # Slate 900 #1E293B
 DEEP_NAVY = RGBColor(13, 40, 65)  # #0D2841 (Cover BG)
 LIGHT_BLUE = RGBColor(71, 85, 105) # Slate 600
 WHITE = RGBColor(255, 255, 255)
+ENVELOPE_COLOR = RGBColor(203, 213, 225) # Slate 300 (min/median/max of folded series)
 
 # --- ASSET LOADING ---
 # Robust asset loading bypassing path issues
@@ -40,30 +54,15 @@ try:
             LOGO_B64 = None
             BG_B64 = None
 except Exception as e:
-    print(f"Warning: Failed to load assets: {e}")
+    log_warning("Failed to load assets", error=e)
     LOGO_B64 = None
     BG_B64 = None
 
 # --- HELPER FUNCTIONS ---
 
 def format_value(val, fmt=None, currency='$'):
-    if val is None: return "-"
-    try:
-        val_float = float(val)
-        if fmt == 'currency':
-             if currency == 'UF':
-                 return f"UF {val_float:,.2f}".replace(",", ".")
-             else:
-                 return f"{currency} {val_float:,.0f}".replace(",", ".")
-        elif fmt == 'percent':
-            return f"{val_float * 100:.1f}%"
-        elif fmt == 'integer':
-             return f"{val_float:,.0f}".replace(",", ".")
-        elif isinstance(val, (int, float)):
-            return f"{val_float:,.0f}" if val_float.is_integer() else f"{val_float:.2f}"
-    except:
-        pass
-    return str(val)
+    # One value; tables format whole columns with report_format.format_column
+    return formatter(fmt, currency)(val)
 
 def set_font(shape, font_name="Avenir Medium", font_size=None, bold=False, color=None):
     if not shape.has_text_frame:
@@ -103,9 +102,9 @@ def create_logo_slide(prs):
             top = (slide_height - pic.height) / 2
             pic.top = int(top)
         else:
-            print("Warning: LOGO_B64 not available")
+            log_warning("LOGO_B64 not available")
     except Exception as e:
-        print(f"Error adding logo to slide: {e}")
+        log_warning("Error adding logo to slide", error=e)
 
 def create_intro_slide(prs, title, date_str):
     """Creates intro slide with split background using embedded asset."""
@@ -116,7 +115,7 @@ def create_intro_slide(prs, title, date_str):
         if img_stream:
             slide.shapes.add_picture(img_stream, 0, 0, width=prs.slide_width, height=prs.slide_height)
     except Exception as e:
-        print(f"Error adding background to intro: {e}")
+        log_warning("Error adding background to intro", error=e)
         
     # Text Layout for Split Background (Left side white space)
     left = Inches(0.8) # Left padding
@@ -146,14 +145,38 @@ def create_intro_slide(prs, title, date_str):
         run.font.color.rgb = LIGHT_BLUE
     p_date.alignment = PP_ALIGN.LEFT
 
+def create_note_slide(prs, title, lines):
+    """Plain text slide (used to explain a reduced report)."""
+    slide = prs.slides.add_slide(prs.slide_layouts[5])
+    slide.shapes.title.text = title
+
+    # Force Title to Full Width
+    slide.shapes.title.left = Inches(0)
+    slide.shapes.title.width = prs.slide_width
+    slide.shapes.title.top = Inches(0.5) # Add top margin
+
+    set_font(slide.shapes.title, font_name="Avenir Black", font_size=Pt(28), bold=True, color=DARK_BLUE)
+    slide.shapes.title.text_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
+
+    # 16:9 Layout: Width 11", Margin (13.33 - 11)/2
+    tb = slide.shapes.add_textbox(Inches(1.165), Inches(1.8), Inches(11), Inches(5))
+    tf = tb.text_frame
+    tf.word_wrap = True
+    for i, line in enumerate(lines):
+        p = tf.paragraphs[0] if i == 0 else tf.add_paragraph()
+        p.text = line
+        p.font.name = "Avenir Medium"
+        p.font.size = Pt(16)
+        p.font.color.rgb = LIGHT_BLUE if line.startswith("•") else DARK_BLUE
+        p.space_after = Pt(6)
+
 # --- SHARED CHART & TABLE LOGIC ---
 
 def add_table_slide(prs, title, rows, currency_symbol='$'):
     if not rows: return
     
-    # Configuration
-    MAX_ROWS = 12
-    MAX_DATA_COLS = 7 # Reduced from 10 to ensure wide columns for currency (No wrapping)
+    # Pagination (MAX_ROWS / MAX_DATA_COLS) lives in report_budget so the
+    # cost estimator can predict slide counts without python-pptx
     
     # 1. Prepare Columns (Headers)
     all_headers = list(rows[0].keys())
@@ -162,6 +185,13 @@ def add_table_slide(prs, title, rows, currency_symbol='$'):
     
     # Chunk Columns (Horizontal Split) - Outer Loop (Group by Series/Topic)
     col_chunks = [data_headers[i:i + MAX_DATA_COLS] for i in range(0, len(data_headers), MAX_DATA_COLS)]
+    current_span().set(rows=len(rows), cols=len(all_headers),
+                       slides=len(col_chunks) * -(-len(rows) // MAX_ROWS))
+
+    # Format every column once (es-CL, report_format), before pagination
+    formats = {h: column_format(h, title) for h in all_headers}
+    texts = {h: format_column([r.get(h) for r in rows], formats[h][0], currency_symbol, formats[h][1])
+             for h in all_headers}
     
     slide_count = 0
     
@@ -215,30 +245,16 @@ def add_table_slide(prs, title, rows, currency_symbol='$'):
                 tf.alignment = PP_ALIGN.CENTER
 
             # Render Data Rows
+            row_start = r_idx * MAX_ROWS
             for r, row_data in enumerate(row_chunk):
                 for c, header in enumerate(current_headers):
                     val = row_data.get(header)
                     cell = table.cell(r + 1, c)
-                    
-                    h_str = str(header).lower()
-                    t_str = str(title).lower()
-                    fmt = None
-                    
-                    if any(x in h_str for x in ['%', 'percent', 'variación', 'variation', 'coef', 'descuento', 'volatilidad']):
-                        fmt = 'percent'
-                    elif any(x in h_str for x in ['cantidad', 'cant.', 'volumen', 'versiones', 'total', 'numero', 'count']):
-                        fmt = 'integer'
-                    elif any(x in h_str for x in ['precio', 'price', 'monto', 'valor', 'bono', 'lista', 'costo', 'avg', 'min', 'max', 'promedio']):
-                        fmt = 'currency'
-                    elif any(x in t_str for x in ['volatilidad', 'volatility', 'variación', 'variation', 'share', 'participación', 'discount', 'descuento']):
-                         if isinstance(val, (int, float)) and not any(x in h_str for x in ['fecha', 'date', 'year', 'año', 'mes']): 
-                            fmt = 'percent'
-                    elif "precio" in t_str or "price" in t_str:
-                         if isinstance(val, (int, float)): fmt = 'currency'
-                    
-                    if 'año' in h_str or 'year' in h_str: fmt = None
+                    fmt, numeric_only = formats[header]
+                    if numeric_only and not isinstance(val, (int, float)):
+                        fmt = None
 
-                    cell.text = format_value(val, fmt, currency_symbol)
+                    cell.text = texts[header][row_start + r]
                     tf = cell.text_frame.paragraphs[0]
                     tf.font.name = "Avenir Medium"
                     tf.font.size = Pt(9)
@@ -250,7 +266,7 @@ def add_table_slide(prs, title, rows, currency_symbol='$'):
             
             slide_count += 1
 
-def add_chart_slide(prs, chart_info, currency_symbol='$'):
+def add_chart_slide(prs, chart_info, currency_symbol='$', plan=None):
     slide = prs.slides.add_slide(prs.slide_layouts[5])
     slide.shapes.title.text = chart_info.get('chart_title', 'Gráfico')
     
@@ -273,6 +289,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
     
     # Heuristics based on chart name/title to apply specific formatting
     name_lower = str(chart_info.get('name') or chart_info.get('chart_title') or '').lower()
+    current_span().set(chart=name_lower, chart_type=chart_type, rows=len(rows), series=len(series_names))
     
     # 1. Chart Types & Data Preparation
     if chart_type == 'scatter':
@@ -298,6 +315,8 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
         elif chart_type == 'stacked': ppt_chart_type = XL_CHART_TYPE.COLUMN_STACKED
         
         is_evolution = 'evolución' in name_lower or 'evolution' in name_lower
+        # Pivoted long-format data marks missing points explicitly (None)
+        show_gaps = is_evolution or chart_info.get('gaps', False)
         
         # Robust detection: Check Name OR Headers
         is_variation = ('tendencia' in name_lower or 'variación' in name_lower or 'variacion' in name_lower)
@@ -340,16 +359,22 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
             chart_data.add_series("Valores Negativos", negative_values)
         else:
             # STANDARD HANDLING FOR OTHER CHARTS
+            # Crowded charts plot the top series plus an envelope of the rest;
+            # the table slides below still get every series
+            plot_rows = chart_rows(chart_info, rows, show_gaps)
+            if plot_rows is not rows:
+                series_names = list(plot_rows[0].keys())[1:]
+                current_span().set(plotted_series=len(series_names))
             for s_name in series_names:
                 values = []
-                for r in rows:
+                for r in plot_rows:
                     val = r.get(s_name, 0)
                     try:
-                        # Logic: If Evolution, treat 0 as None (Gap)
+                        # Logic: If Evolution (or explicit gaps), treat 0 as None (Gap)
                         # Otherwise default to 0.0
                         fval = float(val) if val is not None else 0.0
                         
-                        if is_evolution and fval == 0.0:
+                        if show_gaps and fval == 0.0:
                             values.append(None)
                         else:
                             values.append(fval)
@@ -440,7 +465,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                      chart.has_legend = False
                  
              except Exception as e:
-                 print(f"Error applying dual-series colors: {e}")
+                 log_warning("Error applying dual-series colors", error=e)
         
         # 0. "Evolución" (Evolution) -> Line Chart, No Data Labels (Clean), Currency Axis
         if 'evolución' in name_lower or 'evolution' in name_lower:
@@ -457,7 +482,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                  # Try setting the attribute on the element.
                  c_chart.dispBlanksAs.set('val', 'span')
              except Exception as e:
-                 print(f"Error setting display_blanks_as: {e}")
+                 log_warning("Error setting display_blanks_as", error=e)
 
              # Manual Layout to reserve space for Dates (Bottom) and Legend (Below Dates)
              try:
@@ -473,7 +498,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                  # playout.manual_layout.width = 1.0
                  # playout.manual_layout.x = 0.0
              except Exception as e:
-                 print(f"Error setting manual layout: {e}")
+                 log_warning("Error setting manual layout", error=e)
              
              # Y-Axis Currency
              if chart.value_axis:
@@ -492,7 +517,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                      series.marker.style = XL_MARKER_STYLE.CIRCLE
                      series.marker.size = 7
              except Exception as e:
-                 print(f"Error setting markers: {e}")
+                 log_warning("Error setting markers", error=e)
              
              # X-Axis Dates (Rotate if needed)
              try:
@@ -516,7 +541,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                  bodyPr.set('rot', '-2700000') # -45 degrees roughly
                  bodyPr.set('vert', 'horz')
              except Exception as e:
-                 print(f"Error formatting evolution axis: {e}")
+                 log_warning("Error formatting evolution axis", error=e)
 
         # 1. "Composición" -> Integers, Vary Colors
         elif 'composición' in name_lower or 'composition' in name_lower:
@@ -584,7 +609,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                 bodyPr.set('rot', '-5400000')
                 bodyPr.set('vert', 'horz') 
             except Exception as e:
-                print(f"Error rotating labels: {e}")
+                log_warning("Error rotating labels", error=e)
         
         # 2.1 "Benchmarking" -> Markers on Lines
         elif 'benchmarking' in name_lower:
@@ -601,7 +626,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                      series.marker.style = XL_MARKER_STYLE.CIRCLE
                      series.marker.size = 7
              except Exception as e:
-                 print(f"Error setting markers for benchmarking: {e}")
+                 log_warning("Error setting markers for benchmarking", error=e)
             
         # 0. "Tendencia" (Trend) -> Percent Axis, Colored Bars
         elif 'tendencia' in name_lower or 'trend' in name_lower:
@@ -640,7 +665,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                      # Force Negatives to stay Blue
                      series.invert_if_negative = False
             except Exception as e:
-                 print(f"Error styling trend chart: {e}")
+                 log_warning("Error styling trend chart", error=e)
                 
         # 4. "Volatilidad" (Volatility) -> Percent Axis, Smoothed Lines, Vertical Dates
         elif 'volatilidad' in name_lower or 'volatility' in name_lower:
@@ -663,7 +688,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                 bodyPr.set('rot', '-5400000')
                 bodyPr.set('vert', 'horz')
             except Exception as e:
-                print(f"Error formatting volatility axis: {e}")
+                log_warning("Error formatting volatility axis", error=e)
 
         # 5. "Matriz" (Scatter/Bubble) -> Fix Axes
         elif 'matriz' in name_lower or chart_type == 'scatter':
@@ -693,7 +718,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                  bubbleScale = bubbleChart.get_or_add_bubbleScale()
                  bubbleScale.val = 60
              except Exception as e:
-                 print(f"Error scaling bubbles: {e}")
+                 log_warning("Error scaling bubbles", error=e)
 
         # 6. "Benchmarking" -> Line Chart with Currency, Smoothing, Markers
         elif 'benchmarking' in name_lower:
@@ -710,7 +735,7 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                      series.marker.style = XL_MARKER_STYLE.CIRCLE
                      series.marker.size = 7 # Visible but not huge
              except Exception as e:
-                 print(f"Error setting markers: {e}")
+                 log_warning("Error setting markers", error=e)
 
         # Apply Brand Colors (if not varying by category)
         val_axis = chart.value_axis
@@ -726,6 +751,8 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
             ]
              for i, series in enumerate(chart.series):
                 color = brand_palette[i % len(brand_palette)]
+                if is_envelope_series(series.name):
+                    color = ENVELOPE_COLOR
                 try:
                     if chart_type == 'line':
                          series.format.line.solid()
@@ -737,7 +764,11 @@ def add_chart_slide(prs, chart_info, currency_symbol='$'):
                     pass
 
     except Exception as e:
-        print(f"Chart formatting warning: {e}")
+        log_warning("Chart formatting warning", error=e, chart=name_lower, chart_type=chart_type)
 
-    # Always add the table afterwards
-    add_table_slide(prs, chart_info.get('chart_title', 'Datos'), rows, currency_symbol)
+    # Always add the table afterwards (trimmed when the report is over budget)
+    if plan is not None and plan.appendix:
+        return
+    with stage('tables', title=chart_info.get('chart_title', 'Datos')):
+        table_rows = plan.trim_table(rows) if plan is not None else rows
+        add_table_slide(prs, chart_info.get('chart_title', 'Datos'), table_rows, currency_symbol)
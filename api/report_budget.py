@@ -0,0 +1,429 @@
+# Cost estimation and memory-budget guardrails for the report generators.
+#
+# Each generator estimates slides, table cells, chart points and memory for
+# a payload before rendering anything. When the estimate is over budget a
+# degrade plan trims the tables (models grouped by brand/model, top-N rows,
+# fewer column groups, or tables left to the Excel export) and the report
+# gets a note explaining what was reduced.
+#
+# Budget: REPORT_MAX_SLIDES, REPORT_MAX_CELLS (deck table cells) and
+# REPORT_MEMORY_BUDGET_MB. Setting a limit to 0 disables it.
+
+import os
+
+try:
+    from api.report_hierarchy import count_groups, requested_top_k
+    from api.report_series import plotted_series
+    from api.report_format import formatter
+except ImportError:
+    from report_hierarchy import count_groups, requested_top_k
+    from report_series import plotted_series
+    from report_format import formatter
+
+# Table pagination, shared with ppt_shared.add_table_slide
+MAX_ROWS = 12
+MAX_DATA_COLS = 7 # Reduced from 10 to ensure wide columns for currency (No wrapping)
+
+# Resident memory per rendered element, measured with python-pptx 0.6.23
+# and openpyxl 3.1.2 (RSS growth while rendering, before save)
+PPT_SLIDE_BYTES = 9_000
+PPT_CELL_BYTES = 2_700
+PPT_POINT_BYTES = 1_600
+XLSX_CELL_BYTES = 400
+
+DEFAULT_MAX_SLIDES = 300
+DEFAULT_MAX_CELLS = 150_000
+DEFAULT_MEMORY_MB = 512
+
+# Column counts of the fixed tables built by the generators
+MODEL_TABLE_COLS = 8       # "Detalle de Modelos" in generate-ppt
+MODEL_GROUP_COLS = 8       # aggregated brand -> model -> submodel (PPT and Excel)
+MODEL_SHEET_COLS = 9       # "Modelos" sheet in generate-excel
+SUMMARY_TABLE_CELLS = 20   # "Resumen Ejecutivo" metric table
+
+# Degrade steps tried in order until the estimate fits
+DECK_STEPS = (
+    {'group_models': True},
+    {'group_models': True, 'row_limit': 10 * MAX_ROWS, 'col_limit': 3 * MAX_DATA_COLS},
+    {'group_models': True, 'row_limit': 2 * MAX_ROWS, 'col_limit': MAX_DATA_COLS},
+    {'group_models': True, 'appendix': True},
+)
+WORKBOOK_STEPS = (
+    {'row_limit': 100_000},
+    {'row_limit': 25_000},
+    {'row_limit': 5_000},
+)
+
+TIME_HEADERS = ('fecha', 'date', 'mes', 'month', 'semana', 'week')
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _thousands(n):
+    return formatter('integer')(int(n))
+
+
+# --- COST ---
+
+class Cost:
+    __slots__ = ('slides', 'sheets', 'cells', 'points', 'memory_bytes')
+
+    def __init__(self, slides=0, sheets=0, cells=0, points=0, memory_bytes=0):
+        self.slides = slides
+        self.sheets = sheets
+        self.cells = cells
+        self.points = points
+        self.memory_bytes = memory_bytes
+
+    def __add__(self, other):
+        return Cost(*(getattr(self, k) + getattr(other, k) for k in self.__slots__))
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return f"Cost({', '.join(f'{k}={getattr(self, k)}' for k in self.__slots__)})"
+
+
+def table_pages(n_rows, n_cols, chunk_cols=True):
+    """Slides add_table_slide produces for an n_rows x n_cols table."""
+    if n_rows <= 0:
+        return 0
+    row_pages = -(-n_rows // MAX_ROWS)
+    if not chunk_cols:
+        return row_pages
+    col_groups = -(-max(n_cols - 1, 0) // MAX_DATA_COLS)
+    return col_groups * row_pages
+
+
+def table_cost(n_rows, n_cols, chunk_cols=True):
+    """Slides and cells (header rows and repeated first column included)."""
+    pages = table_pages(n_rows, n_cols, chunk_cols)
+    if not pages:
+        return Cost()
+    row_pages = -(-n_rows // MAX_ROWS)
+    if chunk_cols:
+        data_cols = n_cols - 1
+        col_groups = pages // row_pages
+        cells = (data_cols + col_groups) * (n_rows + row_pages)
+    else:
+        cells = n_cols * (n_rows + row_pages)
+    return Cost(slides=pages, cells=cells)
+
+
+def _deck_memory(cost):
+    cost.memory_bytes = (cost.slides * PPT_SLIDE_BYTES + cost.cells * PPT_CELL_BYTES
+                         + cost.points * PPT_POINT_BYTES)
+    return cost
+
+
+def _shape(rows):
+    return len(rows), (len(rows[0]) if rows else 0)
+
+
+# --- LAYOUT ---
+# What each generator renders, section by section, without rendering it.
+# A section is one logical block (a chart, a paginated table, a sheet).
+
+class Section:
+    __slots__ = ('kind', 'title', 'rows', 'cols', 'cost')
+
+    def __init__(self, kind, title, rows=0, cols=0, cost=None):
+        self.kind = kind
+        self.title = title
+        self.rows = rows
+        self.cols = cols
+        self.cost = cost or Cost()
+
+    def as_dict(self):
+        out = {'kind': self.kind, 'title': self.title, 'rows': self.rows, 'cols': self.cols}
+        out.update({k: v for k, v in self.cost.as_dict().items() if v and k != 'memory_bytes'})
+        return out
+
+
+def _slide(kind, title):
+    return Section(kind, title, cost=Cost(slides=1))
+
+
+def _chart_with_table(chart_info, plan):
+    """add_chart_slide: one chart slide, then the data as table slides."""
+    title = chart_info.get('chart_title', 'Datos')
+    rows = chart_info.get('data') or []
+    if not rows:
+        yield _slide('chart', chart_info.get('chart_title', 'Gráfico'))
+        return
+    n_rows, n_cols = _shape(rows)
+    n_series = plotted_series(chart_info, max(n_cols - 1, 1))
+    yield Section('chart', title, n_rows, n_cols, Cost(slides=1, points=n_rows * n_series))
+    if not plan.appendix:
+        yield _table(title, *plan.table_shape(n_rows, n_cols))
+
+
+def _table(title, n_rows, n_cols, chunk_cols=True):
+    return Section('table', title, n_rows, n_cols, table_cost(n_rows, n_cols, chunk_cols))
+
+
+def dashboard_deck_sections(data, plan=None):
+    """generate-ppt: covers, summary, note, chart + table per sheet, models table."""
+    plan = plan or NO_PLAN
+    yield _slide('cover', None)
+    yield _slide('intro', data.get('title', 'Reporte Dashboard'))
+    if data.get('summary'):
+        yield Section('summary', 'Resumen Ejecutivo', 9, 2, Cost(slides=1, cells=SUMMARY_TABLE_CELLS))
+    if plan.reduces:
+        yield _slide('note', 'Nota sobre este Reporte')
+    for sheet in data.get('sheets') or []:
+        yield from _chart_with_table(sheet, plan)
+    models = data.get('models') or []
+    if models and not plan.appendix:
+        top_k = requested_top_k(data)
+        if plan.group_models:
+            # Over budget: subtotals only, no drill-down
+            title = "Detalle de Modelos (por Modelo)"
+            n_rows, n_cols = plan.count_groups(models, 0), MODEL_GROUP_COLS
+        elif top_k is not None:
+            title = "Detalle de Modelos"
+            n_rows, n_cols = plan.count_groups(models, top_k), MODEL_GROUP_COLS
+        else:
+            title = "Detalle de Modelos"
+            n_rows, n_cols = len(models), MODEL_TABLE_COLS
+        if plan.row_limit is not None:
+            n_rows = min(n_rows, plan.row_limit)
+        yield _table(title, n_rows, n_cols, chunk_cols=False)
+    yield _slide('cover', None)
+
+
+def slides_deck_sections(data, plan=None):
+    """generate-ppt-compare / generate-ppt-evolution: covers, note, `slides`."""
+    plan = plan or NO_PLAN
+    yield _slide('cover', None)
+    yield _slide('intro', data.get('reportTitle', 'Reporte'))
+    if plan.reduces:
+        yield _slide('note', 'Nota sobre este Reporte')
+    for slide in data.get('slides') or []:
+        rows = slide.get('data') or []
+        if slide.get('type') == 'chart':
+            yield from _chart_with_table(slide, plan)
+        elif slide.get('type') == 'table' and rows and not plan.appendix:
+            title = slide.get('title') or slide.get('chart_title') or 'Tabla'
+            yield _table(title, *plan.table_shape(*_shape(rows)))
+    yield _slide('cover', None)
+
+
+def workbook_sections(data, plan=None):
+    """generate-excel: summary/info sheet, note, Modelos, data sheet + chartsheet per sheet."""
+    plan = plan or NO_PLAN
+    if data.get('summary'):
+        yield Section('summary', 'Resumen Ejecutivo', 13, 2, Cost(sheets=1, cells=40))
+    elif data.get('title', 'REPORTE DE DASHBOARD'):
+        yield Section('info', 'Información', 4, 2, Cost(sheets=1, cells=12))
+    if plan.reduces:
+        yield Section('note', 'Nota', 12, 1, Cost(sheets=1, cells=12))
+    models = data.get('models') or []
+    if models:
+        top_k = requested_top_k(data)
+        if top_k is None:
+            n_rows, n_cols = len(models), MODEL_SHEET_COLS
+        else:
+            n_rows, n_cols = plan.count_groups(models, top_k), MODEL_GROUP_COLS
+        if plan.row_limit is not None:
+            n_rows = min(n_rows, plan.row_limit)
+        yield Section('models', 'Modelos', n_rows, n_cols,
+                      Cost(sheets=1, cells=(n_rows + 1) * n_cols))
+    names = set()
+    for sheet in data.get('sheets') or []:
+        rows = sheet.get('data') or []
+        if not rows:
+            continue
+        name = sheet.get('name', 'Sheet')[:31]
+        n_rows, n_cols = plan.table_shape(*_shape(rows))
+        yield Section('data', name, n_rows, n_cols, Cost(sheets=1, cells=(n_rows + 1) * n_cols))
+        # Same naming rule as generate_excel
+        chart_name = f"Gráfico {name}"[:31]
+        counter = 1
+        while chart_name in names:
+            chart_name = f"Gráfico {name[:20]} {counter}"
+            counter += 1
+        names.update((name, chart_name))
+        yield Section('chartsheet', chart_name, n_rows, n_cols,
+                      Cost(sheets=1, points=n_rows * max(n_cols - 1, 1)))
+
+
+def _total(sections):
+    cost = Cost()
+    for section in sections:
+        cost += section.cost
+    return cost
+
+
+def estimate_dashboard_deck(data, plan=None):
+    return _deck_memory(_total(dashboard_deck_sections(data, plan)))
+
+
+def estimate_slides_deck(data, plan=None):
+    return _deck_memory(_total(slides_deck_sections(data, plan)))
+
+
+def estimate_workbook(data, plan=None):
+    cost = _total(workbook_sections(data, plan))
+    cost.memory_bytes = cost.cells * XLSX_CELL_BYTES
+    return cost
+
+
+# --- BUDGET ---
+
+class Budget:
+    def __init__(self, max_slides=DEFAULT_MAX_SLIDES, max_cells=DEFAULT_MAX_CELLS,
+                 max_memory_bytes=DEFAULT_MEMORY_MB * 1024 * 1024):
+        self.max_slides = max_slides
+        self.max_cells = max_cells
+        self.max_memory_bytes = max_memory_bytes
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_slides=_env_int('REPORT_MAX_SLIDES', DEFAULT_MAX_SLIDES),
+            max_cells=_env_int('REPORT_MAX_CELLS', DEFAULT_MAX_CELLS),
+            max_memory_bytes=_env_int('REPORT_MEMORY_BUDGET_MB', DEFAULT_MEMORY_MB) * 1024 * 1024,
+        )
+
+    def exceeded(self, cost):
+        """Human-readable reasons `cost` is over budget (empty when it fits).
+
+        The cell limit applies to decks only; workbooks are bounded by memory.
+        """
+        reasons = []
+        if self.max_slides and cost.slides > self.max_slides:
+            reasons.append(f"{_thousands(cost.slides)} diapositivas (máximo {_thousands(self.max_slides)})")
+        if self.max_cells and cost.slides and cost.cells > self.max_cells:
+            reasons.append(f"{_thousands(cost.cells)} celdas de tabla (máximo {_thousands(self.max_cells)})")
+        if self.max_memory_bytes and cost.memory_bytes > self.max_memory_bytes:
+            reasons.append(f"{_thousands(cost.memory_bytes / 1048576)} MB de memoria estimada "
+                           f"(máximo {_thousands(self.max_memory_bytes / 1048576)} MB)")
+        return reasons
+
+
+# --- DEGRADE PLAN ---
+
+def _is_time_axis(rows):
+    first = str(next(iter(rows[0]), '')).lower()
+    return any(t in first for t in TIME_HEADERS)
+
+
+class DegradePlan:
+    """How to cut a report down to budget. The default plan changes nothing."""
+
+    def __init__(self, group_models=False, row_limit=None, col_limit=None, appendix=False, group_counts=None):
+        self.group_models = group_models
+        self.row_limit = row_limit
+        self.col_limit = col_limit
+        self.appendix = appendix
+        # top_k -> count_groups, shared by the plans of one plan_budget call
+        self.group_counts = group_counts
+        self.reasons = []
+        self.before = None
+        self.after = None
+
+    @property
+    def degraded(self):
+        return bool(self.reasons)
+
+    @property
+    def reduces(self):
+        """True when the plan changes the output (and so adds a note)."""
+        return bool(self.group_models or self.appendix
+                    or self.row_limit is not None or self.col_limit is not None)
+
+    def count_groups(self, models, top_k):
+        """report_hierarchy.count_groups, computed once per top_k when shared."""
+        if self.group_counts is None:
+            return count_groups(models, top_k)
+        if top_k not in self.group_counts:
+            self.group_counts[top_k] = count_groups(models, top_k)
+        return self.group_counts[top_k]
+
+    def table_shape(self, n_rows, n_cols):
+        if self.row_limit is not None:
+            n_rows = min(n_rows, self.row_limit)
+        if self.col_limit is not None:
+            n_cols = min(n_cols, self.col_limit + 1)
+        return n_rows, n_cols
+
+    def trim_table(self, rows):
+        """Top-N rows (latest N for time series) and the first column groups."""
+        if not rows:
+            return rows
+        if self.row_limit is not None and len(rows) > self.row_limit:
+            rows = rows[-self.row_limit:] if _is_time_axis(rows) else rows[:self.row_limit]
+        if self.col_limit is not None:
+            headers = list(rows[0].keys())
+            if len(headers) - 1 > self.col_limit:
+                keep = headers[:self.col_limit + 1]
+                rows = [{h: r.get(h) for h in keep} for r in rows]
+        return rows
+
+    def note_lines(self, workbook=False):
+        """Spanish explanation for the note slide / sheet."""
+        lines = ["El volumen estimado del reporte supera el presupuesto del generador:"]
+        lines += [f"• {reason}" for reason in self.reasons]
+        lines.append("Para proteger el servicio se aplicaron estas reducciones:")
+        if self.group_models:
+            lines.append("• Detalle de Modelos agrupado por marca y modelo (subtotales sin versiones).")
+        if self.row_limit is not None:
+            unit = "filas por hoja" if workbook else "filas por tabla"
+            lines.append(f"• Tablas limitadas a {_thousands(self.row_limit)} {unit} "
+                         "(las más recientes en series de tiempo).")
+        if self.col_limit is not None:
+            lines.append(f"• Tablas limitadas a {self.col_limit} columnas de datos.")
+        if self.appendix:
+            lines.append("• Tablas de detalle omitidas en la presentación.")
+        if not workbook:
+            lines.append("Los gráficos usan los datos completos. El detalle completo está "
+                         "disponible en la exportación a Excel.")
+        else:
+            lines.append("Aplique filtros para exportar el detalle completo.")
+        return lines
+
+    def as_dict(self):
+        return {
+            'degraded': self.degraded,
+            'reasons': self.reasons,
+            'group_models': self.group_models,
+            'row_limit': self.row_limit,
+            'col_limit': self.col_limit,
+            'appendix': self.appendix,
+            'before': self.before.as_dict() if self.before else None,
+            'after': self.after.as_dict() if self.after else None,
+        }
+
+
+NO_PLAN = DegradePlan()
+
+
+def plan_budget(estimate, data, steps=DECK_STEPS, budget=None):
+    """Estimates `data` and, if it is over budget, returns the first degrade
+    step that fits (or the most aggressive one). `estimate` is one of the
+    estimate_* functions above."""
+    budget = budget or Budget.from_env()
+    # Every step estimates the same models: aggregate them once per top_k
+    counts = {}
+    cost = estimate(data, DegradePlan(group_counts=counts))
+    reasons = budget.exceeded(cost)
+    plan = DegradePlan()
+    if reasons:
+        for step in steps:
+            plan = DegradePlan(**step, group_counts=counts)
+            after = estimate(data, plan)
+            if not budget.exceeded(after):
+                break
+        plan.reasons = reasons
+        plan.after = after
+    else:
+        plan.after = cost
+    plan.before = cost
+    return plan
@@ -0,0 +1,195 @@
+# es-CL value formatting for the summary and table slides.
+#
+# format_value() ran once per table cell: float() inside a bare try/except,
+# a branch per fmt and currency, a "," format and then a .replace(",", ".")
+# pass. Here one Formatter is compiled per (fmt, currency) pair and formats
+# a whole column: long numeric columns go through numpy (sign, rounding,
+# thousands groups and decimals for every value at once), short ones
+# through the same rules value by value:
+#
+#     money = formatter('currency', '$')
+#     money.column([1234567, None, 'n/d'])     # ['$ 1.234.567', '-', 'n/d']
+#     formatter('percent')(0.125)              # '12,5%'
+#     column_format('Precio Actual', title)    # ('currency', False)
+#
+# Output follows es-CL: "." groups thousands and "," marks decimals
+# ($ 1.234.567, UF 1.234,56, 12,5%). None, NaN and infinities render as
+# "-"; values that are not numbers as str(value).
+
+import math
+from functools import lru_cache
+
+import numpy as np
+
+FORMATS = ('currency', 'percent', 'integer')
+NUMPY_MIN = 64  # shorter columns are cheaper value by value
+
+PERCENT_HEADERS = ('%', 'percent', 'variación', 'variation', 'coef', 'descuento', 'volatilidad')
+INTEGER_HEADERS = ('cantidad', 'cant.', 'volumen', 'versiones', 'total', 'numero', 'count')
+CURRENCY_HEADERS = ('precio', 'price', 'monto', 'valor', 'bono', 'lista', 'costo', 'avg', 'min', 'max', 'promedio')
+PERCENT_TITLES = ('volatilidad', 'volatility', 'variación', 'variation', 'share', 'participación',
+                  'discount', 'descuento')
+DATE_HEADERS = ('fecha', 'date', 'year', 'año', 'mes')
+
+_PLAIN = [str(i) for i in range(1000)]
+_PADDED = [f"{i:03d}" for i in range(1000)]
+_MAX_EXACT = 2 ** 53  # larger magnitudes lose integer precision in float64
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+_ZERO, _DOT, _COMMA, _MINUS = (ord(c) for c in '0.,-')
+_PLAIN_NUMBERS = {int, float, np.float64, type(None)}
+
+
+def column_format(header, title, percent_titles=PERCENT_TITLES):
+    """(fmt, numeric_only) for a table column, from the header and slide
+    title keywords. With numeric_only, fmt applies to int / float cells
+    only (the title-based rules)."""
+    h, t = str(header).lower(), str(title).lower()
+    if 'año' in h or 'year' in h:
+        return None, False
+    if any(x in h for x in PERCENT_HEADERS):
+        return 'percent', False
+    if any(x in h for x in INTEGER_HEADERS):
+        return 'integer', False
+    if any(x in h for x in CURRENCY_HEADERS):
+        return 'currency', False
+    if any(x in t for x in percent_titles):
+        return (None, False) if any(x in h for x in DATE_HEADERS) else ('percent', True)
+    if 'precio' in t or 'price' in t:
+        return 'currency', True
+    return None, False
+
+
+def _group(n):
+    """Non-negative int with "." thousands separators."""
+    if n < 1000:
+        return _PLAIN[n]
+    groups = []
+    while n >= 1000:
+        n, low = divmod(n, 1000)
+        groups.append(_PADDED[low])
+    groups.append(_PLAIN[n])
+    return '.'.join(reversed(groups))
+
+
+class Formatter:
+    """Compiled formatting rules for one (fmt, currency) pair."""
+
+    def __init__(self, fmt=None, currency='$'):
+        self.fmt = fmt if fmt in FORMATS else None
+        self.scale = 100.0 if self.fmt == 'percent' else 1.0
+        # None: integral values without decimals, the rest with two
+        self.decimals = {'currency': 2 if currency == 'UF' else 0, 'percent': 1, 'integer': 0}.get(self.fmt)
+        self.prefix = f"{currency} " if self.fmt == 'currency' else ''
+        self.suffix = '%' if self.fmt == 'percent' else ''
+        # Without a fmt, only real numbers are formatted (numeric strings stay as sent)
+        self.strict = self.fmt is None
+
+    def __call__(self, value):
+        if value is None:
+            return '-'
+        number = self._number(value, self.strict)
+        return str(value) if number is None else self._one(number)
+
+    def _number(self, value, strict):
+        if isinstance(value, (int, float, np.number)):
+            return float(value)
+        if strict:
+            return None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _one(self, number):
+        return self._text(number * self.scale)
+
+    def _text(self, x):
+        if not math.isfinite(x):
+            return '-'
+        d = self.decimals if self.decimals is not None else (0 if x.is_integer() else 2)
+        q = round(abs(x) * 10 ** d)
+        whole, fraction = divmod(q, 10 ** d)
+        text = _group(whole) + (f",{fraction:0{d}d}" if d else '')
+        return f"{self.prefix}{'-' if x < 0 and q else ''}{text}{self.suffix}"
+
+    def column(self, values, numeric_only=False):
+        """Formatted text for every value; with numeric_only, values that are
+        not int / float are rendered as themselves (no float() parsing)."""
+        values = values if isinstance(values, list) else list(values)
+        if len(values) >= NUMPY_MIN and set(map(type, values)) <= _PLAIN_NUMBERS:
+            # Plain numbers / None: straight into numpy (None -> NaN -> "-")
+            return self._many(np.array(values, dtype=np.float64))
+        strict = self.strict or numeric_only
+        out = ['-' if v is None else None for v in values]
+        positions, numbers = [], []
+        for i, v in enumerate(values):
+            if v is None:
+                continue
+            number = self._number(v, strict)
+            if number is None:
+                out[i] = str(v)
+            else:
+                positions.append(i)
+                numbers.append(number)
+        if len(numbers) >= NUMPY_MIN:
+            texts = self._many(np.array(numbers, dtype=np.float64))
+        else:
+            texts = [self._one(x) for x in numbers]
+        for i, text in zip(positions, texts):
+            out[i] = text
+        return out
+
+    def _many(self, numbers):
+        x = numbers * self.scale
+        exact = np.isfinite(x) & (np.abs(x) < _MAX_EXACT)
+        if not exact.all():
+            # Rare: dashes and huge values go through the scalar rules
+            out = [self._text(v) for v in x.tolist()]
+            for i, text in zip(np.flatnonzero(exact).tolist(), self._many(numbers[exact])):
+                out[i] = text
+            return out
+        if self.decimals is not None:
+            decimals = np.full(len(x), self.decimals)
+        else:
+            decimals = np.where(x == np.floor(x), 0, 2)
+        q = np.rint(np.abs(x) * _POW10[decimals]).astype(np.int64)
+        whole = q // _POW10[decimals]
+        digits = np.searchsorted(_POW10, whole, side='right').clip(1)
+        body = digits + (digits - 1) // 3 + np.where(decimals > 0, decimals + 1, 0)
+        negative = (x < 0) & (q > 0)
+
+        # One UCS4 code point per cell of a (values x width) grid, written
+        # right to left, then viewed as fixed-width strings (trailing NULs
+        # are dropped by numpy)
+        prefix, suffix = [ord(c) for c in self.prefix], [ord(c) for c in self.suffix]
+        start = len(prefix) + negative
+        last = start + body - 1
+        width = int((last + 1).max()) + len(suffix) if len(x) else 1
+        grid = np.zeros((len(x), width), dtype=np.uint32)
+        rows = np.arange(len(x))
+        grid[:, :len(prefix)] = prefix
+        grid[negative, len(prefix)] = _MINUS
+        for k in range(int(body.max()) if len(x) else 0):
+            live = k < body
+            r, d = rows[live], decimals[live]
+            # k-th character from the right: decimals, ",", then digits with "." every 3
+            j = k - np.where(d > 0, d + 1, 0)
+            in_whole = j >= 0
+            separator = in_whole & ((j + 1) % 4 == 0)
+            place = np.where(in_whole, j - j // 4 + d, k)
+            char = _ZERO + (q[r] // _POW10[np.minimum(place, 18)]) % 10
+            char = np.where(separator, _DOT, np.where(j == -1, _COMMA, char))
+            grid[r, last[live] - k] = char
+        for i, c in enumerate(suffix):
+            grid[rows, last + 1 + i] = c
+        return grid.view(f'U{width}').ravel().tolist()
+
+
+@lru_cache(maxsize=None)
+def formatter(fmt=None, currency='$'):
+    """The shared Formatter for (fmt, currency)."""
+    return Formatter(fmt, currency)
+
+
+def format_column(values, fmt=None, currency='$', numeric_only=False):
+    return formatter(fmt, currency).column(values, numeric_only)
@@ -0,0 +1,129 @@
+# Brand -> model -> submodel aggregation of the `models` list.
+#
+# One pass over the models builds every level at once; the result is a
+# depth-first list of groups (brand subtotal, its model subtotals, and the
+# submodel leaves of the top-K models only) that the PPT "Detalle de
+# Modelos" table and the Excel "Modelos" sheet render instead of one row
+# per version.
+
+DEFAULT_TOP_K = 5
+
+LEVEL_BRAND = 0
+LEVEL_MODEL = 1
+LEVEL_SUBMODEL = 2
+
+
+class Group:
+    __slots__ = ('level', 'brand', 'model', 'submodel', 'count',
+                 'avg_list', 'avg_bono', 'avg_final', 'avg_discount')
+
+    def __init__(self, level, brand, model, submodel, acc):
+        count, lista, bono, final, discount = acc
+        self.level = level
+        self.brand = brand
+        self.model = model
+        self.submodel = submodel
+        self.count = count
+        self.avg_list = lista / count
+        self.avg_bono = bono / count
+        self.avg_final = final / count
+        self.avg_discount = discount / count
+
+
+def _num(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _add(acc, lista, bono, final, discount):
+    acc[0] += 1
+    acc[1] += lista
+    acc[2] += bono
+    acc[3] += final
+    acc[4] += discount
+
+
+def aggregate_models(models, top_k=DEFAULT_TOP_K):
+    """Groups `models` by brand, model and submodel in a single pass.
+
+    Returns a depth-first list of Group: each brand subtotal followed by its
+    model subtotals (largest first). Submodel leaves are emitted only under
+    the `top_k` largest models overall; top_k=0 keeps subtotals only.
+    """
+    # brand -> [acc, {model -> [acc, {submodel -> acc}]}]
+    tree = {}
+    for m in models:
+        lista = _num(m.get('precio_lista'))
+        bono = _num(m.get('bono'))
+        final = _num(m.get('precio_con_bono'))
+        # Same discount rule as the flat table (Bono / Lista)
+        discount = (bono / lista) if lista > 0 else 0
+
+        brand_node = tree.get(m.get('brand'))
+        if brand_node is None:
+            brand_node = tree[m.get('brand')] = [[0, 0.0, 0.0, 0.0, 0.0], {}]
+        model_node = brand_node[1].get(m.get('model'))
+        if model_node is None:
+            model_node = brand_node[1][m.get('model')] = [[0, 0.0, 0.0, 0.0, 0.0], {}]
+        leaf = model_node[1].get(m.get('submodel', '-'))
+        if leaf is None:
+            leaf = model_node[1][m.get('submodel', '-')] = [0, 0.0, 0.0, 0.0, 0.0]
+
+        for acc in (brand_node[0], model_node[0], leaf):
+            _add(acc, lista, bono, final, discount)
+
+    drill = set()
+    if top_k:
+        sizes = [(node[0][0], brand, model)
+                 for brand, (_, models_) in tree.items() for model, node in models_.items()]
+        sizes.sort(key=lambda s: s[0], reverse=True)
+        drill = {(brand, model) for _, brand, model in sizes[:top_k]}
+
+    node_size = lambda item: item[1][0][0]
+    leaf_size = lambda item: item[1][0]
+    groups = []
+    for brand, (brand_acc, models_) in sorted(tree.items(), key=node_size, reverse=True):
+        groups.append(Group(LEVEL_BRAND, brand, None, None, brand_acc))
+        for model, (model_acc, leaves) in sorted(models_.items(), key=node_size, reverse=True):
+            groups.append(Group(LEVEL_MODEL, brand, model, None, model_acc))
+            if (brand, model) in drill:
+                for submodel, leaf_acc in sorted(leaves.items(), key=leaf_size, reverse=True):
+                    groups.append(Group(LEVEL_SUBMODEL, brand, model, submodel, leaf_acc))
+    return groups
+
+
+def count_groups(models, top_k=DEFAULT_TOP_K):
+    """Rows aggregate_models would return (used by the cost estimator)."""
+    return len(aggregate_models(models, top_k))
+
+
+def hierarchy_rows(groups):
+    """Table rows for the "Detalle de Modelos" slides."""
+    rows = []
+    for g in groups:
+        rows.append({
+            "Marca": g.brand,
+            "Modelo": g.model if g.level >= LEVEL_MODEL else "Todos",
+            "Versión": g.submodel if g.level == LEVEL_SUBMODEL else "Todas",
+            "Versiones": g.count,
+            "Precio Lista": g.avg_list,
+            "Bono": g.avg_bono,
+            "Precio Final": g.avg_final,
+            "% Desc.": g.avg_discount
+        })
+    return rows
+
+
+def requested_top_k(data):
+    """Drill-down depth asked for by the payload, or None for the flat table.
+
+    Payload keys: `aggregateModels` (bool) and `aggregateTopK` (int).
+    """
+    if not data.get('aggregateModels'):
+        return None
+    try:
+        return max(int(data.get('aggregateTopK', DEFAULT_TOP_K)), 0)
+    except (TypeError, ValueError):
+        return DEFAULT_TOP_K
@@ -0,0 +1,277 @@
+# Process-local metrics shared by every report generator in api/.
+# Exposed in Prometheus text format via GET /api/<endpoint>?metrics
+
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from urllib.parse import urlparse, parse_qs
+
+try:
+    from api.report_tracing import span
+except ImportError:
+    from report_tracing import span
+
+# Stage names used by the generators (any other name is accepted too)
+STAGES = ('parse', 'pivot', 'resample', 'summary_stats', 'summary', 'charts', 'tables', 'models', 'save')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+SLIDE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+ROW_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _fmt_number(val):
+    if val == float('inf'):
+        return '+Inf'
+    if float(val).is_integer():
+        return str(int(val))
+    return repr(float(val))
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for key, val in sorted(self._values.items()):
+            lines.append(f'{self.name}{_fmt_labels(self.labels, key)} {_fmt_number(val)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # key -> [bucket_counts, sum, count]
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels):
+        """Returns (sum, count) for one label set."""
+        key = tuple(labels.get(n, '') for n in self.labels)
+        series = self._series.get(key)
+        return (series[1], series[2]) if series else (0.0, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = f'le="{_fmt_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_number(total)}')
+            lines.append(f'{self.name}_count{_fmt_labels(self.labels, key)} {count}')
+        return lines
+
+
+# --- METRIC FAMILIES ---
+
+REQUESTS = Counter('pricing_report_requests_total', 'Report requests received.', ('endpoint',))
+ERRORS = Counter('pricing_report_errors_total', 'Requests that failed or fell back to an error document.', ('endpoint',))
+FALLBACK_DECKS = Counter('pricing_report_fallback_decks_total', 'Error presentations returned instead of the requested deck.', ('endpoint',))
+ERROR_WORKBOOKS = Counter('pricing_report_error_workbooks_total', 'Error workbooks returned instead of the requested report.', ('endpoint',))
+DEGRADED = Counter('pricing_report_degraded_total', 'Reports rendered with a reduced plan because the estimate exceeded the memory budget.', ('endpoint',))
+PAYLOAD_BYTES = Histogram('pricing_report_payload_bytes', 'Size of the JSON request body.', ('endpoint',), BYTES_BUCKETS)
+OUTPUT_BYTES = Histogram('pricing_report_output_bytes', 'Size of the generated file.', ('endpoint',), BYTES_BUCKETS)
+REQUEST_SECONDS = Histogram('pricing_report_request_seconds', 'End-to-end request latency.', ('endpoint',))
+STAGE_SECONDS = Histogram('pricing_report_stage_seconds', 'Exclusive time spent per generator stage.', ('endpoint', 'stage'))
+SLIDES = Histogram('pricing_report_slides', 'Slides per generated presentation.', ('endpoint',), SLIDE_BUCKETS)
+SHEETS = Histogram('pricing_report_sheets', 'Sheets (data + chart) per generated workbook.', ('endpoint',), SLIDE_BUCKETS)
+ROWS = Histogram('pricing_report_rows', 'Data rows rendered per request.', ('endpoint',), ROW_BUCKETS)
+CACHE_LOOKUPS = Counter('pricing_analytics_cache_lookups_total', 'Analytics result cache lookups by outcome (hit, miss).', ('kind', 'result'))
+CACHE_EVICTIONS = Counter('pricing_analytics_cache_evictions_total', 'Analytics results evicted from the cache (lru, size, stale).', ('reason',))
+
+
+# --- REQUEST / STAGE SCOPES ---
+
+class _Frame:
+    __slots__ = ('stage', 'start', 'child_seconds')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = time.perf_counter()
+        self.child_seconds = 0.0
+
+
+_endpoint = contextvars.ContextVar('report_endpoint', default='local')
+_stack = contextvars.ContextVar('report_stage_stack', default=())
+
+
+def current_endpoint():
+    return _endpoint.get()
+
+
+@contextmanager
+def request_scope(endpoint, payload_bytes=None):
+    """Counts a request for `endpoint` and times it end to end.
+
+    Exceptions are counted as errors and re-raised untouched.
+    """
+    token = _endpoint.set(endpoint)
+    stack_token = _stack.set(())
+    REQUESTS.inc(endpoint=endpoint)
+    if payload_bytes is not None:
+        PAYLOAD_BYTES.observe(payload_bytes, endpoint=endpoint)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(endpoint=endpoint)
+        raise
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        _stack.reset(stack_token)
+        _endpoint.reset(token)
+
+
+@contextmanager
+def stage(name, **attrs):
+    """Times one generator stage. Nested stages are subtracted from the parent
+    so each histogram reflects the stage's own (exclusive) time.
+
+    Also opens a tracing span carrying `attrs` (chart type, row count, ...).
+    """
+    frame = _Frame(name)
+    parent_stack = _stack.get()
+    token = _stack.set(parent_stack + (frame,))
+    try:
+        with span(name, **attrs) as sp:
+            yield sp
+    finally:
+        elapsed = time.perf_counter() - frame.start
+        _stack.reset(token)
+        if parent_stack:
+            parent_stack[-1].child_seconds += elapsed
+        STAGE_SECONDS.observe(max(elapsed - frame.child_seconds, 0.0), endpoint=_endpoint.get(), stage=name)
+
+
+def record_output(num_bytes):
+    OUTPUT_BYTES.observe(num_bytes, endpoint=_endpoint.get())
+
+
+def record_counts(slides=None, sheets=None, rows=None):
+    endpoint = _endpoint.get()
+    if slides is not None:
+        SLIDES.observe(slides, endpoint=endpoint)
+    if sheets is not None:
+        SHEETS.observe(sheets, endpoint=endpoint)
+    if rows is not None:
+        ROWS.observe(rows, endpoint=endpoint)
+
+
+def record_fallback_deck():
+    endpoint = _endpoint.get()
+    FALLBACK_DECKS.inc(endpoint=endpoint)
+    ERRORS.inc(endpoint=endpoint)
+
+
+def record_error_workbook():
+    endpoint = _endpoint.get()
+    ERROR_WORKBOOKS.inc(endpoint=endpoint)
+    ERRORS.inc(endpoint=endpoint)
+
+
+def record_degraded():
+    DEGRADED.inc(endpoint=_endpoint.get())
+
+
+# --- EXPOSITION ---
+
+def _process_lines():
+    lines = []
+    try:
+        # Current RSS (Linux only)
+        with open('/proc/self/statm') as f:
+            rss_pages = int(f.read().split()[1])
+        rss = rss_pages * os.sysconf('SC_PAGE_SIZE')
+        lines += ['# HELP process_resident_memory_bytes Resident memory size in bytes.',
+                  '# TYPE process_resident_memory_bytes gauge',
+                  f'process_resident_memory_bytes {rss}']
+    except Exception:
+        pass
+    try:
+        import resource
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        lines += ['# HELP process_max_resident_memory_bytes Peak resident memory size in bytes.',
+                  '# TYPE process_max_resident_memory_bytes gauge',
+                  f'process_max_resident_memory_bytes {peak_kb * 1024}']
+    except Exception:
+        pass
+    lines += ['# HELP process_id Worker process id.',
+              '# TYPE process_id gauge',
+              f'process_id {os.getpid()}']
+    return lines
+
+
+def render_prometheus():
+    with _lock:
+        lines = []
+        for metric in _registry:
+            lines.extend(metric.render())
+    lines.extend(_process_lines())
+    return '\n'.join(lines) + '\n'
+
+
+def wants_metrics(path):
+    """True for GET /metrics, /api/<endpoint>/metrics or /api/<endpoint>?metrics"""
+    parsed = urlparse(path or '')
+    if parsed.path.rstrip('/').endswith('metrics'):
+        return True
+    return 'metrics' in parse_qs(parsed.query, keep_blank_values=True)
+
+
+def send_metrics(request_handler):
+    body = render_prometheus().encode('utf-8')
+    request_handler.send_response(200)
+    request_handler.send_header('Access-Control-Allow-Origin', '*')
+    request_handler.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+    request_handler.send_header('Content-Length', len(body))
+    request_handler.end_headers()
+    request_handler.wfile.write(body)
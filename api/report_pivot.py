@@ -0,0 +1,176 @@
+# Server-side long -> wide pivot for price histories.
+#
+# Instead of pre-pivoted wide rows ({'Fecha': ..., '<version>': price, ...}
+# with 0 for every missing scrape), a chart slide can send long records:
+#
+#     {"type": "chart", "chart_type": "line", "chart_title": "Evolución de Precios",
+#      "records": [["2024-01-03", "Toyota RAV4 LE 2.0", 25990000], ...]}
+#
+# Records may be [date, series, price] triples or dicts; `fields` renames the
+# dict keys (defaults: date / series / price). With a `series` list on the
+# slide, triples can carry the series position instead of its label, which
+# keeps long histories far smaller than the wide form; records may mix
+# positions and labels. Positions outside the `series` list, and triples
+# with fewer than three items, are dropped with a warning. Dates and series
+# are hash-indexed once, then the grid is filled in one vectorised
+# assignment. Prices may be numbers or numeric strings ("26.290.000");
+# missing points stay empty (None), so charts draw gaps without the 0 trick.
+
+import numpy as np
+
+try:
+    from api.data_ingest import parse_financial_number
+    from api.report_tracing import log_warning
+except ImportError:
+    from data_ingest import parse_financial_number
+    from report_tracing import log_warning
+
+DEFAULT_FIELDS = {'date': 'date', 'series': 'series', 'value': 'price'}
+DATE_HEADER = 'Fecha'
+
+
+def _index(keys):
+    """Hash index: codes per key (first-appearance order) and the unique keys."""
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(k, len(lookup)) for k in keys), dtype=np.int64, count=len(keys))
+    return codes, list(lookup)
+
+
+def _columns(records, fields):
+    if records and isinstance(records[0], (list, tuple)):
+        short = [i for i, r in enumerate(records) if not isinstance(r, (list, tuple)) or len(r) < 3]
+        if short:
+            log_warning("Dropping long records that are not [date, series, price] triples",
+                        dropped=len(short), first=short[0])
+            skip = set(short)
+            records = [r for i, r in enumerate(records) if i not in skip]
+            if not records:
+                return [], [], []
+        dates, series, values = zip(*((r[0], r[1], r[2]) for r in records))
+    else:
+        f = {**DEFAULT_FIELDS, **(fields or {})}
+        dates = [r.get(f['date']) for r in records]
+        series = [r.get(f['series']) for r in records]
+        values = [r.get(f['value']) for r in records]
+    return dates, series, values
+
+
+def _is_position(kind):
+    return issubclass(kind, (int, np.integer)) and not issubclass(kind, (bool, np.bool_))
+
+
+def _series_codes(series, series_order):
+    """(code per record, column labels). Ints (not bools) are positions in
+    `series_order`, -1 when out of range; anything else is a label, placed
+    after the requested columns when it is not one of them.
+
+    All-position columns are resolved in numpy; otherwise the column is
+    factorized once (keyed on type and value when types are mixed, so 1,
+    True and '1' stay apart) and only its distinct values are resolved."""
+    keys, position, column = [], {}, []
+    for label in map(str, series_order):
+        if label not in position:
+            position[label] = len(keys)
+            keys.append(label)
+        column.append(position[label])  # repeated labels share a column
+    kinds = set(map(type, series))
+    if all(_is_position(k) for k in kinds):
+        codes = np.fromiter(series, dtype=np.int64, count=len(series))
+        valid = (codes >= 0) & (codes < len(column))
+        return np.where(valid, np.array(column, dtype=np.int64)[np.where(valid, codes, 0)], -1), keys
+    if kinds == {str}:
+        codes, distinct = _index(series)
+        distinct = [(str, s) for s in distinct]
+    else:
+        codes, distinct = _index(list(zip(map(type, series), series)))
+    resolved = np.empty(len(distinct), dtype=np.int64)
+    for i, (kind, s) in enumerate(distinct):
+        if _is_position(kind):
+            resolved[i] = column[s] if 0 <= s < len(column) else -1
+        else:
+            label = str(s)
+            if label not in position:
+                position[label] = len(keys)
+                keys.append(label)
+            resolved[i] = position[label]
+    return resolved[codes], keys
+
+
+def _price(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        parsed = parse_financial_number(value) if isinstance(value, str) else None
+    except (TypeError, ValueError):
+        parsed = None
+    return np.nan if parsed is None else parsed
+
+
+def pivot_long(records, fields=None, series_order=None, date_header=DATE_HEADER):
+    """Pivots long (date, series, price) records into wide rows sorted by date.
+
+    Duplicate (date, series) pairs keep the last record. Prices that are
+    missing, unparseable or <= 0 are treated as gaps and come out as None.
+    """
+    if not records:
+        return []
+    dates, series, values = _columns(records, fields)
+    if not dates:
+        return []
+
+    if series_order:
+        series_codes, series_keys = _series_codes(series, series_order)
+        valid = series_codes >= 0
+        if not valid.all():
+            log_warning("Dropping long records with an out-of-range series position",
+                        dropped=int((~valid).sum()), series=len(series_order))
+            keep = np.flatnonzero(valid).tolist()
+            dates = [dates[i] for i in keep]
+            values = [values[i] for i in keep]
+            series_codes = series_codes[valid]
+            if not keep:
+                return []
+    else:
+        series_codes, series_keys = _index([str(s) for s in series])
+    date_codes, date_keys = _index([str(d)[:10] for d in dates])
+
+    # Dates ascending (ISO strings sort chronologically); remap codes in one go
+    order = np.argsort(np.array(date_keys, dtype=object), kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    date_codes = rank[date_codes]
+    date_keys = [date_keys[i] for i in order]
+
+    prices = np.array([_price(v) for v in values], dtype=np.float64)
+    prices[~(prices > 0)] = np.nan
+
+    # Last record wins for duplicate cells: keep each cell's final occurrence
+    flat = date_codes * len(series_keys) + series_codes
+    _, last_rev = np.unique(flat[::-1], return_index=True)
+    keep = len(flat) - 1 - last_rev
+
+    grid = np.full((len(date_keys), len(series_keys)), np.nan)
+    grid.flat[flat[keep]] = prices[keep]
+
+    cells = grid.astype(object)
+    cells[np.isnan(grid)] = None
+    headers = [date_header] + series_keys
+    return [dict(zip(headers, [d] + row)) for d, row in zip(date_keys, cells.tolist())]
+
+
+def pivot_long_slides(data):
+    """Returns `data` with every long-format slide (`records`) pivoted to wide
+    `data` rows. Slides already in wide format are left untouched."""
+    slides = data.get('slides') or []
+    if not any('records' in s for s in slides):
+        return data
+    pivoted = []
+    for slide in slides:
+        if 'records' in slide:
+            slide = dict(slide)
+            records = slide.pop('records') or []
+            slide['data'] = pivot_long(records, slide.pop('fields', None), slide.get('series'))
+            # Empty cells are real gaps, whatever the chart title says
+            slide['gaps'] = True
+        pivoted.append(slide)
+    return {**data, 'slides': pivoted}
@@ -0,0 +1,127 @@
+# Dry-run planning for the report generators.
+#
+# POST the usual payload with `?plan=1` (or `X-Report-Plan: 1`) and the
+# handler answers with the slide / sheet layout it would render, the
+# degrade plan the budget would apply, and estimated render time and file
+# size. Nothing is rendered and python-pptx / openpyxl are never touched,
+# so a router can call `plan_report` directly to send big jobs elsewhere.
+
+import os
+import json
+from urllib.parse import urlparse, parse_qs
+
+try:
+    from api.report_budget import (
+        plan_budget, DECK_STEPS, WORKBOOK_STEPS,
+        dashboard_deck_sections, slides_deck_sections, workbook_sections,
+        estimate_dashboard_deck, estimate_slides_deck, estimate_workbook
+    )
+    from api.report_pivot import pivot_long_slides
+    from api.report_resample import resample_report
+    from api.report_stats import fill_summary
+except ImportError:
+    from report_budget import (
+        plan_budget, DECK_STEPS, WORKBOOK_STEPS,
+        dashboard_deck_sections, slides_deck_sections, workbook_sections,
+        estimate_dashboard_deck, estimate_slides_deck, estimate_workbook
+    )
+    from report_pivot import pivot_long_slides
+    from report_resample import resample_report
+    from report_stats import fill_summary
+
+PLAN_HEADER = 'X-Report-Plan'
+
+# Fitted on scripts/synthetic_payloads.py sweeps (python-pptx 0.6.23,
+# openpyxl 3.1.2, one CPU): base + per slide/sheet + per cell + per point
+DECK_RENDER_MS = (150.0, 8.0, 0.17, 0.05)
+DECK_OUTPUT_BYTES = (640_000, 3_000, 2, 16)
+WORKBOOK_RENDER_MS = (5.0, 40.0, 0.09, 0.0)
+WORKBOOK_OUTPUT_BYTES = (5_000, 1_500, 6, 6)
+
+# Above this estimate the router should hand the job to an async worker
+DEFAULT_ASYNC_MS = 10_000
+
+# endpoint -> (format, sections, estimate, degrade steps)
+LAYOUTS = {
+    'generate-ppt': ('pptx', dashboard_deck_sections, estimate_dashboard_deck, DECK_STEPS),
+    'generate-ppt-compare': ('pptx', slides_deck_sections, estimate_slides_deck, DECK_STEPS),
+    'generate-ppt-evolution': ('pptx', slides_deck_sections, estimate_slides_deck, DECK_STEPS),
+    'generate-excel': ('xlsx', workbook_sections, estimate_workbook, WORKBOOK_STEPS),
+}
+
+
+def _linear(coef, units, cells, points):
+    base, per_unit, per_cell, per_point = coef
+    return base + per_unit * units + per_cell * cells + per_point * points
+
+
+def plan_report(endpoint, data, budget=None):
+    """The layout `endpoint` would render for `data`, as a JSON-ready dict."""
+    fmt, sections_for, estimate, steps = LAYOUTS[endpoint]
+    if endpoint == 'generate-ppt-evolution':
+        data = pivot_long_slides(data)
+    data = fill_summary(resample_report(data))
+    degrade = plan_budget(estimate, data, steps, budget)
+    cost = degrade.after
+    sections = list(sections_for(data, degrade))
+
+    if fmt == 'pptx':
+        units = cost.slides
+        render_ms = _linear(DECK_RENDER_MS, units, cost.cells, cost.points)
+        output_bytes = _linear(DECK_OUTPUT_BYTES, units, cost.cells, cost.points)
+        # Number slides so the frontend can say "slides 12-40: Detalle de Modelos"
+        layout, index = [], 1
+        for section in sections:
+            entry = section.as_dict()
+            entry['first_slide'] = index
+            index += section.cost.slides
+            layout.append(entry)
+    else:
+        units = cost.sheets
+        render_ms = _linear(WORKBOOK_RENDER_MS, units, cost.cells, cost.points)
+        output_bytes = _linear(WORKBOOK_OUTPUT_BYTES, units, cost.cells, cost.points)
+        layout = [section.as_dict() for section in sections]
+
+    async_ms = int(os.environ.get('REPORT_ASYNC_MS', DEFAULT_ASYNC_MS))
+    return {
+        'endpoint': endpoint,
+        'format': fmt,
+        'slides' if fmt == 'pptx' else 'sheets': units,
+        'rows': sum(s.rows for s in sections if s.kind in ('table', 'models', 'data')),
+        'cells': cost.cells,
+        'chart_points': cost.points,
+        'estimated_memory_bytes': cost.memory_bytes,
+        'estimated_render_ms': round(render_ms),
+        'estimated_output_bytes': round(output_bytes),
+        'async_recommended': bool(async_ms) and render_ms > async_ms,
+        'degrade': degrade.as_dict(),
+        'layout': layout,
+    }
+
+
+def wants_plan(headers, path):
+    query = parse_qs(urlparse(path or '').query)
+    flag = (headers.get(PLAN_HEADER) if headers else None) or (query.get('plan') or [None])[0]
+    return str(flag or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _send_json(request_handler, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    request_handler.send_response(status)
+    request_handler.send_header('Access-Control-Allow-Origin', '*')
+    request_handler.send_header('Content-Type', 'application/json; charset=utf-8')
+    request_handler.send_header('Content-Length', str(len(body)))
+    request_handler.end_headers()
+    request_handler.wfile.write(body)
+
+
+def send_plan(request_handler, endpoint, body):
+    """Answers a plan request for the raw POST `body`; a body that is not a
+    JSON object gets a 400 JSON error."""
+    try:
+        data = json.loads(body.decode('utf-8') if isinstance(body, bytes) else body)
+    except (UnicodeDecodeError, ValueError) as e:
+        return _send_json(request_handler, 400, {"error": f"JSON inválido: {e}"})
+    if not isinstance(data, dict):
+        return _send_json(request_handler, 400, {"error": "El cuerpo debe ser un objeto JSON"})
+    _send_json(request_handler, 200, plan_report(endpoint, data))
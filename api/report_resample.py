@@ -0,0 +1,184 @@
+# Time-bucket resampling for price histories.
+#
+# Scrapes land on irregular dates, so evolution and volatility charts plot
+# one category per raw date. A chart (slide or dashboard sheet) whose first
+# column is a date can ask for buckets instead:
+#
+#     "resample": {"granularity": "week", "how": "last", "ffill": true}
+#
+# either on the slide / sheet or once at the top of the payload (applies to
+# every date-axis chart; a chart can opt out with "resample": false).
+# All series are bucketed together with numpy.
+#
+# Results are cached per (series set, granularity, aggregation) when the
+# chart names its series set with "seriesId" (e.g. "evolucion:toyota"):
+# the key is that id plus the options and the row count and first / last
+# date, so no values are hashed. Callers must send a new id when the data
+# behind it changes. Hits are unpickled copies, safe to mutate.
+
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+GRANULARITIES = ('day', 'week', 'month')
+AGGREGATIONS = ('last', 'mean', 'min', 'max')
+TIME_HEADERS = ('fecha', 'date')
+CACHE_SIZE = 32
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def bucket_days(days, granularity):
+    """Bucket start (datetime64[D]) for each date."""
+    if granularity == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    if granularity == 'week':
+        # ISO weeks start on Monday; 1970-01-01 was a Thursday
+        offset = (days.astype(np.int64) + 3) % 7
+        return days - offset.astype('timedelta64[D]')
+    return days
+
+
+def bucket_label(bucket, granularity):
+    """Category label of a bucket start (YYYY-MM for months, else the day)."""
+    text = str(bucket)
+    return text[:7] if granularity == 'month' else text
+
+
+def _forward_fill(grid):
+    valid = ~np.isnan(grid)
+    idx = np.where(valid, np.arange(grid.shape[0])[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return grid[idx, np.arange(grid.shape[1])]
+
+
+def resample_grid(days, grid, granularity='week', how='last', ffill=False):
+    """Buckets a (dates x series) grid; NaN marks a missing point.
+
+    `days` is datetime64[D] in any order. Returns (bucket_starts, grid).
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation: {how}")
+
+    order = np.argsort(days, kind='stable')
+    days, grid = days[order], grid[order]
+    buckets = bucket_days(days, granularity)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    valid = ~np.isnan(grid)
+
+    # Buckets are contiguous after sorting, so each aggregate is one reduceat
+    if how == 'last':
+        idx = np.where(valid, np.arange(len(grid))[:, None], -1)
+        last = np.maximum.reduceat(idx, starts, axis=0)
+        out = grid[np.maximum(last, 0), np.arange(grid.shape[1])]
+        out[last < 0] = np.nan
+    elif how == 'mean':
+        sums = np.add.reduceat(np.where(valid, grid, 0.0), starts, axis=0)
+        counts = np.add.reduceat(valid, starts, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = sums / counts
+    elif how == 'min':
+        out = np.fmin.reduceat(grid, starts, axis=0)
+    else:
+        out = np.fmax.reduceat(grid, starts, axis=0)
+
+    if ffill:
+        out = _forward_fill(out)
+    return buckets[starts], out
+
+
+def _is_time_axis(rows):
+    return bool(rows) and any(t in str(next(iter(rows[0]), '')).lower() for t in TIME_HEADERS)
+
+
+def _value(v, zero_is_gap):
+    if v is None or isinstance(v, bool) or not isinstance(v, (int, float)):
+        return np.nan
+    if zero_is_gap and v == 0:
+        return np.nan
+    return v
+
+
+def resample_rows(rows, granularity='week', how='last', ffill=False, zero_is_gap=False, series_id=None):
+    """Wide chart rows ({'Fecha': ..., series: value}) resampled to buckets.
+
+    Empty buckets come out as None. Rows whose dates do not parse are
+    returned unchanged. With `series_id` the result is cached (see module
+    docs).
+    """
+    if not _is_time_axis(rows):
+        return rows
+    headers = list(rows[0].keys())
+    date_header, series = headers[0], headers[1:]
+    key = None
+    if series_id is not None:
+        key = (str(series_id), tuple(headers), granularity, how, bool(ffill), bool(zero_is_gap),
+               len(rows), str(rows[0].get(date_header)), str(rows[-1].get(date_header)))
+        with _cache_lock:
+            cached = _cache.get(key)
+            if cached is not None:
+                _cache.move_to_end(key)
+        if cached is not None:
+            return pickle.loads(cached)
+    try:
+        days = np.array([str(r.get(date_header))[:10] for r in rows], dtype='datetime64[D]')
+    except ValueError:
+        return rows
+    grid = np.array([[_value(r.get(s), zero_is_gap) for s in series] for r in rows],
+                    dtype=np.float64).reshape(len(rows), len(series))
+    starts, out = resample_grid(days, grid, granularity, how, ffill)
+    cells = out.astype(object)
+    cells[np.isnan(out)] = None
+    result = [dict(zip(headers, [bucket_label(b, granularity)] + row)) for b, row in zip(starts, cells.tolist())]
+    if key is not None:
+        with _cache_lock:
+            _cache[key] = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+            if len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return result
+
+
+def _options(chart, default):
+    opts = chart.get('resample', default)
+    if not opts:
+        return None
+    if isinstance(opts, str):
+        opts = {'granularity': opts}
+    granularity = opts.get('granularity', 'week')
+    how = opts.get('how', 'last')
+    if granularity not in GRANULARITIES or how not in AGGREGATIONS:
+        return None
+    return {'granularity': granularity, 'how': how, 'ffill': bool(opts.get('ffill', False))}
+
+
+def resample_report(data):
+    """Returns `data` with every date-axis chart in `slides` / `sheets`
+    resampled as requested. Charts without a `resample` setting are untouched."""
+    default = data.get('resample')
+    changed = {}
+    for key in ('slides', 'sheets'):
+        charts = data.get(key)
+        if not charts:
+            continue
+        out, touched = [], False
+        for chart in charts:
+            opts = _options(chart, default)
+            rows = chart.get('data') or []
+            if opts and chart.get('type', 'chart') == 'chart' and _is_time_axis(rows):
+                name = str(chart.get('name') or chart.get('chart_title') or '').lower()
+                # Evolution charts use 0 for "no scrape" (see add_chart_slide)
+                zero_is_gap = chart.get('gaps', False) or 'evoluci' in name or 'evolution' in name
+                chart = {**chart, 'data': resample_rows(rows, zero_is_gap=zero_is_gap,
+                                                        series_id=chart.get('seriesId'), **opts)}
+                if zero_is_gap:
+                    chart['gaps'] = True
+                touched = True
+            out.append(chart)
+        if touched:
+            changed[key] = out
+    return {**data, **changed} if changed else data
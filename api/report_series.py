@@ -0,0 +1,139 @@
+# Series selection for crowded line / bar charts.
+#
+# Evolution and benchmarking payloads can carry 50+ versions; plotting all of
+# them makes a huge chart XML with a 4-colour palette that repeats until the
+# lines are indistinguishable. Above MAX_SERIES, add_chart_slide keeps the K
+# most relevant series and folds the rest into min / median / max envelope
+# series. The table slides after the chart keep every series.
+#
+# A chart can tune or disable the selection:
+#
+#     "topSeries": {"k": 6, "rank": "latest", "pinned": ["Toyota RAV4 LE 2.0"]}
+#     "topSeries": 10        # k only
+#     "topSeries": false     # plot everything
+#
+# rank: "variance" (default; the series that move the most) or "latest"
+# (highest last observed price). Pinned series are always kept.
+
+import warnings
+
+import numpy as np
+
+MAX_SERIES = 12
+DEFAULT_K = 8
+RANKS = ('variance', 'latest')
+ENVELOPE_LABELS = ('Mínimo', 'Mediana', 'Máximo')
+
+
+def _options(chart_info):
+    opts = chart_info.get('topSeries', True)
+    # Stacked bars need every component; bubbles are one series per point
+    if opts is False or opts is None or chart_info.get('chart_type') in ('stacked', 'scatter'):
+        return None
+    if opts is True:
+        opts = {}
+    elif isinstance(opts, (int, float)):
+        opts = {'k': opts}
+    try:
+        k = max(int(opts.get('k', DEFAULT_K)), 1)
+    except (TypeError, ValueError):
+        k = DEFAULT_K
+    rank = opts.get('rank', 'variance')
+    return {
+        'k': k,
+        'rank': rank if rank in RANKS else 'variance',
+        'pinned': [str(p) for p in opts.get('pinned') or []],
+        # An explicit setting applies even to charts under MAX_SERIES
+        'threshold': k if 'topSeries' in chart_info else MAX_SERIES,
+    }
+
+
+def _grid(rows, series, zero_is_gap):
+    def value(v):
+        if v is None or isinstance(v, bool) or not isinstance(v, (int, float)):
+            return np.nan
+        return np.nan if zero_is_gap and v == 0 else v
+    return np.array([[value(r.get(s)) for s in series] for r in rows],
+                    dtype=np.float64).reshape(len(rows), len(series))
+
+
+def _scores(grid, rank):
+    """Relevance per series (higher first); all-gap series score -inf."""
+    valid = ~np.isnan(grid)
+    has_data = valid.any(axis=0)
+    if rank == 'latest':
+        last = np.where(valid, np.arange(grid.shape[0])[:, None], -1).max(axis=0)
+        scores = grid[np.maximum(last, 0), np.arange(grid.shape[1])]
+    else:
+        counts = valid.sum(axis=0)
+        means = np.where(valid, grid, 0.0).sum(axis=0) / np.maximum(counts, 1)
+        scores = (np.where(valid, grid - means, 0.0) ** 2).sum(axis=0) / np.maximum(counts, 1)
+    return np.where(has_data, scores, -np.inf)
+
+
+def select_series(rows, k=DEFAULT_K, rank='variance', pinned=(), zero_is_gap=False):
+    """Chart rows with the `k` most relevant series plus an envelope of the rest.
+
+    The first column (categories) is kept as is. Pinned series count towards
+    `k`. Folded series become "Mínimo", "Mediana" and "Máximo" columns (None
+    where none of them has a value). Returns `rows` unchanged when there is
+    nothing to fold.
+    """
+    if not rows:
+        return rows
+    headers = list(rows[0].keys())
+    category, series = headers[0], headers[1:]
+    if len(series) <= k:
+        return rows
+
+    grid = _grid(rows, series, zero_is_gap)
+    scores = _scores(grid, rank)
+    pinned_set = set(pinned)
+    is_pinned = np.array([str(s) in pinned_set for s in series])
+    # Pinned first, then by score; stable so ties keep payload order
+    order = np.lexsort((-scores, ~is_pinned))
+    keep = np.sort(order[:max(k, int(is_pinned.sum()))])
+    folded = np.ones(len(series), dtype=bool)
+    folded[keep] = False
+
+    rest = grid[:, folded]
+    with warnings.catch_warnings():
+        # Rows where every folded series is a gap warn "All-NaN slice"
+        warnings.simplefilter('ignore', RuntimeWarning)
+        envelope = np.column_stack([np.nanmin(rest, axis=1), np.nanmedian(rest, axis=1), np.nanmax(rest, axis=1)])
+    n_rest = int(folded.sum())
+    envelope_headers = [f"{label} ({n_rest} otras)" for label in ENVELOPE_LABELS]
+
+    cells = envelope.astype(object)
+    cells[np.isnan(envelope)] = None
+    kept = [series[i] for i in keep]
+    out = []
+    for r, env in zip(rows, cells.tolist()):
+        row = {category: r.get(category)}
+        for s in kept:
+            row[s] = r.get(s)
+        row.update(zip(envelope_headers, env))
+        out.append(row)
+    return out
+
+
+def is_envelope_series(name):
+    """True for the envelope columns added by select_series."""
+    name = str(name)
+    return name.endswith(' otras)') and name.startswith(ENVELOPE_LABELS)
+
+
+def chart_rows(chart_info, rows, zero_is_gap=False):
+    """Rows add_chart_slide should plot for `chart_info` (see module docs)."""
+    opts = _options(chart_info)
+    if opts is None or not rows or len(rows[0]) - 1 <= opts['threshold']:
+        return rows
+    return select_series(rows, opts['k'], opts['rank'], opts['pinned'], zero_is_gap)
+
+
+def plotted_series(chart_info, n_series):
+    """Series count add_chart_slide will plot (used by the cost estimator)."""
+    opts = _options(chart_info)
+    if opts is None or n_series <= opts['threshold']:
+        return n_series
+    return min(n_series, max(opts['k'], len(opts['pinned'])) + 3)
@@ -0,0 +1,217 @@
+# Summary statistics for the "Resumen Ejecutivo" slide / sheet.
+#
+# The frontend sends a `summary` computed by get-analytics; exports built
+# from a `models` list alone (or from an older analytics response) used to
+# show zeros or numbers that no longer match the table. summary_stats
+# computes the same block from `models` with numpy, following the
+# get-analytics definitions so both sides agree:
+#
+#   - price: precio_con_bono, else precio_lista; prices <= 0 are ignored
+#   - std dev is the sample one (n - 1); variation coefficient = std / avg
+#   - quartiles are sorted[floor(n * q)], as in get-analytics
+#   - avg discount: mean of bono / precio_lista over versions with a bono
+#
+# Ratios are fractions (0.12 = 12%), the way the export payload sends them.
+#
+# SummarySketch builds the same block incrementally in fixed memory (chunks,
+# segments, brands, worker processes), with approximate median / quartiles
+# from a KLL sketch; see report_sketch for the error bound.
+
+import numpy as np
+
+try:
+    from api.report_sketch import KLLSketch, DEFAULT_K
+except ImportError:
+    from report_sketch import KLLSketch, DEFAULT_K
+
+STAT_KEYS = (
+    'total_models', 'total_brands', 'avg_price', 'median_price', 'min_price', 'max_price',
+    'price_std_dev', 'variation_coefficient', 'avg_discount_pct',
+    'lower_quartile', 'upper_quartile', 'price_range',
+)
+
+
+def _column(models, key):
+    def num(v):
+        if v is None or isinstance(v, bool):
+            return np.nan
+        try:
+            return float(v)
+        except (TypeError, ValueError):
+            return np.nan
+    return np.fromiter((num(m.get(key)) for m in models), dtype=np.float64, count=len(models))
+
+
+def price_arrays(final, lista, bono):
+    """(prices > 0, bono / precio_lista of versions with a bono) from columns."""
+    prices = np.where(final > 0, final, lista)
+    with_bono = (lista > 0) & (bono > 0)
+    return prices[prices > 0], bono[with_bono] / lista[with_bono]
+
+
+def _prices(models):
+    return price_arrays(_column(models, 'precio_con_bono'), _column(models, 'precio_lista'), _column(models, 'bono'))
+
+
+def array_stats(prices, discounts, total_models, total_brands):
+    """The summary block from price / discount arrays and distinct counts."""
+    prices = np.sort(prices)
+    n = len(prices)
+    stats = {
+        'total_models': total_models,
+        'total_brands': total_brands,
+        'avg_discount_pct': float(discounts.mean()) if len(discounts) else 0.0,
+    }
+    if n == 0:
+        stats.update({k: 0.0 for k in STAT_KEYS if k not in stats})
+        return stats
+
+    avg = float(prices.mean())
+    std = float(prices.std(ddof=1)) if n > 1 else 0.0
+    stats.update({
+        'avg_price': avg,
+        'median_price': float(np.median(prices)),
+        'min_price': float(prices[0]),
+        'max_price': float(prices[-1]),
+        'price_std_dev': std,
+        'variation_coefficient': std / avg if avg > 0 else 0.0,
+        'lower_quartile': float(prices[int(n * 0.25)]),
+        'upper_quartile': float(prices[int(n * 0.75)]),
+        'price_range': float(prices[-1] - prices[0]),
+    })
+    return stats
+
+
+def summary_stats(models):
+    """The summary block for `models` (see module docs for definitions)."""
+    prices, discounts = _prices(models)
+    return array_stats(
+        prices, discounts,
+        len({(m.get('brand'), m.get('model'), m.get('submodel') or '') for m in models}),
+        len({m.get('brand') for m in models if m.get('brand')}),
+    )
+
+
+class SummarySketch:
+    """Mergeable, serialisable accumulator for the summary block.
+
+    Count / mean / variance are merged exactly (Chan et al.), min / max are
+    exact, median and quartiles come from a KLL sketch. Distinct brands and
+    versions are kept as sets, which grow with the catalogue, not the rows.
+    """
+    __slots__ = ('n', 'mean', 'm2', 'discount_sum', 'discount_n', 'brands', 'versions', 'sketch')
+
+    def __init__(self, k=DEFAULT_K):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.discount_sum = 0.0
+        self.discount_n = 0
+        self.brands = set()
+        self.versions = set()
+        self.sketch = KLLSketch(k)
+
+    def _combine(self, n, mean, m2):
+        total = self.n + n
+        if not n:
+            return
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.mean += delta * n / total
+        self.n = total
+
+    def add_models(self, models):
+        """Adds a chunk of `models` rows; returns self."""
+        prices, discounts = _prices(models)
+        if len(prices):
+            mean = float(prices.mean())
+            self._combine(len(prices), mean, float(((prices - mean) ** 2).sum()))
+            self.sketch.update(prices)
+        self.discount_sum += float(discounts.sum())
+        self.discount_n += len(discounts)
+        self.brands.update(m.get('brand') for m in models if m.get('brand'))
+        self.versions.update((m.get('brand'), m.get('model'), m.get('submodel') or '') for m in models)
+        return self
+
+    def merge(self, other):
+        self._combine(other.n, other.mean, other.m2)
+        self.discount_sum += other.discount_sum
+        self.discount_n += other.discount_n
+        self.brands |= other.brands
+        self.versions |= other.versions
+        self.sketch.merge(other.sketch)
+        return self
+
+    def as_summary(self):
+        """Same keys as summary_stats (median / quartiles approximate)."""
+        stats = {
+            'total_models': len(self.versions),
+            'total_brands': len(self.brands),
+            'avg_discount_pct': self.discount_sum / self.discount_n if self.discount_n else 0.0,
+        }
+        if not self.n:
+            stats.update({k: 0.0 for k in STAT_KEYS if k not in stats})
+            return stats
+        std = (self.m2 / (self.n - 1)) ** 0.5 if self.n > 1 else 0.0
+        lower, median, upper = self.sketch.quantiles([0.25, 0.5, 0.75]).tolist()
+        stats.update({
+            'avg_price': self.mean,
+            'median_price': median,
+            'min_price': self.sketch.min,
+            'max_price': self.sketch.max,
+            'price_std_dev': std,
+            'variation_coefficient': std / self.mean if self.mean > 0 else 0.0,
+            'lower_quartile': lower,
+            'upper_quartile': upper,
+            'price_range': self.sketch.max - self.sketch.min,
+        })
+        return stats
+
+    def to_dict(self):
+        return {
+            'n': self.n, 'mean': self.mean, 'm2': self.m2,
+            'discount_sum': self.discount_sum, 'discount_n': self.discount_n,
+            'brands': sorted(self.brands, key=str), 'versions': sorted(self.versions, key=str),
+            'sketch': self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        acc = cls()
+        acc.n, acc.mean, acc.m2 = int(d['n']), float(d['mean']), float(d['m2'])
+        acc.discount_sum, acc.discount_n = float(d['discount_sum']), int(d['discount_n'])
+        acc.brands = set(d.get('brands') or [])
+        acc.versions = {tuple(v) for v in d.get('versions') or []}
+        acc.sketch = KLLSketch.from_dict(d['sketch'])
+        return acc
+
+
+def summaries_by(models, key, k=DEFAULT_K):
+    """One SummarySketch per value of `key` (e.g. 'tipo_vehiculo', 'brand')."""
+    groups = {}
+    for m in models:
+        groups.setdefault(m.get(key), []).append(m)
+    return {value: SummarySketch(k).add_models(rows) for value, rows in groups.items()}
+
+
+def fill_summary(data):
+    """Returns `data` with its summary completed or replaced from `models`.
+
+    A missing summary is computed and a client summary only gets its missing
+    keys filled: its numbers come from get-analytics-v2, over a different
+    population than the `models` list, so they are kept. With
+    `recomputeSummary` set the numbers are replaced. Other keys (filters)
+    are kept either way.
+    """
+    summary = data.get('summary')
+    models = data.get('models')
+    if not models:
+        return data
+    if summary and not data.get('recomputeSummary') and all(k in summary for k in STAT_KEYS):
+        return data
+    stats = summary_stats(models)
+    if not summary:
+        return {**data, 'summary': stats}
+    if data.get('recomputeSummary'):
+        return {**data, 'summary': {**summary, **stats}}
+    return {**data, 'summary': {**stats, **summary}}
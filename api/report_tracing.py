@@ -0,0 +1,277 @@
+# Structured timing spans (JSON lines) and opt-in per-request profiling
+# for the report generators.
+#
+# Tracing is off by default and costs a contextvar lookup per span.
+# Turn it on for every request with REPORT_TRACE=1, or for a single request
+# with the `X-Report-Trace: 1` header / `?trace=1` query flag.
+# Profiling is per request only: `X-Report-Profile: cprofile|sample`
+# (or `?profile=cprofile|sample`), honoured only when the deployment opts in
+# with REPORT_PROFILE_ENABLED=1 (profiles cost CPU and disk). Profiles land
+# in REPORT_PROFILE_DIR; responses name the file, never the server path.
+
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import Counter as _TallyCounter
+from urllib.parse import urlparse, parse_qs
+
+TRACE_HEADER = 'X-Report-Trace'
+PROFILE_HEADER = 'X-Report-Profile'
+TRACE_ID_HEADER = 'X-Report-Trace-Id'
+PROFILE_MODES = ('cprofile', 'sample')
+DEFAULT_PROFILE_DIR = '/tmp/report-profiles'
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+_write_lock = threading.Lock()
+
+
+def _emit(record):
+    """Writes one JSON line to REPORT_TRACE_FILE (or stdout)."""
+    line = json.dumps(record, default=str, ensure_ascii=False)
+    path = os.environ.get('REPORT_TRACE_FILE')
+    with _write_lock:
+        if path:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        else:
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+
+# --- SPANS ---
+
+class _NoopSpan:
+    span_id = None
+
+    def set(self, **attrs):
+        return self
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'attrs', 'start_wall', 'start')
+
+    def __init__(self, trace, name, parent_id, attrs):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start_wall = time.time()
+        self.start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def finish(self, error=None):
+        record = {
+            'type': 'span',
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'endpoint': self.trace.endpoint,
+            'name': self.name,
+            'ts': round(self.start_wall, 6),
+            'duration_ms': round((time.perf_counter() - self.start) * 1000, 3),
+            'attrs': self.attrs,
+        }
+        if error is not None:
+            record['error'] = f"{type(error).__name__}: {error}"
+        self.trace.sink(record)
+
+
+class TraceContext:
+    def __init__(self, endpoint, trace_id=None, enabled=False, profile=None, sink=None):
+        self.endpoint = endpoint
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.enabled = enabled
+        self.profile = profile
+        self.profile_path = None
+        self.sink = sink or _emit
+
+    def response_headers(self):
+        headers = {TRACE_ID_HEADER: self.trace_id}
+        if self.profile_path:
+            headers['X-Report-Profile-Path'] = os.path.basename(self.profile_path)
+        return headers
+
+
+_trace = contextvars.ContextVar('report_trace', default=None)
+_span = contextvars.ContextVar('report_span', default=None)
+
+
+def current_trace():
+    return _trace.get()
+
+
+def current_span():
+    return _span.get() or NOOP_SPAN
+
+
+@contextmanager
+def span(name, **attrs):
+    """Times a block as a child of the current span. No-op unless tracing is on."""
+    trace = _trace.get()
+    if trace is None or not trace.enabled:
+        yield NOOP_SPAN
+        return
+    parent = _span.get()
+    sp = Span(trace, name, parent.span_id if parent else None, attrs)
+    token = _span.set(sp)
+    error = None
+    try:
+        yield sp
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _span.reset(token)
+        sp.finish(error)
+
+
+def log_warning(message, **attrs):
+    """Structured replacement for ad-hoc `print` diagnostics."""
+    trace = _trace.get()
+    sp = _span.get()
+    record = {'type': 'warning', 'msg': message, 'ts': round(time.time(), 6)}
+    if trace is not None:
+        record['trace_id'] = trace.trace_id
+        record['endpoint'] = trace.endpoint
+    if sp is not None:
+        record['span'] = sp.name
+    record.update({k: (str(v) if isinstance(v, BaseException) else v) for k, v in attrs.items()})
+    _emit(record)
+
+
+# --- PROFILING ---
+
+class SamplingProfiler:
+    """Samples the target thread's stack every `interval` seconds.
+
+    Output is in "folded" format (one `frame;frame;frame count` line per
+    unique stack), which flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = _TallyCounter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='report-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile_block(mode, label):
+    """Profiles the enclosed block with cProfile or the sampler and saves the
+    result under REPORT_PROFILE_DIR. Yields the output path."""
+    out_dir = os.environ.get('REPORT_PROFILE_DIR', DEFAULT_PROFILE_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    if mode == 'sample':
+        path = os.path.join(out_dir, f"{label}-{stamp}.folded")
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            yield path
+        finally:
+            profiler.stop()
+            profiler.dump(path)
+    else:
+        import cProfile
+        path = os.path.join(out_dir, f"{label}-{stamp}.prof")
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler is already active on this thread
+            log_warning("Profiler unavailable", error=e)
+            yield None
+            return
+        try:
+            yield path
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+
+
+# --- REQUEST ENTRY POINT ---
+
+def _truthy(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _request_flags(headers, path):
+    query = parse_qs(urlparse(path or '').query)
+    trace_flag = (headers.get(TRACE_HEADER) if headers else None) or (query.get('trace') or [None])[0]
+    profile_flag = (headers.get(PROFILE_HEADER) if headers else None) or (query.get('profile') or [None])[0]
+
+    enabled = _truthy(os.environ.get('REPORT_TRACE', '')) or _truthy(trace_flag or '')
+    profile = None
+    if profile_flag and _truthy(os.environ.get('REPORT_PROFILE_ENABLED', '')):
+        profile_flag = profile_flag.strip().lower()
+        if profile_flag in PROFILE_MODES:
+            profile = profile_flag
+        elif _truthy(profile_flag):
+            profile = 'cprofile'
+    return enabled, profile
+
+
+@contextmanager
+def trace_request(endpoint, headers=None, path=None, sink=None):
+    """Opens the root span for one request and, if asked, profiles it.
+
+    Yields the TraceContext; its `response_headers()` carry the trace id
+    (and profile path) back to the caller. `sink` receives each finished
+    span record instead of the JSON-lines writer (used by the benchmarks).
+    """
+    enabled, profile = _request_flags(headers, path)
+    trace = TraceContext(endpoint, enabled=enabled, profile=profile, sink=sink)
+    trace_token = _trace.set(trace)
+    try:
+        with span('request', profile=profile) as root:
+            if profile:
+                label = f"{endpoint}-{trace.trace_id[:12]}"
+                with profile_block(profile, label) as profile_path:
+                    trace.profile_path = profile_path
+                    root.set(profile_path=profile_path)
+                    yield trace
+                if profile_path:
+                    _emit({'type': 'profile', 'trace_id': trace.trace_id, 'endpoint': endpoint,
+                           'mode': profile, 'path': profile_path})
+            else:
+                yield trace
+    finally:
+        _trace.reset(trace_token)
@@ -0,0 +1,140 @@
+"""
+Benchmark of the bitmap filter index (api/data_bitmap.py) on a synthetic
+catalogue snapshot.
+
+For each filter combination it times the bitmap selection, a vectorised
+rescan (np.isin over the attribute columns) and a per-row rescan (what
+get-analytics does with .filter()), checks that all three agree, and times
+the summary kernel on the selected rows.
+
+Two catalogues are measured: submodels as model x trim (few distinct
+values) and a realistic one where submodel is close to unique per version
+(about one row per submodel), which exercises the sparse row-id storage.
+
+    python scripts/bench_filters.py
+    python scripts/bench_filters.py --rows 1000000 --repeat 20
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'api'), os.path.join(ROOT, 'scripts')):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from data_bitmap import FILTER_FIELDS, FilterIndex
+from data_snapshot import Snapshot
+from synthetic_payloads import BRANDS, MODELS, SEGMENTS, TRIMS
+
+ESTADOS = ['vigente', 'vigente', 'vigente', 'nuevo', 'inactivo']
+
+CASES = [
+    ('sin filtros', {}),
+    ('1 segmento', {'tipoVehiculo': ['SUV']}),
+    ('3 marcas', {'brand': ['Toyota', 'Kia', 'Hyundai']}),
+    ('segmento x marcas', {'tipoVehiculo': ['SUV', 'Pickup'], 'brand': ['Toyota', 'Ford', 'Nissan']}),
+    ('marca x modelo x estado', {'brand': ['Toyota'], 'model': ['RAV4', 'Yaris'], 'estado': ['vigente']}),
+    ('OR de conjuntos', ('or', {'brand': ['Toyota'], 'tipoVehiculo': ['SUV']},
+                         ('and', {'brand': ['Kia']}, ('not', {'estado': ['inactivo']})))),
+]
+
+
+def synthetic_snapshot(rows, seed=0, versions=None):
+    """Synthetic catalogue; with `versions`, submodels get one of that many
+    version suffixes (realistic cardinality) instead of model x trim."""
+    rng = np.random.default_rng(seed)
+    pick = lambda options: np.array(options, dtype=object)[rng.integers(len(options), size=rows)]
+    model = pick(MODELS)
+    submodel = np.array([f"{m} {t}" for m, t in zip(model.tolist(), pick(TRIMS).tolist())], dtype=object)
+    if versions:
+        suffix = rng.integers(versions, size=rows).tolist()
+        submodel = np.array([f"{s} #{k}" for s, k in zip(submodel.tolist(), suffix)], dtype=object)
+    lista = rng.integers(700, 6600, size=rows) * 10000.0
+    bono = np.where(rng.random(rows) < 0.3, rng.integers(0, 100, size=rows) * 10000.0, 0.0)
+    attrs = {
+        'brand': pick(BRANDS), 'model': model, 'submodel': submodel, 'name': submodel,
+        'estado': pick(ESTADOS), 'tipo_vehiculo': pick(SEGMENTS),
+    }
+    day = np.full(rows, np.datetime64('2024-06-30'))
+    return Snapshot('2024-06-30', np.arange(rows), day, lista - bono, lista, bono, attrs)
+
+
+def rescan_numpy(snap, expr):
+    if isinstance(expr, dict):
+        mask = np.ones(len(snap), dtype=bool)
+        for key, column in FILTER_FIELDS.items():
+            values = expr.get(key)
+            if values:
+                mask &= np.isin(snap.attrs[column], values)
+        return mask
+    op, *args = expr
+    if op == 'not':
+        return ~rescan_numpy(snap, args[0])
+    masks = [rescan_numpy(snap, a) for a in args]
+    return np.logical_and.reduce(masks) if op == 'and' else np.logical_or.reduce(masks)
+
+
+def rescan_rows(records, expr):
+    def keep(row, e):
+        if isinstance(e, dict):
+            return all(row[FILTER_FIELDS[k]] in v for k, v in e.items() if v)
+        op, *args = e
+        if op == 'not':
+            return not keep(row, args[0])
+        return (all if op == 'and' else any)(keep(row, a) for a in args)
+    return [i for i, row in enumerate(records) if keep(row, expr)]
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for label, versions in (('submodelo = modelo x versión', None),
+                            ('submodelo casi único por versión', max(args.rows // 3, 1))):
+        print(f"== {label}")
+        bench(synthetic_snapshot(args.rows, args.seed, versions), args.repeat)
+        print()
+
+
+def bench(snap, repeat):
+    start = time.perf_counter()
+    index = FilterIndex.from_snapshot(snap)
+    build = time.perf_counter() - start
+    values = sum(len(f) for f in index.fields.values())
+    print(f"{len(snap)} filas, {values} valores indexados: "
+          f"construcción {build:.2f} s, {index.nbytes / 1e6:.1f} MB de índice\n")
+
+    columns = list(FILTER_FIELDS.values())
+    records = [dict(zip(columns, r)) for r in zip(*(snap.attrs[c].tolist() for c in columns))]
+
+    print(f"{'caso':<26}{'filas':>9}{'bitmap ms':>11}{'isin ms':>10}{'por fila ms':>13}{'resumen ms':>12}")
+    submodels = snap.attrs['submodel'][:3].tolist()
+    for name, expr in CASES + [('3 submodelos', {'submodel': submodels})]:
+        rows, bitmap_s = timed(lambda: index.rows(expr), repeat)
+        mask, numpy_s = timed(lambda: rescan_numpy(snap, expr), max(1, repeat // 2))
+        python_rows, python_s = timed(lambda: rescan_rows(records, expr), 1)
+        assert np.array_equal(rows, np.flatnonzero(mask)) and np.array_equal(rows, python_rows), name
+        _, summary_s = timed(lambda: snap.take(rows).summary(), max(1, repeat // 5))
+        print(f"{name:<26}{len(rows):>9}{bitmap_s * 1e3:>11.2f}{numpy_s * 1e3:>10.1f}"
+              f"{python_s * 1e3:>13.0f}{summary_s * 1e3:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
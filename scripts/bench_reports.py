@@ -0,0 +1,304 @@
+"""
+Benchmark suite for the Python report generators (api/generate-*.py).
+
+Each case builds a synthetic payload (scripts/synthetic_payloads.py), runs
+the generator in a fresh subprocess and records wall time, peak RSS, output
+size and per-stage time/peak RSS. Results are written as JSON so runs can be
+compared across commits, and every (endpoint, knob) sweep gets a log-log
+scaling check that flags superlinear (quadratic-ish) growth.
+
+    python scripts/bench_reports.py
+    python scripts/bench_reports.py --endpoints generate-ppt --param models --scales 10,100,1000,10000,100000
+    python scripts/bench_reports.py --endpoints add_table_slide --param rows --scales 120,480,1920,7680
+    python scripts/bench_reports.py --out bench_results.json
+    python scripts/bench_reports.py --compare before.json after.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, 'api')
+SCRIPTS_DIR = os.path.join(ROOT, 'scripts')
+for path in (ROOT, API_DIR, SCRIPTS_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from synthetic_payloads import SCALABLE, payload_for
+
+GENERATORS = {
+    'generate-ppt': 'generate_ppt',
+    'generate-excel': 'generate_excel',
+    'generate-ppt-compare': 'generate_ppt_compare',
+    'generate-ppt-evolution': 'generate_ppt_evolution',
+}
+# Micro-benchmark of the table paginator on its own
+MICRO = {'add_table_slide': ('rows',)}
+
+DEFAULT_SCALES = (10, 100, 1000)
+SUPERLINEAR_SLOPE = 1.5  # log-log slope above this is flagged (1.0 = linear, 2.0 = quadratic)
+
+
+def load_generator(endpoint):
+    path = os.path.join(API_DIR, f'{endpoint}.py')
+    spec = importlib.util.spec_from_file_location(endpoint.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, GENERATORS[endpoint])
+
+
+def _peak_rss_bytes():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# --- SINGLE CASE (runs inside the child process) ---
+
+def run_case(endpoint, param, n, seed=0):
+    from api.report_metrics import request_scope, stage, STAGE_SECONDS, STAGES
+    from api.report_tracing import trace_request
+
+    spans = []
+
+    def sink(record):
+        record['peak_rss'] = _peak_rss_bytes()
+        spans.append(record)
+
+    if endpoint in MICRO:
+        return run_table_case(n, sink)
+
+    generator = load_generator(endpoint)
+    body = json.dumps(payload_for(endpoint, seed=seed, **{param: n})).encode('utf-8')
+    baseline_rss = _peak_rss_bytes()
+
+    start = time.perf_counter()
+    with trace_request(endpoint, headers={'X-Report-Trace': '1'}, sink=sink), \
+         request_scope(endpoint, payload_bytes=len(body)):
+        with stage('parse'):
+            data = json.loads(body)
+        output = generator(data)
+    wall = time.perf_counter() - start
+
+    stages = {}
+    for name in STAGES:
+        seconds, count = STAGE_SECONDS.snapshot(endpoint=endpoint, stage=name)
+        if count:
+            peak = max((s['peak_rss'] for s in spans if s['name'] == name), default=None)
+            stages[name] = {'seconds': round(seconds, 6), 'calls': count, 'peak_rss_bytes': peak}
+
+    return {
+        'endpoint': endpoint, 'param': param, 'n': n,
+        'wall_seconds': round(wall, 6),
+        'payload_bytes': len(body),
+        'output_bytes': len(output),
+        'baseline_rss_bytes': baseline_rss,
+        'peak_rss_bytes': _peak_rss_bytes(),
+        'stages': stages,
+    }
+
+
+def run_table_case(rows, sink):
+    """add_table_slide alone: `rows` rows x 8 columns into a blank deck."""
+    from pptx import Presentation
+    from pptx.util import Inches
+    from api.ppt_shared import add_table_slide
+    from synthetic_payloads import models_list
+
+    data = [{"Marca": m["brand"], "Modelo": m["model"], "Versión": m["submodel"], "Estado": m["estado"],
+             "Precio Lista": m["precio_lista"], "Bono": m["bono"], "Precio Final": m["precio_con_bono"],
+             "% Desc.": m["bono"] / m["precio_lista"]} for m in models_list(rows)]
+    prs = Presentation()
+    prs.slide_width = Inches(13.333)
+    prs.slide_height = Inches(7.5)
+    baseline_rss = _peak_rss_bytes()
+    start = time.perf_counter()
+    add_table_slide(prs, "Detalle de Modelos", data)
+    wall = time.perf_counter() - start
+    return {
+        'endpoint': 'add_table_slide', 'param': 'rows', 'n': rows,
+        'wall_seconds': round(wall, 6),
+        'slides': len(prs.slides),
+        'seconds_per_slide': round(wall / max(len(prs.slides), 1), 6),
+        'baseline_rss_bytes': baseline_rss,
+        'peak_rss_bytes': _peak_rss_bytes(),
+        'stages': {},
+    }
+
+
+# --- ORCHESTRATION ---
+
+def spawn_case(endpoint, param, n, timeout):
+    cmd = [sys.executable, os.path.abspath(__file__), '--run-case', endpoint, param, str(n)]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, cwd=ROOT)
+    except subprocess.TimeoutExpired:
+        return {'endpoint': endpoint, 'param': param, 'n': n, 'error': f'timeout after {timeout}s'}
+    # Generators may log warnings on stdout; the result is the last line
+    lines = [l for l in proc.stdout.splitlines() if l.startswith('{"endpoint"')]
+    if proc.returncode != 0 or not lines:
+        return {'endpoint': endpoint, 'param': param, 'n': n,
+                'error': (proc.stderr.strip().splitlines() or ['no output'])[-1]}
+    return json.loads(lines[-1])
+
+
+def log_log_slope(points):
+    """Least-squares slope of log(y) over log(x)."""
+    pts = [(math.log(x), math.log(y)) for x, y in points if x > 0 and y > 0]
+    if len(pts) < 2:
+        return None
+    mx = sum(p[0] for p in pts) / len(pts)
+    my = sum(p[1] for p in pts) / len(pts)
+    den = sum((p[0] - mx) ** 2 for p in pts)
+    if den == 0:
+        return None
+    return sum((p[0] - mx) * (p[1] - my) for p in pts) / den
+
+
+def scaling_checks(cases):
+    """One check per (endpoint, param) sweep, plus one per stage. Uses the
+    three largest scales so fixed per-request overhead does not hide growth."""
+    checks = []
+    sweeps = {}
+    for case in cases:
+        if 'error' not in case:
+            sweeps.setdefault((case['endpoint'], case['param']), []).append(case)
+    for (endpoint, param), runs in sorted(sweeps.items()):
+        runs = sorted(runs, key=lambda c: c['n'])[-3:]
+        if len(runs) < 3:
+            continue
+        series = {'total': [(c['n'], c['wall_seconds']) for c in runs]}
+        for name in runs[-1].get('stages', {}):
+            series[name] = [(c['n'], c['stages'].get(name, {}).get('seconds', 0)) for c in runs]
+        for name, points in series.items():
+            slope = log_log_slope(points)
+            if slope is None:
+                continue
+            checks.append({
+                'endpoint': endpoint, 'param': param, 'stage': name,
+                'slope': round(slope, 3),
+                'superlinear': slope > SUPERLINEAR_SLOPE,
+                'range': [points[0][0], points[-1][0]],
+            })
+    return checks
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=ROOT).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _mb(num_bytes):
+    return f"{num_bytes / 1e6:.1f}" if num_bytes is not None else '-'
+
+
+def print_cases(cases, header=True):
+    if header:
+        print(f"{'endpoint':<24}{'param':<8}{'n':>8}{'wall s':>10}{'peak MB':>10}{'out MB':>9}  top stage")
+    for c in cases:
+        if 'error' in c:
+            print(f"{c['endpoint']:<24}{c['param']:<8}{c['n']:>8}  ERROR {c['error']}")
+            continue
+        stages = c.get('stages') or {}
+        top = max(stages.items(), key=lambda kv: kv[1]['seconds'], default=None)
+        top_str = f"{top[0]} ({top[1]['seconds']:.3f}s)" if top else ''
+        out = _mb(c['output_bytes']) if 'output_bytes' in c else '-'
+        print(f"{c['endpoint']:<24}{c['param']:<8}{c['n']:>8}{c['wall_seconds']:>10.3f}"
+              f"{_mb(c['peak_rss_bytes']):>10}{out:>9}  {top_str}")
+
+
+def print_checks(checks):
+    flagged = [c for c in checks if c['superlinear']]
+    print(f"\nScaling checks: {len(checks)} run, {len(flagged)} superlinear (slope > {SUPERLINEAR_SLOPE})")
+    for c in checks:
+        mark = '!!' if c['superlinear'] else '  '
+        print(f" {mark} {c['endpoint']:<24}{c['param']:<8}{c['stage']:<8} slope {c['slope']:.2f}"
+              f"  (n {c['range'][0]}..{c['range'][1]})")
+
+
+def compare_results(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    index = {(c['endpoint'], c['param'], c['n']): c for c in before['cases'] if 'error' not in c}
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+    print(f"{'endpoint':<24}{'param':<8}{'n':>8}{'wall':>18}{'ratio':>8}{'peak MB':>16}")
+    for c in after['cases']:
+        old = index.get((c['endpoint'], c['param'], c['n']))
+        if old is None or 'error' in c:
+            continue
+        ratio = c['wall_seconds'] / old['wall_seconds'] if old['wall_seconds'] else float('nan')
+        print(f"{c['endpoint']:<24}{c['param']:<8}{c['n']:>8}"
+              f"{old['wall_seconds']:>8.3f} ->{c['wall_seconds']:>7.3f}{ratio:>8.2f}"
+              f"{_mb(old['peak_rss_bytes']):>7} ->{_mb(c['peak_rss_bytes']):>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', default=','.join(GENERATORS),
+                        help='comma-separated endpoints (or add_table_slide)')
+    parser.add_argument('--param', default=None,
+                        help='knob to sweep (models, sheets, series, dates, rows); default: all for each endpoint')
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)))
+    parser.add_argument('--timeout', type=float, default=600, help='seconds per case')
+    parser.add_argument('--out', default=None, help='write results JSON here')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    parser.add_argument('--run-case', nargs=3, metavar=('ENDPOINT', 'PARAM', 'N'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        endpoint, param, n = args.run_case
+        print(json.dumps(run_case(endpoint, param, int(n))))
+        return 0
+    if args.compare:
+        compare_results(*args.compare)
+        return 0
+
+    scales = [int(s) for s in args.scales.split(',') if s]
+    cases = []
+    for endpoint in args.endpoints.split(','):
+        knobs = {**SCALABLE, **MICRO}.get(endpoint)
+        if knobs is None:
+            parser.error(f"unknown endpoint {endpoint}")
+        params = [args.param] if args.param else knobs
+        for param in params:
+            if param not in knobs:
+                continue
+            for n in scales:
+                case = spawn_case(endpoint, param, n, args.timeout)
+                print_cases([case], header=not cases)
+                cases.append(case)
+
+    checks = scaling_checks(cases)
+    print_checks(checks)
+
+    result = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scales': scales,
+        },
+        'cases': cases,
+        'scaling': checks,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if any(c['superlinear'] for c in checks) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
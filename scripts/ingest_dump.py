@@ -0,0 +1,108 @@
+"""
+Streams a scraping dump (JSON array, NDJSON or CSV) through the upload-json
+normalisation (api/data_ingest.py) and reports throughput.
+
+    python scripts/ingest_dump.py dataset.json
+    python scripts/ingest_dump.py dataset.csv --batch-size 5000 --out normalized/
+    python scripts/ingest_dump.py --synthetic 1000000 --write dump.json
+    python scripts/ingest_dump.py dataset.json --db prices.db
+
+--out writes products.ndjson (deduped, last wins) and prices.ndjson.
+--db loads the batches into a local SQLite store (api/data_store.py).
+--synthetic N generates an N-row dump first (scripts/synthetic_payloads.py),
+handy for checking that memory stays flat as the dump grows.
+"""
+
+import os
+import sys
+import json
+import argparse
+import resource
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'api'), os.path.join(ROOT, 'scripts')):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from data_ingest import BATCH_SIZE, IngestStats, ingest
+from data_store import PriceStore
+from synthetic_payloads import scraping_records
+
+
+def write_synthetic(path, rows, products, seed):
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write('[\n')
+        for i, record in enumerate(scraping_records(rows, products, seed=seed)):
+            fh.write((',\n' if i else '') + json.dumps(record, ensure_ascii=False))
+        fh.write('\n]\n')
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dump', nargs='?', help='.json / .ndjson / .csv file')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--out', help='directory for products.ndjson / prices.ndjson')
+    parser.add_argument('--db', help='SQLite store to load into')
+    parser.add_argument('--synthetic', type=int, help='generate a dump with this many rows first')
+    parser.add_argument('--products', type=int, default=20000, help='versions in the synthetic dump')
+    parser.add_argument('--write', default='synthetic_dump.json', help='path for the synthetic dump')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    dump = args.dump
+    if args.synthetic:
+        write_synthetic(args.write, args.synthetic, args.products, args.seed)
+        print(f"Wrote {args.synthetic} rows to {args.write} ({os.path.getsize(args.write) / 1e6:.1f} MB)")
+        dump = dump or args.write
+    if not dump:
+        parser.error('a dump path or --synthetic is required')
+
+    products_out = prices_out = None
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        products_out = open(os.path.join(args.out, 'products.ndjson.tmp'), 'w', encoding='utf-8')
+        prices_out = open(os.path.join(args.out, 'prices.ndjson'), 'w', encoding='utf-8')
+
+    stats = IngestStats()
+    store = PriceStore(args.db) if args.db else None
+    try:
+        for batch in ingest(dump, args.batch_size, stats):
+            if store:
+                store.load_batch(batch)
+            if products_out:
+                products_out.writelines(json.dumps(p, ensure_ascii=False) + '\n' for p in batch.products)
+                prices_out.writelines(json.dumps(p, ensure_ascii=False) + '\n' for p in batch.prices)
+            if stats.batches % 100 == 0:
+                print(f"  {stats.records} records, {stats.batches} batches", file=sys.stderr)
+        if store:
+            store.finish_load()
+    finally:
+        if products_out:
+            products_out.close()
+            prices_out.close()
+        if store:
+            store.close()
+
+    if products_out:
+        # Batches carry a product again when it changes; keep the last version
+        tmp = os.path.join(args.out, 'products.ndjson.tmp')
+        latest = {}
+        with open(tmp, encoding='utf-8') as fh:
+            for line in fh:
+                product = json.loads(line)
+                latest[product['id_base']] = line
+        with open(os.path.join(args.out, 'products.ndjson'), 'w', encoding='utf-8') as fh:
+            fh.writelines(latest.values())
+        os.remove(tmp)
+
+    result = stats.as_dict()
+    result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,386 @@
+"""
+Local load-test harness for the Python report handlers.
+
+Starts N worker processes, each serving every api/generate-*.py handler on
+its own port (one request at a time per worker, like a serverless instance),
+then replays synthetic or recorded payloads against them at a fixed
+concurrency and, optionally, a Poisson arrival rate.
+
+Reports throughput, p50/p95/p99 latency, error and fallback rates per
+endpoint, and RSS per worker (scraped from each worker's /metrics), as a
+summary table and a JSON artifact.
+
+    python scripts/load_test.py --workers 4 --concurrency 8 --requests 200
+    python scripts/load_test.py --rate 2 --duration 60 --mix generate-ppt=3,generate-excel=1
+    python scripts/load_test.py --payloads recorded/ --out load_before.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import argparse
+import threading
+import subprocess
+import importlib.util
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, 'api')
+SCRIPTS_DIR = os.path.join(ROOT, 'scripts')
+for path in (ROOT, API_DIR, SCRIPTS_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from synthetic_payloads import ENDPOINTS, payload_for
+
+DEFAULT_MIX = {'generate-ppt': 1, 'generate-ppt-compare': 1, 'generate-ppt-evolution': 1, 'generate-excel': 1}
+DEFAULT_SCALE = {'models': 200, 'sheets': 7, 'series': 8, 'dates': 24}
+
+
+# --- WORKER ---
+
+def _load_handler(endpoint):
+    spec = importlib.util.spec_from_file_location(endpoint.replace('-', '_'), os.path.join(API_DIR, f'{endpoint}.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+
+def serve(port, threaded=False):
+    """Serves every endpoint under /api/<endpoint> from this process."""
+    handlers = {endpoint: _load_handler(endpoint) for endpoint in ENDPOINTS}
+
+    class Router(BaseHTTPRequestHandler):
+        def _target(self):
+            name = self.path.split('?')[0].rstrip('/').split('/')
+            endpoint = name[-2] if name[-1] == 'metrics' else name[-1]
+            return handlers.get(endpoint) or handlers['generate-excel']
+
+        def do_GET(self):
+            return self._target().do_GET(self)
+
+        def do_POST(self):
+            return self._target().do_POST(self)
+
+        def log_message(self, format, *args):
+            pass
+
+    server_cls = ThreadingHTTPServer if threaded else HTTPServer
+    server = server_cls(('127.0.0.1', port), Router)
+    server.serve_forever()
+
+
+def start_workers(count, base_port, threaded=False):
+    workers = []
+    for i in range(count):
+        port = base_port + i
+        cmd = [sys.executable, os.path.abspath(__file__), '--serve', str(port)]
+        if threaded:
+            cmd.append('--threaded')
+        # Worker stdout carries the generators' JSON-lines warnings; keep it out of the report
+        proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL)
+        workers.append({'port': port, 'proc': proc})
+    for w in workers:
+        _wait_ready(w['port'])
+    return workers
+
+
+def _wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/generate-excel', timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.1)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+
+def stop_workers(workers):
+    for w in workers:
+        w['proc'].send_signal(signal.SIGTERM)
+    for w in workers:
+        try:
+            w['proc'].wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            w['proc'].kill()
+
+
+# --- METRICS SCRAPE ---
+
+def parse_prometheus(text):
+    """{(name, frozenset(labels)): value} for every sample line."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        head, _, value = line.rpartition(' ')
+        labels = frozenset()
+        if '{' in head:
+            name, _, label_str = head.partition('{')
+            pairs = [p for p in label_str.rstrip('}').split('",') if p]
+            labels = frozenset(tuple(p.rstrip('"').split('="', 1)) for p in pairs)
+        else:
+            name = head
+        samples[(name, labels)] = float(value)
+    return samples
+
+
+def scrape(port):
+    text = urllib.request.urlopen(f'http://127.0.0.1:{port}/api/generate-excel/metrics', timeout=10).read().decode()
+    return parse_prometheus(text)
+
+
+def _counter_by_endpoint(samples, name):
+    out = {}
+    for (metric, labels), value in samples.items():
+        if metric == name:
+            out[dict(labels).get('endpoint', '')] = value
+    return out
+
+
+# --- PAYLOADS ---
+
+def build_payloads(mix, scale, payload_dir=None, variants=3):
+    """{endpoint: [body_bytes, ...]} from recorded files or the synthetic generators."""
+    payloads = {}
+    for endpoint in mix:
+        bodies = []
+        if payload_dir:
+            for name in sorted(os.listdir(payload_dir)):
+                if name.startswith(endpoint) and name.endswith('.json'):
+                    # 'generate-ppt' must not pick up 'generate-ppt-compare' recordings
+                    rest = name[len(endpoint):]
+                    if rest[:1] in ('.', '_') or rest[:2].isdigit():
+                        with open(os.path.join(payload_dir, name), 'rb') as f:
+                            bodies.append(f.read())
+        if not bodies:
+            from synthetic_payloads import SCALABLE
+            knobs = {k: v for k, v in scale.items() if k in SCALABLE[endpoint]}
+            bodies = [json.dumps(payload_for(endpoint, seed=i, **knobs)).encode('utf-8') for i in range(variants)]
+        payloads[endpoint] = bodies
+    return payloads
+
+
+# --- CLIENT ---
+
+def _send(port, endpoint, body, timeout):
+    req = urllib.request.Request(f'http://127.0.0.1:{port}/api/{endpoint}', data=body,
+                                 headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            data = resp.read()
+            status = resp.status
+        error = None
+    except urllib.error.HTTPError as e:
+        data, status, error = b'', e.code, f'HTTP {e.code}'
+    except Exception as e:
+        data, status, error = b'', None, f'{type(e).__name__}: {e}'
+    return {'endpoint': endpoint, 'port': port, 'status': status, 'error': error,
+            'latency': time.perf_counter() - start, 'bytes': len(data)}
+
+
+def run_load(workers, payloads, mix, concurrency, rate=None, requests=None, duration=None,
+             timeout=300, seed=0):
+    rng = random.Random(seed)
+    endpoints = list(mix)
+    weights = [mix[e] for e in endpoints]
+    ports = [w['port'] for w in workers]
+    results = []
+    lock = threading.Lock()
+    slots = threading.Semaphore(concurrency)
+
+    def task(i, endpoint, body):
+        try:
+            res = _send(ports[i % len(ports)], endpoint, body, timeout)
+            with lock:
+                results.append(res)
+        finally:
+            slots.release()
+
+    start = time.perf_counter()
+    next_arrival = start
+    i = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            if requests is not None and i >= requests:
+                break
+            if duration is not None and time.perf_counter() - start >= duration:
+                break
+            if rate:
+                # Open loop: Poisson arrivals, capped by `concurrency` in flight
+                next_arrival += rng.expovariate(rate)
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            slots.acquire()
+            endpoint = rng.choices(endpoints, weights)[0]
+            pool.submit(task, i, endpoint, rng.choice(payloads[endpoint]))
+            i += 1
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+# --- REPORT ---
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarise(results, elapsed, before, after, workers):
+    by_endpoint = {}
+    for r in results:
+        by_endpoint.setdefault(r['endpoint'], []).append(r)
+
+    fallback_names = ('pricing_report_fallback_decks_total', 'pricing_report_error_workbooks_total')
+    fallbacks = {}
+    for port in after:
+        for name in fallback_names:
+            now = _counter_by_endpoint(after[port], name)
+            then = _counter_by_endpoint(before.get(port, {}), name)
+            for endpoint, value in now.items():
+                fallbacks[endpoint] = fallbacks.get(endpoint, 0) + value - then.get(endpoint, 0)
+
+    endpoints = {}
+    for endpoint, runs in sorted(by_endpoint.items()):
+        ok = [r['latency'] for r in runs if r['error'] is None]
+        errors = sum(1 for r in runs if r['error'] is not None)
+        endpoints[endpoint] = {
+            'requests': len(runs),
+            'throughput_rps': round(len(runs) / elapsed, 3) if elapsed else None,
+            'p50_ms': _ms(percentile(ok, 0.50)),
+            'p95_ms': _ms(percentile(ok, 0.95)),
+            'p99_ms': _ms(percentile(ok, 0.99)),
+            'error_rate': round(errors / len(runs), 4),
+            'fallback_rate': round(fallbacks.get(endpoint, 0) / len(runs), 4),
+            'avg_output_bytes': int(sum(r['bytes'] for r in runs) / len(runs)),
+        }
+
+    worker_stats = []
+    for w in workers:
+        samples = after.get(w['port'], {})
+        served = sum(1 for r in results if r['port'] == w['port'])
+        worker_stats.append({
+            'port': w['port'],
+            'pid': int(samples.get(('process_id', frozenset()), 0)) or None,
+            'requests': served,
+            'rss_bytes': samples.get(('process_resident_memory_bytes', frozenset())),
+            'peak_rss_bytes': samples.get(('process_max_resident_memory_bytes', frozenset())),
+        })
+
+    all_ok = [r['latency'] for r in results if r['error'] is None]
+    return {
+        'total': {
+            'requests': len(results),
+            'elapsed_seconds': round(elapsed, 3),
+            'throughput_rps': round(len(results) / elapsed, 3) if elapsed else None,
+            'p50_ms': _ms(percentile(all_ok, 0.50)),
+            'p95_ms': _ms(percentile(all_ok, 0.95)),
+            'p99_ms': _ms(percentile(all_ok, 0.99)),
+            'error_rate': round(sum(1 for r in results if r['error']) / len(results), 4) if results else None,
+        },
+        'endpoints': endpoints,
+        'workers': worker_stats,
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def print_summary(summary):
+    print(f"{'endpoint':<24}{'reqs':>6}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'err %':>7}{'fallback %':>12}")
+    rows = list(summary['endpoints'].items()) + [('TOTAL', summary['total'])]
+    for name, s in rows:
+        fallback = s.get('fallback_rate')
+        print(f"{name:<24}{s['requests']:>6}{s['throughput_rps'] or 0:>8.2f}"
+              f"{s['p50_ms'] or 0:>9.0f}{s['p95_ms'] or 0:>9.0f}{s['p99_ms'] or 0:>9.0f}"
+              f"{(s['error_rate'] or 0) * 100:>7.1f}"
+              f"{'' if fallback is None else f'{fallback * 100:.1f}':>12}")
+    print(f"\n{'worker':<10}{'pid':>8}{'reqs':>6}{'rss MB':>9}{'peak MB':>9}")
+    for w in summary['workers']:
+        rss = (w['rss_bytes'] or 0) / 1e6
+        peak = (w['peak_rss_bytes'] or 0) / 1e6
+        print(f"{w['port']:<10}{w['pid'] or '-':>8}{w['requests']:>6}{rss:>9.1f}{peak:>9.1f}")
+
+
+def _parse_kv(text, cast=int):
+    out = {}
+    for part in (text or '').split(','):
+        if part:
+            key, _, value = part.partition('=')
+            out[key.strip()] = cast(value or 1)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threaded', action='store_true', help='let each worker serve requests concurrently')
+    parser.add_argument('--base-port', type=int, default=18700)
+    parser.add_argument('--concurrency', type=int, default=4, help='max requests in flight')
+    parser.add_argument('--rate', type=float, default=None, help='Poisson arrivals per second (default: closed loop)')
+    parser.add_argument('--requests', type=int, default=None, help='stop after this many requests')
+    parser.add_argument('--duration', type=float, default=None, help='stop after this many seconds')
+    parser.add_argument('--mix', default=None, help='endpoint=weight,... (default: all four equally)')
+    parser.add_argument('--scale', default=None, help='synthetic payload knobs, e.g. models=500,series=12')
+    parser.add_argument('--payloads', default=None, help='directory of recorded <endpoint>*.json bodies')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--out', default=None, help='write the JSON artifact here')
+    parser.add_argument('--serve', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve is not None:
+        serve(args.serve, threaded=args.threaded)
+        return 0
+
+    mix = _parse_kv(args.mix, float) if args.mix else dict(DEFAULT_MIX)
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    scale = {**DEFAULT_SCALE, **_parse_kv(args.scale)}
+    requests = args.requests if (args.requests or args.duration) else 50
+
+    payloads = build_payloads(mix, scale, args.payloads)
+    workers = start_workers(args.workers, args.base_port, args.threaded)
+    try:
+        before = {w['port']: scrape(w['port']) for w in workers}
+        results, elapsed = run_load(workers, payloads, mix, args.concurrency, args.rate,
+                                    requests, args.duration, args.timeout)
+        after = {w['port']: scrape(w['port']) for w in workers}
+    finally:
+        stop_workers(workers)
+
+    summary = summarise(results, elapsed, before, after, workers)
+    print_summary(summary)
+
+    if args.out:
+        artifact = {
+            'config': {
+                'workers': args.workers, 'threaded': args.threaded, 'concurrency': args.concurrency,
+                'rate': args.rate, 'requests': requests, 'duration': args.duration,
+                'mix': mix, 'scale': scale, 'payloads': args.payloads,
+            },
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            **summary,
+        }
+        with open(args.out, 'w') as f:
+            json.dump(artifact, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+Synthetic payload generators for the Python report endpoints.
+
+Shapes follow what the frontend sends (src/lib/exportUtils.ts and
+src/lib/exportPages.ts). Every generator is deterministic for a given seed
+so benchmark runs are comparable across commits.
+
+    from synthetic_payloads import dashboard_payload
+    payload = dashboard_payload(models=1000, sheets=7, series=10, dates=52)
+"""
+
+import random
+from datetime import date, timedelta
+
+BRANDS = ["Toyota", "Kia", "Hyundai", "Mazda", "Chevrolet", "Nissan", "Suzuki",
+          "Peugeot", "MG", "Chery", "Ford", "Volkswagen", "Renault", "Subaru", "Honda"]
+SEGMENTS = ["SUV", "Sedán", "Hatchback", "Pickup", "Van", "Coupé"]
+MODELS = ["RAV4", "Sportage", "Tucson", "CX-5", "Tracker", "Kicks", "Vitara", "2008",
+          "ZS", "Tiggo 7", "Ranger", "T-Cross", "Duster", "Forester", "CR-V", "Yaris",
+          "Rio", "Accent", "Mazda3", "Onix", "Versa", "Swift", "208", "MG3", "Arrizo 5"]
+TRIMS = ["LE", "XLE", "GL", "GLS", "Limited", "Sport", "Premium", "Base", "Plus", "GT"]
+ENGINES = ["1.5", "1.6", "2.0", "2.5", "1.4T", "Hybrid"]
+ESTADOS = ["nuevo", "nuevo", "nuevo", "usado", "descontinuado"]
+
+ENDPOINTS = ('generate-ppt', 'generate-excel', 'generate-ppt-compare', 'generate-ppt-evolution')
+
+
+def _rng(seed):
+    return random.Random(seed)
+
+
+def version_labels(n, seed=0):
+    """n unique "Brand Model Trim Engine" labels."""
+    rng = _rng(seed)
+    labels, seen = [], set()
+    i = 0
+    while len(labels) < n:
+        label = f"{rng.choice(BRANDS)} {rng.choice(MODELS)} {rng.choice(TRIMS)} {rng.choice(ENGINES)}"
+        if label in seen:
+            label = f"{label} #{i}"
+        seen.add(label)
+        labels.append(label)
+        i += 1
+    return labels
+
+
+def scrape_dates(n, start=date(2024, 1, 1), seed=0):
+    """n irregular scraping dates (gaps of 3-10 days), as ISO strings."""
+    rng = _rng(seed)
+    out, current = [], start
+    for _ in range(n):
+        out.append(current.isoformat())
+        current += timedelta(days=rng.randint(3, 10))
+    return out
+
+
+def models_list(n, seed=0):
+    """Flat `models` array as sent by the dashboard export."""
+    rng = _rng(seed)
+    out = []
+    for i in range(n):
+        lista = rng.randrange(9_000_000, 65_000_000, 10_000)
+        bono = rng.choice([0, 0, 500_000, 1_000_000, 1_500_000, 2_500_000])
+        out.append({
+            "brand": rng.choice(BRANDS),
+            "model": rng.choice(MODELS),
+            "submodel": f"{rng.choice(TRIMS)} {rng.choice(ENGINES)} #{i}",
+            "estado": rng.choice(ESTADOS),
+            "tipo_vehiculo": rng.choice(SEGMENTS),
+            "precio_lista": lista,
+            "bono": bono,
+            "precio_con_bono": lista - bono,
+        })
+    return out
+
+
+def evolution_rows(series, dates, seed=0, missing_ratio=0.2):
+    """Wide evolution rows ({'Fecha': ..., '<version>': price}) with 0 for gaps."""
+    rng = _rng(seed)
+    labels = version_labels(series, seed)
+    base = {label: rng.randrange(10_000_000, 50_000_000, 10_000) for label in labels}
+    rows = []
+    for d in scrape_dates(dates, seed=seed):
+        row = {"Fecha": d}
+        for label in labels:
+            base[label] = int(base[label] * (1 + rng.uniform(-0.02, 0.02)))
+            row[label] = 0 if rng.random() < missing_ratio else base[label]
+        rows.append(row)
+    return rows
+
+
+def dashboard_sheets(sheets, series, dates, seed=0):
+    """The dashboard chart sheets, cycled until `sheets` are produced."""
+    rng = _rng(seed)
+    brands = (BRANDS * (series // len(BRANDS) + 1))[:series]
+    brands = [b if i < len(BRANDS) else f"{b} {i}" for i, b in enumerate(brands)]
+
+    def composition():
+        return {"name": "Composición Mercado", "chart_type": "stacked",
+                "chart_title": "Composición de Versiones por Segmento",
+                "data": [{"Segmento": s, **{b: rng.randint(0, 12) for b in brands}} for s in SEGMENTS]}
+
+    def prices_by_segment():
+        return {"name": "Precios por Segmento", "chart_type": "bar",
+                "chart_title": "Precios por Segmento (Min/Prom/Max)",
+                "data": [{"Segmento": s, "Mínimo": rng.randint(8, 15) * 1_000_000,
+                          "Promedio": rng.randint(16, 30) * 1_000_000,
+                          "Máximo": rng.randint(31, 70) * 1_000_000,
+                          "Cant. Versiones": rng.randint(5, 200)} for s in SEGMENTS]}
+
+    def structure():
+        return {"name": "Estructura Precios Marcas", "chart_type": "bar",
+                "chart_title": "Estructura de Precios por Segmento y Marca",
+                "data": [{"Segmento - Marca": f"{s} - {b}",
+                          "Precio Promedio": rng.randint(10, 50) * 1_000_000,
+                          "Versiones": rng.randint(1, 30)} for s in SEGMENTS[:2] for b in brands]}
+
+    def matrix():
+        return {"name": "Matriz Posicionamiento", "chart_type": "scatter",
+                "chart_title": "Matriz Precio vs Volumen",
+                "data": [{"Marca - Modelo": f"{b} {rng.choice(MODELS)}", "Volumen": rng.randint(1, 30),
+                          "Precio Promedio": rng.randint(10, 50) * 1_000_000} for b in brands]}
+
+    def benchmarking():
+        return {"name": "Benchmarking", "chart_type": "line",
+                "chart_title": "Benchmarking de Precios por Marca",
+                "data": [{"Marca": b, "Precio Promedio": rng.randint(15, 30) * 1_000_000,
+                          "Precio Mínimo": rng.randint(8, 14) * 1_000_000,
+                          "Precio Máximo": rng.randint(31, 60) * 1_000_000,
+                          "Versiones": rng.randint(1, 40)} for b in brands]}
+
+    def trend():
+        return {"name": "Tendencia Global", "chart_type": "bar",
+                "chart_title": "Tendencia de Precios Global (% Acumulado)",
+                "data": [{"Marca": b, "Variación %": rng.uniform(-0.08, 0.12),
+                          "Inicio": "2024-01-01", "Fin": "2024-12-31"} for b in brands]}
+
+    def volatility():
+        return {"name": "Volatilidad Temporal", "chart_type": "line",
+                "chart_title": "Evolución de Volatilidad en el Tiempo",
+                "data": [{"Fecha": d, **{b: rng.uniform(0, 0.1) for b in brands}}
+                         for d in scrape_dates(dates, seed=seed)]}
+
+    makers = [composition, prices_by_segment, structure, matrix, benchmarking, trend, volatility]
+    out = []
+    for i in range(sheets):
+        sheet = makers[i % len(makers)]()
+        if i >= len(makers):
+            sheet["name"] = f"{sheet['name']} {i // len(makers) + 1}"
+        out.append(sheet)
+    return out
+
+
+def dashboard_payload(models=50, sheets=7, series=8, dates=12, seed=0):
+    """Payload for /api/generate-ppt and /api/generate-excel."""
+    model_rows = models_list(models, seed)
+    prices = [m["precio_con_bono"] for m in model_rows] or [0]
+    return {
+        "filename": "Dashboard_Report_bench.xlsx",
+        "title": "REPORTE DE DASHBOARD",
+        "currencySymbol": "$",
+        "timezoneOffset": -3,
+        "summary": {
+            "total_models": len(model_rows),
+            "total_brands": len({m["brand"] for m in model_rows}),
+            "avg_price": sum(prices) / len(prices),
+            "median_price": sorted(prices)[len(prices) // 2],
+            "min_price": min(prices),
+            "max_price": max(prices),
+            "price_std_dev": 0,
+            "variation_coefficient": 0,
+            "avg_discount_pct": 0,
+            "filters": {"tipoVehiculo": [], "brand": [], "model": []},
+        },
+        "sheets": dashboard_sheets(sheets, series, dates, seed),
+        "models": model_rows,
+    }
+
+
+def compare_payload(series=4, dates=12, seed=0):
+    """Payload for /api/generate-ppt-compare (one row per compared version)."""
+    rng = _rng(seed)
+    labels = version_labels(series, seed)
+    summary = []
+    for label in labels:
+        brand, model, *rest = label.split(" ")
+        summary.append({"Marca": brand, "Modelo": model, "Versión": " ".join(rest),
+                        "Segmento": rng.choice(SEGMENTS),
+                        "Precio Actual": rng.randint(10, 50) * 1_000_000,
+                        "Precio Promedio": rng.randint(10, 50) * 1_000_000,
+                        "Precio Mínimo": rng.randint(8, 12) * 1_000_000,
+                        "Precio Máximo": rng.randint(50, 60) * 1_000_000})
+    return {
+        "reportTitle": "Reporte Comparativo",
+        "currency": "$",
+        "slides": [
+            {"type": "table", "title": "Resumen Comparación", "data": summary},
+            {"type": "chart", "chart_type": "line", "chart_title": "Evolución Histórica de Precios",
+             "data": evolution_rows(series, dates, seed)},
+        ],
+    }
+
+
+def long_records(rows, labels=None):
+    """Wide evolution rows as long [date, series, price] triples (gaps dropped).
+    With `labels`, the series is sent as its position in that list."""
+    position = {label: i for i, label in enumerate(labels or [])}
+    return [[row["Fecha"], position.get(key, key), price] for row in rows
+            for key, price in row.items() if key != "Fecha" and price]
+
+
+def evolution_payload(series=6, dates=24, seed=0, long_format=False):
+    """Payload for /api/generate-ppt-evolution (pre-pivoted wide rows, or
+    long records pivoted server-side)."""
+    rows = evolution_rows(series, dates, seed)
+    slide = {"type": "chart", "chart_type": "line", "chart_title": "Evolución de Precios"}
+    if long_format:
+        slide["series"] = [key for key in rows[0] if key != "Fecha"]
+        slide["records"] = long_records(rows, slide["series"])
+    else:
+        slide["data"] = rows
+    return {
+        "reportTitle": "Evolución de Precios",
+        "currency": "$",
+        "slides": [slide],
+    }
+
+
+def scraping_records(rows, products=2000, dates=52, seed=0):
+    """Scraper dump records (upload-json JsonData), generated lazily.
+
+    `rows` price rows spread over `products` versions and `dates` scraping
+    dates; about 1% lack ID_Base (slugged on ingest), 0.5% lack Modelo
+    (skipped) and prices are sometimes sent as "26.290.000" strings.
+    """
+    rng = _rng(seed)
+    labels = version_labels(products, seed)
+    days = scrape_dates(dates, seed=seed)
+    segments = [rng.choice(SEGMENTS) for _ in labels]
+    estados = [rng.choice(["Vigente", "vigente", "Activo", "nuevo"]) for _ in labels]
+    base = [rng.randrange(9_000_000, 65_000_000, 10_000) for _ in labels]
+    for i in range(rows):
+        p = rng.randrange(products)
+        brand, model, trim = labels[p].split(" ", 2)
+        lista = base[p] + rng.randrange(-20, 21) * 50_000
+        bono = rng.choice([0, 0, 500_000, 1_000_000])
+        precio = lista - bono
+        record = {
+            "UID": f"{i:012x}",
+            "ID_Base": f"{brand}|{model}|{trim}",
+            "Categoría": brand,
+            "Modelo Principal": model,
+            "Modelo": trim,
+            "ctx_precio": "precio_lista",
+            "precio_num": f"{precio:,}".replace(",", ".") if rng.random() < 0.2 else precio,
+            "precio_lista_num": lista,
+            "bono_num": bono,
+            "Precio_Texto": f"$ {precio:,}".replace(",", "."),
+            "fuente_texto_raw": "",
+            "Modelo_URL": f"https://example.test/{brand}/{model}".lower(),
+            "Archivo_Origen": "synthetic.json",
+            "Fecha": days[rng.randrange(dates)],
+            "Timestamp": "2024-06-01T12:00:00Z",
+            "Estado": "inactivo" if rng.random() < 0.01 else estados[p],
+            "Tipo_Vehiculo": segments[p],
+        }
+        roll = rng.random()
+        if roll < 0.01:
+            record["ID_Base"] = ""
+        elif roll < 0.015:
+            record["Modelo"] = ""
+        yield record
+
+
+# Which knobs each endpoint understands (used by the benchmark sweeps)
+SCALABLE = {
+    'generate-ppt': ('models', 'sheets', 'series', 'dates'),
+    'generate-excel': ('models', 'sheets', 'series', 'dates'),
+    'generate-ppt-compare': ('series', 'dates'),
+    'generate-ppt-evolution': ('series', 'dates'),
+}
+
+
+def payload_for(endpoint, seed=0, **scale):
+    if endpoint in ('generate-ppt', 'generate-excel'):
+        return dashboard_payload(seed=seed, **scale)
+    if endpoint == 'generate-ppt-compare':
+        return compare_payload(seed=seed, **scale)
+    if endpoint == 'generate-ppt-evolution':
+        return evolution_payload(seed=seed, **scale)
+    raise ValueError(f"Unknown endpoint: {endpoint}")
@@ -0,0 +1,7 @@
+# Tests import the api modules the way the serverless functions do
+# (flat module names, api/ on sys.path).
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
@@ -0,0 +1,44 @@
+import numpy as np
+
+from data_cube import PriceCube, brand_sheet, segment_sheet
+from data_snapshot import PriceHistory
+
+PRODUCTS = {
+    1: {'brand': 'Kia', 'model': 'Rio', 'tipo_vehiculo': 'Sedán'},
+    2: {'brand': 'Toyota', 'model': 'Yaris', 'tipo_vehiculo': 'Sedán'},
+    3: {'brand': 'Toyota', 'model': 'Yaris', 'tipo_vehiculo': 'Sedán'},
+    4: {'brand': 'Toyota', 'model': 'RAV4', 'tipo_vehiculo': 'SUV'},
+}
+
+
+def history():
+    # Kia: one version scraped daily for two months; Toyota: three versions once each
+    days = np.arange('2024-01-01', '2024-03-01', dtype='datetime64[D]')
+    product = [1] * len(days) + [2, 3, 4]
+    day = list(days) + [np.datetime64('2024-01-10')] * 3
+    price = [10_000_000.0 + i % 3 for i in range(len(days))] + [12e6, 13e6, 20e6]
+    n = len(product)
+    return PriceHistory(product, day, price, [np.nan] * n, [np.nan] * n, PRODUCTS)
+
+
+def test_counts_are_versions_not_observations():
+    data = {r['Marca']: r for r in brand_sheet(PriceCube.build(history()))['data']}
+    assert data['Kia']['Cantidad'] == 1
+    assert data['Toyota']['Cantidad'] == 3
+    assert data['Toyota']['Participación %'] == 0.75
+    segments = {r['Segmento']: r['Cantidad'] for r in segment_sheet(PriceCube.build(history()))['data']}
+    assert segments == {'SUV': 1, 'Sedán': 3}
+
+
+def test_variance_is_exact_at_large_prices():
+    h = history()
+    kia = h.price[h.product_id == 1]
+    row = next(r for r in PriceCube.build(h).rollup(('brand',)) if r['brand'] == 'Kia')
+    assert row['count'] == len(kia)
+    assert row['mean'] == kia.mean()
+    assert abs(row['std'] - kia.std(ddof=1)) < 1e-9
+
+
+def test_month_filter_keeps_version_counts():
+    rows = PriceCube.build(history()).rollup(('brand',), start='2024-02-01', end='2024-02-29')
+    assert [(r['brand'], r['versions'], r['count']) for r in rows] == [('Kia', 1, 29)]
@@ -0,0 +1,39 @@
+import numpy as np
+
+from data_insights import insights_sheet, price_insights, robust_z
+from data_movers import version_label
+from data_snapshot import PriceHistory
+
+
+def test_robust_z_per_group():
+    values = [10, 11, 9, 10, 12, 50, 100, 101, 99, 100, 102, np.nan]
+    groups = ['a'] * 6 + ['b'] * 5 + ['a']
+    z = robust_z(values, groups)
+    assert z[5] > 3.5                     # 50 among ~10s
+    assert np.all(np.abs(z[6:11]) < 3.5)  # b is homogeneous
+    assert np.isnan(z[11])
+    # Groups below min_peers get no score
+    assert np.isnan(robust_z([1, 2, 100], ['a'] * 3)).all()
+
+
+def test_version_label():
+    assert version_label({'brand': 'Kia', 'submodel': '1.4 EX', 'name': 'Rio'}) == 'Kia 1.4 EX'
+    assert version_label({'brand': 'Kia', 'submodel': None, 'name': 'Rio 5'}) == 'Kia Rio 5'
+    assert version_label({}) == ''
+
+
+def test_price_jump_is_flagged():
+    products = {p: {'brand': 'Kia', 'submodel': f'V{p}', 'tipo_vehiculo': 'SUV'} for p in range(1, 9)}
+    ids, days, prices = [], [], []
+    for p in products:
+        for d, change in enumerate([0, 0.01, -0.01, 0.02]):
+            ids.append(p)
+            days.append(np.datetime64('2024-01-01') + d)
+            prices.append(20e6 * (1 + change + 0.001 * p))
+    prices[-1] = 30e6  # version 8 jumps on the last day
+    n = len(ids)
+    history = PriceHistory(ids, days, prices, [np.nan] * n, [np.nan] * n, products)
+    insights = price_insights(history)
+    assert insights[0]['insight_type'] == 'price_anomaly'
+    assert insights[0]['data']['product_id'] == 8
+    assert insights_sheet(insights)['data'][0]['Hallazgo'].startswith('Kia V8')
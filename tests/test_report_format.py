@@ -0,0 +1,45 @@
+import math
+
+import numpy as np
+import pytest
+
+from report_format import NUMPY_MIN, FORMATS, format_column, formatter
+
+VALUES = [0, 1, -1, 0.5, -0.125, 12.5, 999, 1000, -1234567, 1234.5678, 26_290_000, 7.0,
+          0.004, -0.004, 1e15, None, float('nan'), float('inf'), np.float64(42.25), 3]
+
+
+@pytest.mark.parametrize('fmt', FORMATS + (None,))
+@pytest.mark.parametrize('currency', ['$', 'UF'])
+@pytest.mark.parametrize('size', [NUMPY_MIN - 1, NUMPY_MIN, 3 * NUMPY_MIN])
+def test_column_matches_scalar(fmt, currency, size):
+    values = (VALUES * (size // len(VALUES) + 1))[:size]
+    one = formatter(fmt, currency)
+    assert format_column(values, fmt, currency) == [one(v) for v in values]
+
+
+@pytest.mark.parametrize('size', [NUMPY_MIN - 1, NUMPY_MIN])
+def test_mixed_column_matches_scalar(size):
+    values = (['n/d', '1500', 2500.0, None] * size)[:size]
+    one = formatter('currency')
+    assert format_column(values, 'currency') == [one(v) for v in values]
+    # numeric_only: strings are left as sent
+    assert format_column(values, 'currency', numeric_only=True)[:2] == ['n/d', '1500']
+
+
+@pytest.mark.parametrize('value, fmt, currency, text', [
+    (1234567, 'currency', '$', '$ 1.234.567'),
+    (-1234567.4, 'currency', '$', '$ -1.234.567'),
+    (1234.5, 'currency', 'UF', 'UF 1.234,50'),
+    (0.125, 'percent', '$', '12,5%'),
+    (-0.05, 'percent', '$', '-5,0%'),
+    (1234567, 'integer', '$', '1.234.567'),
+    (1234567, None, '$', '1.234.567'),
+    (1234.5, None, '$', '1.234,50'),
+    ('1500', None, '$', '1500'),
+    (None, 'currency', '$', '-'),
+    (math.nan, 'percent', '$', '-'),
+    ('n/d', 'currency', '$', 'n/d'),
+])
+def test_es_cl_strings(value, fmt, currency, text):
+    assert formatter(fmt, currency)(value) == text
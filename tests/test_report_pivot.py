@@ -0,0 +1,50 @@
+import numpy as np
+
+from report_pivot import _series_codes, pivot_long, pivot_long_slides
+
+SERIES = ['Toyota RAV4', 'Kia Sportage']
+
+
+def test_dates_sorted_and_gaps_are_none():
+    rows = pivot_long([
+        ['2024-02-01T10:00:00Z', 'Toyota RAV4', 26_000_000],
+        ['2024-01-15', 'Kia Sportage', 21_000_000],
+        ['2024-01-03', 'Toyota RAV4', 25_990_000],
+    ])
+    assert [r['Fecha'] for r in rows] == ['2024-01-03', '2024-01-15', '2024-02-01']
+    assert rows[0] == {'Fecha': '2024-01-03', 'Toyota RAV4': 25_990_000, 'Kia Sportage': None}
+
+
+def test_positions_labels_and_out_of_range():
+    codes, keys = _series_codes([0, 1, 'Kia Sportage', 2, -1, 'Mazda CX-5', True, np.int64(1)], SERIES)
+    assert codes.tolist() == [0, 1, 1, -1, -1, 2, 3, 1]
+    assert keys == SERIES + ['Mazda CX-5', 'True']
+
+
+def test_out_of_range_positions_are_dropped():
+    rows = pivot_long([['2024-01-03', 0, 100], ['2024-01-03', 5, 200], ['2024-01-04', -1, 300]],
+                      series_order=SERIES)
+    assert rows == [{'Fecha': '2024-01-03', 'Toyota RAV4': 100, 'Kia Sportage': None}]
+
+
+def test_numeric_string_prices_and_last_record_wins():
+    rows = pivot_long([
+        {'date': '2024-01-03', 'series': 'Toyota RAV4', 'price': '26.290.000'},
+        {'date': '2024-01-03', 'series': 'Kia Sportage', 'price': 'n/d'},
+        {'date': '2024-01-03', 'series': 'Kia Sportage', 'price': '21.000.000'},
+    ])
+    assert rows == [{'Fecha': '2024-01-03', 'Toyota RAV4': 26_290_000, 'Kia Sportage': 21_000_000}]
+
+
+def test_short_triples_are_dropped():
+    rows = pivot_long([['2024-01-03', 0], ['2024-01-04', 1, 500], ['2024-01-05']], series_order=SERIES)
+    assert rows == [{'Fecha': '2024-01-04', 'Toyota RAV4': None, 'Kia Sportage': 500}]
+    assert pivot_long([['2024-01-03', 0]], series_order=SERIES) == []
+
+
+def test_slides_pivoted_with_gaps():
+    data = pivot_long_slides({'slides': [{'type': 'chart', 'series': SERIES,
+                                          'records': [['2024-01-03', 1, 10]]}]})
+    slide = data['slides'][0]
+    assert slide['gaps'] is True and 'records' not in slide
+    assert slide['data'] == [{'Fecha': '2024-01-03', 'Toyota RAV4': None, 'Kia Sportage': 10}]
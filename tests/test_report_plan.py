@@ -0,0 +1,42 @@
+import io
+import json
+
+from report_plan import send_plan
+
+
+class FakeHandler:
+    """The BaseHTTPRequestHandler calls send_plan makes."""
+
+    def __init__(self):
+        self.status = None
+        self.headers = {}
+        self.wfile = io.BytesIO()
+
+    def send_response(self, status):
+        self.status = status
+
+    def send_header(self, key, value):
+        self.headers[key] = value
+
+    def end_headers(self):
+        pass
+
+    def json(self):
+        return json.loads(self.wfile.getvalue())
+
+
+def test_malformed_body_is_a_400():
+    for body in (b'{"slides": [', b'\xff\xfe', b'[1, 2]'):
+        handler = FakeHandler()
+        send_plan(handler, 'generate-ppt-compare', body)
+        assert handler.status == 400
+        assert 'error' in handler.json()
+        assert handler.headers['Access-Control-Allow-Origin'] == '*'
+
+
+def test_plan_for_valid_body():
+    handler = FakeHandler()
+    body = json.dumps({'slides': [{'type': 'table', 'title': 'T', 'data': [{'a': 1, 'b': 2}]}]}).encode()
+    send_plan(handler, 'generate-ppt-compare', body)
+    assert handler.status == 200
+    assert 'degrade' in handler.json()
@@ -0,0 +1,47 @@
+import report_resample
+from report_resample import resample_report, resample_rows
+
+ROWS = [
+    {'Fecha': '2024-01-01', 'Kia': 10.0, 'Toyota': 20.0},
+    {'Fecha': '2024-01-03', 'Kia': 11.0, 'Toyota': None},
+    {'Fecha': '2024-01-09', 'Kia': 12.0, 'Toyota': 22.0},
+    {'Fecha': '2024-01-24', 'Kia': None, 'Toyota': 24.0},
+]
+
+
+def test_week_buckets():
+    out = resample_rows(ROWS, 'week', 'last')
+    # ISO weeks with a scrape only; a series missing from a bucket is None
+    assert [r['Fecha'] for r in out] == ['2024-01-01', '2024-01-08', '2024-01-22']
+    assert out[0] == {'Fecha': '2024-01-01', 'Kia': 11.0, 'Toyota': 20.0}
+    assert out[2] == {'Fecha': '2024-01-22', 'Kia': None, 'Toyota': 24.0}
+
+
+def test_ffill_and_mean():
+    out = resample_rows(ROWS, 'week', 'mean', ffill=True)
+    assert out[0]['Kia'] == 10.5
+    assert out[2] == {'Fecha': '2024-01-22', 'Kia': 12.0, 'Toyota': 24.0}
+
+
+def test_series_id_cache_returns_copies():
+    report_resample._cache.clear()
+    first = resample_rows(ROWS, 'month', series_id='test:brands')
+    first[0]['Kia'] = -1
+    second = resample_rows(ROWS, 'month', series_id='test:brands')
+    assert second == [{'Fecha': '2024-01', 'Kia': 12.0, 'Toyota': 24.0}]
+    assert len(report_resample._cache) == 1
+
+
+def test_no_series_id_is_not_cached():
+    report_resample._cache.clear()
+    resample_rows(ROWS, 'week')
+    assert not report_resample._cache
+
+
+def test_report_passes_series_id():
+    report_resample._cache.clear()
+    data = {'resample': 'week', 'slides': [{'type': 'chart', 'seriesId': 'evo', 'data': ROWS}]}
+    out = resample_report(data)
+    assert len(out['slides'][0]['data']) == 3
+    assert len(report_resample._cache) == 1
+    assert data['slides'][0]['data'] is ROWS
@@ -0,0 +1,39 @@
+from report_stats import STAT_KEYS, fill_summary, summary_stats
+
+MODELS = [
+    {'brand': 'Kia', 'model': 'Rio', 'submodel': '1.4 EX', 'precio_con_bono': 12_000_000, 'precio_lista': 13_000_000},
+    {'brand': 'Kia', 'model': 'Rio', 'submodel': None, 'precio_con_bono': 11_000_000, 'precio_lista': 11_000_000},
+    {'brand': 'Toyota', 'model': 'Yaris', 'submodel': 'GLI', 'precio_con_bono': 14_000_000, 'precio_lista': 15_000_000},
+]
+
+
+def client_summary():
+    # get-analytics-v2 counts every filtered price row, not the models list
+    summary = {k: 1.0 for k in STAT_KEYS}
+    summary.update(total_models=480, total_brands=12, avg_price=21_500_000.0)
+    return summary
+
+
+def test_missing_summary_is_computed():
+    data = fill_summary({'models': MODELS})
+    assert data['summary'] == summary_stats(MODELS)
+
+
+def test_client_summary_with_larger_population_survives():
+    summary = client_summary()
+    data = fill_summary({'models': MODELS, 'summary': dict(summary)})
+    assert data['summary'] == summary
+
+
+def test_partial_client_summary_only_gets_missing_keys():
+    data = fill_summary({'models': MODELS, 'summary': {'total_models': 480, 'filters': {'brand': ['Kia']}}})
+    assert data['summary']['total_models'] == 480
+    assert data['summary']['filters'] == {'brand': ['Kia']}
+    assert data['summary']['avg_price'] == summary_stats(MODELS)['avg_price']
+
+
+def test_recompute_summary_replaces_numbers():
+    summary = dict(client_summary(), filters={'brand': []})
+    data = fill_summary({'models': MODELS, 'summary': summary, 'recomputeSummary': True})
+    assert data['summary']['total_models'] == 3
+    assert data['summary']['filters'] == {'brand': []}
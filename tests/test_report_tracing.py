@@ -0,0 +1,18 @@
+import os
+
+import report_tracing
+from report_tracing import TraceContext, _request_flags
+
+
+def test_profile_flag_needs_opt_in(monkeypatch):
+    monkeypatch.delenv('REPORT_PROFILE_ENABLED', raising=False)
+    assert _request_flags({'X-Report-Profile': 'sample'}, '/api/generate-ppt?profile=cprofile') == (False, None)
+    monkeypatch.setenv('REPORT_PROFILE_ENABLED', '1')
+    assert _request_flags({'X-Report-Profile': 'sample'}, '/api/generate-ppt')[1] == 'sample'
+    assert _request_flags({}, '/api/generate-ppt?profile=1')[1] == 'cprofile'
+
+
+def test_profile_header_names_the_file_only():
+    trace = TraceContext('generate-ppt')
+    trace.profile_path = os.path.join(report_tracing.DEFAULT_PROFILE_DIR, 'generate-ppt-abc.prof')
+    assert trace.response_headers()['X-Report-Profile-Path'] == 'generate-ppt-abc.prof'